@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+import epd
+from epd import catalog
+import config
+
+'''
+Benchmark of the events of one app page (10 days of EPT, 34 channels, synthetic data).
+Compares the live running average + detection (as used before in app.py) with slicing the event catalog of the mission.
+'''
+
+COLUMNS = [f"Electron_Flux_{i}" for i in range(34)]
+
+
+def synthetic_range(sensor, viewing, start_date, end_date):
+    days = []
+    for date in pd.date_range(start_date, end_date):
+        rng = np.random.default_rng(date.toordinal())
+        index = pd.date_range(date, periods=86400 // config.TIME_RESOLUTION, freq=f"{config.TIME_RESOLUTION}s")
+        days.append(pd.DataFrame(rng.lognormal(0, 0.5, (len(index), len(COLUMNS))), index=index, columns=COLUMNS))
+    return pd.concat(days)
+
+
+def main(repeat=5):
+    start_date, end_date = "2022-03-01", "2022-03-10"
+    df = synthetic_range("ept", "sun", start_date, end_date)
+
+    def live():
+        running_mean, running_std = epd.RollingStats(df).running_average(18)
+        return epd.detect_events(df, running_mean, running_std, 2.5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.npz")
+        time_build = timeit.timeit(lambda: catalog.build_catalog("EPT-SUN", 18, 2.5, "2022-01-01", "2022-06-30", path=path,
+                                                                 load=synthetic_range), number=1)
+        event_catalog = catalog.open_catalog("EPT-SUN", 18, 2.5, path=path)
+
+    time_old = min(timeit.repeat(live, number=1, repeat=repeat))
+    time_new = min(timeit.repeat(lambda: event_catalog.events(start_date, end_date, df.columns), number=1, repeat=repeat))
+    print(f"{len(event_catalog)} events in the catalog (181 days, built in {time_build:.1f} s), page of 10 days x {len(COLUMNS)} channels")
+    print(f"live detection:    {time_old * 1000:8.2f} ms")
+    print(f"catalog slice:     {time_new * 1000:8.2f} ms")
+    print(f"speed-up:          {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
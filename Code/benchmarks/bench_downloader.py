@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import time
+import tempfile
+from datetime import datetime, timedelta
+from connectivity_tool.downloader import Downloader
+from connectivity_tool.local_server import LocalServer
+
+'''
+Benchmark of the connectivity tool downloader against the local stand-in server (no network needed).
+Every response is delayed by `latency` seconds to simulate the round trip to the real server. Compares one slot after the
+other (as before) with concurrent downloads on a pooled session.
+'''
+
+
+def run(server, slots, concurrency):
+    with tempfile.TemporaryDirectory() as directory:
+        downloader = Downloader(directory, concurrency=concurrency, backoff=0.01, base_url=server.url)
+        start = time.perf_counter()
+        failed = downloader.download(slots)
+        elapsed = time.perf_counter() - start
+        downloader.close()
+    assert failed == {}, failed
+    return elapsed
+
+
+def main(n_slots=40, latency=0.05):
+    slots = [datetime(2022, 3, 5) + timedelta(hours=6 * i) for i in range(n_slots)]
+    with LocalServer(latency=latency) as server:
+        print(f"{n_slots} slots, {latency * 1000:.0f} ms latency per request")
+        time_sequential = run(server, slots, 1)
+        print(f"sequential:        {time_sequential:8.2f} s")
+        for concurrency in [4, 8, 16]:
+            time_concurrent = run(server, slots, concurrency)
+            print(f"concurrency {concurrency:2d}:    {time_concurrent:8.2f} s  ({time_sequential / time_concurrent:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import timeit
+import numpy as np
+import pandas as pd
+from epd import events
+import config
+
+'''
+Benchmark of the event detection on one month of EPT data (34 channels, synthetic).
+Compares the streak detection with a groupby per channel (as used before) with the run length encoding of epd.events.
+'''
+
+
+def streak_events(selected: pd.DataFrame):
+    # Previous implementation: https://joshdevlin.com/blog/calculate-streaks-in-pandas/
+    diff = (selected != selected.shift()) & ~selected.shift().isna()
+    indexed = diff.cumsum()
+    streaks = selected * indexed
+    streaks = streaks[streaks != 0]
+    streaks["Index"] = streaks.index
+
+    event_starts = []
+    event_ends = []
+    for column in selected.columns:
+        group = streaks["Index"].groupby(streaks[column])
+        mask = group.count().reset_index(drop=True) > 1
+        event_starts.append(pd.Series(group.min().reset_index(drop=True)[mask]))
+        event_ends.append(pd.Series(group.max().reset_index(drop=True)[mask]))
+
+    return pd.DataFrame(event_starts, index=selected.columns).T, pd.DataFrame(event_ends, index=selected.columns).T
+
+
+def main(repeat=5):
+    rows = 30 * 86400 // config.TIME_RESOLUTION
+    columns = [f"Electron_Flux_{i}" for i in range(34)]
+    index = pd.date_range("2022-03-01", periods=rows, freq=f"{config.TIME_RESOLUTION}s")
+
+    rng = np.random.default_rng(0)
+    selected = pd.DataFrame(rng.random((rows, len(columns))) < 0.2, index=index, columns=columns)
+    selected.iloc[0] = False
+
+    def run_rle():
+        channel, start, end = events.find_runs(selected.to_numpy())
+        return events.runs_to_frame(index, columns, channel, start), events.runs_to_frame(index, columns, channel, end)
+
+    # Both find the same events (the rows of the old frames are not sorted in time)
+    old_starts, old_ends = streak_events(selected)
+    new_starts, new_ends = run_rle()
+    for column in columns:
+        assert (np.sort(old_starts[column].dropna().to_numpy()) == new_starts[column].dropna().to_numpy()).all()
+        assert (np.sort(old_ends[column].dropna().to_numpy()) == new_ends[column].dropna().to_numpy()).all()
+
+    time_old = min(timeit.repeat(lambda: streak_events(selected), number=1, repeat=repeat))
+    time_new = min(timeit.repeat(run_rle, number=1, repeat=repeat))
+    print(f"{rows} samples x {len(columns)} channels, {new_starts.count().sum()} events")
+    print(f"groupby per channel:  {time_old * 1000:8.2f} ms")
+    print(f"run length encoding:  {time_new * 1000:8.2f} ms")
+    print(f"speed-up:             {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import timeit
+import numpy as np
+import pandas as pd
+import stix
+
+'''
+Benchmark of the flare selection (synthetic list of 30000 flares over 4 years).
+Compares the boolean masks over the whole list (as used before in app.py) with the binary searches of stix.FlareIndex.
+'''
+
+
+def main(repeat=5, n_flares=30000, n_queries=200):
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2021-02-14") + pd.to_timedelta(np.sort(rng.uniform(0, 4 * 365 * 86400, n_flares)), unit="s")
+    flares = pd.DataFrame({"start_UTC": start, "peak_UTC": start + pd.Timedelta(minutes=3),
+                           "end_UTC": start + pd.to_timedelta(rng.uniform(300, 7200, n_flares), unit="s")})
+    queries = pd.Timestamp("2021-03-01") + pd.to_timedelta(rng.uniform(0, 3 * 365, n_queries), unit="D")
+
+    def mask_queries():
+        result = []
+        for t in queries:
+            peaks = flares["peak_UTC"]
+            result.append(flares[(t <= peaks) & (peaks < t + pd.Timedelta(days=3))].index)
+            result.append(flares[(t < peaks) & (peaks < t + pd.Timedelta(hours=6))].index)
+        return result
+
+    index = stix.FlareIndex(flares)
+
+    def index_queries():
+        result = []
+        for t in queries:
+            result.append(index.peaking(t, t + pd.Timedelta(days=3)))
+            result.append(index.peaking(t, t + pd.Timedelta(hours=6), include_start=False))
+        return result
+
+    assert all((a == b).all() for a, b in zip(mask_queries(), index_queries()))
+
+    time_build = timeit.timeit(lambda: stix.FlareIndex(flares), number=1)
+    time_old = min(timeit.repeat(mask_queries, number=1, repeat=repeat))
+    time_new = min(timeit.repeat(index_queries, number=1, repeat=repeat))
+    print(f"{n_flares} flares, {n_queries} date range + {n_queries} plot window queries")
+    print(f"boolean masks:     {time_old * 1000:8.2f} ms")
+    print(f"index (build):     {time_build * 1000:8.2f} ms")
+    print(f"index:             {time_new * 1000:8.2f} ms")
+    print(f"speed-up:          {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+import stix
+
+'''
+Benchmark of loading the STIX flare list (synthetic list with the columns of the real one).
+Compares parsing the csv (and the utc columns, as every consumer did before) with the typed cache of stix.read_typed_list.
+'''
+
+FLOAT_COLUMNS = ["4-10 keV", "10-15 keV", "15-25 keV", "25-50 keV", "50-84 keV", "bkg 4-10 keV", "bkg 10-15 keV",
+                 "bkg 15-25 keV", "bkg 25-50 keV", "bkg 50-84 keV", "bkg_baseline_4-10 keV", "hpc_x_solo", "hpc_y_solo",
+                 "hpc_x_earth", "hpc_y_earth", "hgs_lon", "hgs_lat", "hgc_lon", "hgc_lat", "solo_position_lat",
+                 "solo_position_lon", "solo_position_AU_distance", "light_travel_time", "GOES_flux_time_of_flare"]
+
+
+def write_list(path, n_flares):
+    rng = np.random.default_rng(0)
+    peak = pd.Timestamp("2021-02-14") + pd.to_timedelta(np.sort(rng.uniform(0, 4 * 365 * 86400, n_flares)), unit="s")
+    utc = lambda times: np.datetime_as_string(times.to_numpy(), unit="ms")
+    df = pd.DataFrame({"start_UTC": utc(peak - pd.Timedelta(minutes=3)), "end_UTC": utc(peak + pd.Timedelta(minutes=5)),
+                       "peak_UTC": utc(peak)})
+    for column in FLOAT_COLUMNS:
+        df[column] = rng.normal(size=n_flares)
+    df["att_in"] = rng.random(n_flares) < 0.1
+    df["visible_from_earth"] = rng.random(n_flares) < 0.5
+    df["GOES_class_time_of_flare"] = rng.choice(["A", "B", "C", "M", "X"], n_flares)
+    df["flare_id"] = np.arange(n_flares)
+    df.to_csv(path, index=False)
+
+
+def parse_csv(path):
+    # Previous implementation: csv parsed on every call, the utc columns by every consumer
+    df = pd.read_csv(path)
+    for column in stix.core.TIME_COLUMNS:
+        pd.to_datetime(df[column])
+    return df
+
+
+def main(repeat=5, n_flares=30000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "flare_list.csv")
+        write_list(path, n_flares)
+
+        time_build = timeit.timeit(lambda: stix.read_typed_list(path), number=1)
+        time_old = min(timeit.repeat(lambda: parse_csv(path), number=1, repeat=repeat))
+        time_new = min(timeit.repeat(lambda: stix.read_typed_list(path), number=1, repeat=repeat))
+
+    print(f"{n_flares} flares, {len(FLOAT_COLUMNS) + 8} columns")
+    print(f"read_csv + to_datetime: {time_old * 1000:8.2f} ms")
+    print(f"cache (first build):    {time_build * 1000:8.2f} ms")
+    print(f"cache:                  {time_new * 1000:8.2f} ms")
+    print(f"speed-up:               {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
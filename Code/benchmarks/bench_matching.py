@@ -0,0 +1,68 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import timeit
+import numpy as np
+import pandas as pd
+from epd import matching
+import misc
+import config
+
+'''
+Benchmark of the flare matching for one month (34 EPT channels, synthetic events and flares).
+Compares the loop over the flares (as used before in app.py) with the binary searches of epd.matching.
+'''
+
+
+def loop_matching(df_starts, flares, speeds, indirect_factor):
+    # Previous implementation: every flare is compared with the whole frame of event starts
+    df_conn = flares.copy()
+    for flare_index in flares.index:
+        arrive_time = pd.to_timedelta(flares["distance"][flare_index] / speeds, unit="s")
+
+        low = df_conn["_date_start"][flare_index] + arrive_time
+        high = df_conn["_date_end"][flare_index] + arrive_time * indirect_factor
+
+        mask = low < df_starts
+        mask &= df_starts < high
+
+        selection = mask.any()
+        df_conn.loc[flare_index, "channels"] = selection.sum()
+    return df_conn["channels"].to_numpy()
+
+
+def main(repeat=5, n_flares=1000, n_events=300):
+    rows = 30 * 86400 // config.TIME_RESOLUTION
+    columns = [f"Electron_Flux_{i}" for i in range(34)]
+    index = pd.date_range("2022-03-01", periods=rows, freq=f"{config.TIME_RESOLUTION}s")
+
+    rng = np.random.default_rng(0)
+    df_starts = pd.DataFrame({column: np.sort(rng.choice(index, n_events, replace=False)) for column in columns})
+    flare_start = pd.Series(np.sort(rng.choice(index, n_flares)))
+    flares = pd.DataFrame({"_date_start": flare_start,
+                           "_date_end": flare_start + pd.to_timedelta(rng.integers(0, 3600, n_flares), unit="s"),
+                           "distance": rng.uniform(1e10, 3e11, n_flares)})
+    speeds = misc.misc_handler.compute_particle_speed(34, "electron")
+
+    def run_searchsorted():
+        return matching.match_flares(df_starts, flares["_date_start"], flares["_date_end"], flares["distance"], speeds, 1.5)[0]
+
+    # Both give the same number of connected channels
+    assert (loop_matching(df_starts, flares, speeds, 1.5) == run_searchsorted()).all()
+
+    time_old = min(timeit.repeat(lambda: loop_matching(df_starts, flares, speeds, 1.5), number=1, repeat=repeat))
+    time_new = min(timeit.repeat(run_searchsorted, number=1, repeat=repeat))
+    print(f"{n_flares} flares, {n_events} events x {len(columns)} channels")
+    print(f"loop over flares:  {time_old * 1000:8.2f} ms")
+    print(f"searchsorted:      {time_new * 1000:8.2f} ms")
+    print(f"speed-up:          {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import timeit
+import numpy as np
+import pandas as pd
+from epd.rolling import RollingStats
+import config
+
+'''
+Benchmark of the running average on one month of EPT data (34 channels, synthetic).
+Compares pandas rolling (as used before) with the prefix sums of epd.rolling, for one window and for all window lengths
+of the app slider on the same prefix sums.
+'''
+
+
+def pandas_running_average(df, length):
+    # Previous implementation of epd.running_average
+    df_mean = df.rolling(window=length).mean()
+    df_std = df.rolling(window=length).std(ddof=0)
+    df_mean = pd.DataFrame(df_mean.shift(5, freq="min"), index=df.index)
+    df_std = pd.DataFrame(df_std.shift(5, freq="min"), index=df.index)
+    return df_mean, df_std
+
+
+def main(repeat=7):
+    rows = 30 * 86400 // config.TIME_RESOLUTION
+    columns = [f"Electron_Flux_{i}" for i in range(34)]
+    index = pd.date_range("2022-03-01", periods=rows, freq=f"{config.TIME_RESOLUTION}s")
+
+    rng = np.random.default_rng(0)
+    data = rng.normal(1000, 50, (rows, len(columns))) * np.exp(rng.normal(0, 0.5, (rows, len(columns))))
+    data[rng.random(data.shape) < 0.01] = np.nan
+    df = pd.DataFrame(data, index=index, columns=columns)
+
+    # Window lengths of the app slider
+    lengths = range(6, 25)
+
+    def best(function):
+        return min(timeit.repeat(function, number=1, repeat=repeat))
+
+    stats = RollingStats(df)
+    for length in [18, 24]:
+        df_mean, df_std = stats.running_average(length)
+        df_mean_pandas, df_std_pandas = pandas_running_average(df, length)
+        pd.testing.assert_frame_equal(df_mean, df_mean_pandas, rtol=1e-9)
+        pd.testing.assert_frame_equal(df_std, df_std_pandas, rtol=1e-6, atol=1e-4)
+
+    time_pandas = best(lambda: pandas_running_average(df, 18))
+    time_build = best(lambda: RollingStats(df))
+    time_window = best(lambda: stats.running_average(18))
+    time_pandas_all = best(lambda: [pandas_running_average(df, length) for length in lengths])
+    time_all = best(lambda: [stats.running_average(length) for length in lengths])
+
+    print(f"{rows} samples x {len(columns)} channels")
+    print(f"pandas rolling, one window:            {time_pandas * 1000:8.2f} ms")
+    print(f"prefix sums, build + one window:       {(time_build + time_window) * 1000:8.2f} ms")
+    print(f"prefix sums, one more window:          {time_window * 1000:8.2f} ms")
+    print(f"pandas rolling, {len(lengths)} windows:            {time_pandas_all * 1000:8.2f} ms")
+    print(f"prefix sums, {len(lengths)} windows (one build):  {(time_build + time_all) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
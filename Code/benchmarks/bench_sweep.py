@@ -0,0 +1,75 @@
+import sys
+import os
+
+# Making sure we have access to all the modules and are in the correct working directory
+dirname = os.path.dirname(__file__)
+code_dir = os.path.join(dirname, '../')
+sys.path.insert(0, code_dir)
+os.chdir(code_dir)
+
+import itertools
+import timeit
+import numpy as np
+import pandas as pd
+from epd import associations, sweep
+import config
+
+'''
+Benchmark of a parameter sweep (64 combinations, 30 days of all sensors, 300 flares, synthetic data).
+Compares one batch run (associations.generate) per combination with one run of the sweep sharing the data, the rolling
+statistics and the events.
+'''
+
+
+def synthetic_range(sensor, viewing, start_date, end_date):
+    columns = [f"Electron_Flux_{i}" for i in range(32 if sensor == "step" else 34)]
+    days = []
+    for date in pd.date_range(start_date, end_date):
+        rng = np.random.default_rng(date.toordinal())
+        index = pd.date_range(date, periods=86400 // config.TIME_RESOLUTION, freq=f"{config.TIME_RESOLUTION}s")
+        days.append(pd.DataFrame(rng.lognormal(0, 0.5, (len(index), len(columns))), index=index, columns=columns))
+    return pd.concat(days)
+
+
+def synthetic_flares(start_date, end_date, n_flares=300):
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp(start_date)
+    seconds = (pd.Timestamp(end_date) + pd.Timedelta(days=1) - start).total_seconds()
+    starts = start + pd.to_timedelta(np.sort(rng.uniform(0, seconds, n_flares)), unit="s")
+    flares = pd.DataFrame({"flare_id": np.arange(n_flares), "_date": starts + pd.Timedelta(minutes=5), "_date_start": starts,
+                           "_date_end": starts + pd.Timedelta(minutes=20), "Min Dist": rng.uniform(0, 60, n_flares)})
+    distance = pd.Series(rng.uniform(1e11, 2e11, n_flares), index=flares.index)
+    return flares, distance
+
+
+def main():
+    start_date, end_date = "2022-03-01", "2022-03-30"
+    flares, distance = synthetic_flares(start_date, end_date)
+    grid = sweep.Grid(window_length=[12, 18], step_sigma=[3, 3.5], ept_sigma=[2, 2.5], delta_flares=[10, 20],
+                      needed_channels=[3, 5], indirect_factor=[1, 1.5])
+
+    def one_run_per_combination():
+        for values in itertools.product(grid.window_length, grid.step_sigma, grid.ept_sigma, grid.delta_flares,
+                                        grid.needed_channels, grid.indirect_factor):
+            table = associations.generate(flares, distance, start_date, end_date, associations.Parameters(*values), workers=1,
+                                          path=False, load=synthetic_range)
+            associations.summary(table)
+
+    # The progress of the runs is not part of the output
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            time_old = timeit.timeit(one_run_per_combination, number=1)
+            time_new = timeit.timeit(lambda: sweep.generate(flares, distance, start_date, end_date, grid, workers=1, path=False,
+                                                            load=synthetic_range), number=1)
+        finally:
+            sys.stdout = stdout
+
+    print(f"{len(grid)} combinations, 30 days x {len(associations.SENSORS)} sensors, {len(flares)} flares")
+    print(f"one run per combination: {time_old:8.2f} s")
+    print(f"sweep:                   {time_new:8.2f} s ({len(grid) / time_new:.1f} combinations/s)")
+    print(f"speed-up:                {time_old / time_new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
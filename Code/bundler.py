@@ -4,19 +4,68 @@ import urllib.request
 import os
 
 def pack_epd():
-    shutil.make_archive(f"{config.CACHE_DIR}/EPD_DATA", "xztar", f"{config.CACHE_DIR}/EPD_Dataset/")
+    # The generator (generate_epd_dataset.py) writes the columnar store
+    shutil.make_archive(f"{config.CACHE_DIR}/EPD_STORE", "xztar", f"{config.CACHE_DIR}/EPD_Store/")
 
 def unpack_epd():
-    if os.path.isdir(f"{config.CACHE_DIR}/EPD_Dataset/"):
+    if os.path.isdir(f"{config.CACHE_DIR}/EPD_Store/"):
         print("Folder already exists! Not unpacking")
         return
-    shutil.unpack_archive(f"{config.CACHE_DIR}/EPD_DATA.tar.xz", f"{config.CACHE_DIR}/EPD_Dataset/")
+    if os.path.isfile(f"{config.CACHE_DIR}/EPD_STORE.tar.xz"):
+        shutil.unpack_archive(f"{config.CACHE_DIR}/EPD_STORE.tar.xz", f"{config.CACHE_DIR}/EPD_Store/")
+        return
+    # The published archive still holds the per day pickles, they are moved into the store once
+    if not os.path.isdir(f"{config.CACHE_DIR}/EPD_Dataset/"):
+        shutil.unpack_archive(f"{config.CACHE_DIR}/EPD_DATA.tar.xz", f"{config.CACHE_DIR}/EPD_Dataset/")
+    convert_epd()
 
 def download_epd():
+    if os.path.isdir(f"{config.CACHE_DIR}/EPD_Store/") or os.path.isfile(f"{config.CACHE_DIR}/EPD_STORE.tar.xz"):
+        return
     if not os.path.isfile(f"{config.CACHE_DIR}/EPD_DATA.tar.xz"):
         urllib.request.urlretrieve("https://projects.pmodwrc.ch/flaretool/EPD_DATA.tar.xz", 
                                 f"{config.CACHE_DIR}/EPD_DATA.tar.xz")
 
+def convert_epd():
+    from epd import store
+    for viewing in ['sun', 'asun', 'north', 'south']:
+        for particle in ['ion', 'electron']:
+            store.convert_pickles('ept', config.START_DATE, config.END_DATE, viewing, particle)
+    store.convert_pickles('step', config.START_DATE, config.END_DATE)
+
+def build_epd_cubes(only_missing=False):
+    from epd import cube
+    keys = [('ept', viewing, particle) for viewing in ['sun', 'asun', 'north', 'south'] for particle in ['ion', 'electron']]
+    for sensor, viewing, particle in keys + [('step', None, None)]:
+        if not (only_missing and cube.has_cube(sensor, viewing, particle)):
+            cube.build_cube(sensor, viewing, particle)
+
+def build_connectivity_store():
+    from connectivity_tool import store
+    added = store.ingest()
+    print(f"Added {added} connectivity tool files to the store")
+
+def build_connectivity_distance():
+    from stix import read_list, closest_timestamps
+    from connectivity_tool import distance
+    flares = read_list()
+    flares["Rounded"] = closest_timestamps(flares["peak_UTC"])
+    # Missing connectivity files are downloaded (with retries) here, not on the start of the app
+    distances = distance.load_table(flares)
+    print(f"{distances.isna().sum()} of {len(flares)} flares without connectivity tool data")
+    build_connectivity_store()
+
+def build_event_catalogs(only_missing=False):
+    from epd import catalog, associations
+    parameters = associations.Parameters()
+    for name, (sensor, viewing) in associations.SENSORS.items():
+        sigma = parameters.step_sigma if sensor == 'step' else parameters.ept_sigma
+        # Catalogs of older EPD data are built again as well
+        if only_missing and catalog.open_catalog(name, parameters.window_length, sigma) is not None:
+            continue
+        event_catalog = catalog.build_catalog(name, parameters.window_length, sigma)
+        print(f"Catalog {name}: {len(event_catalog)} events")
+
 def pack_connectivity_tool():
     shutil.make_archive(f"{config.CACHE_DIR}/CON_DATA", "xztar", f"{config.CACHE_DIR}/connectivity_tool_downloads/")
 
@@ -56,7 +105,12 @@ def auto_download():
     download_monthly()
     print("Finished Monthly-Download")
     unpack_epd()
+    # The app reads the cubes and the event catalogs, they are only built on the first start (and the catalogs when the data changed)
+    build_epd_cubes(only_missing=True)
+    build_event_catalogs(only_missing=True)
+    print("Finished EPD-Setup")
     unpack_connectivity_tool()
+    build_connectivity_store()
     unpack_monthly()
     print("Finished Setup")
 
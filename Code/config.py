@@ -7,4 +7,11 @@ END_DATE    = '2024-12-31'
 
 TIME_RESOLUTION = 300 # In Seconds
 
-DELTA = 10 # Degrees
\ No newline at end of file
+DELTA = 10 # Degrees
+
+# Memory budget of the connectivity tool slots (sliced from the store or read directly), in MB
+CONNECTIVITY_CACHE_MB = 256
+# Folder for the files evicted from that cache (None: evicted files are read again)
+CONNECTIVITY_SPILL_DIR = None
+# Disk budget of that folder, the least recently used files are deleted first, in MB
+CONNECTIVITY_SPILL_MB = 1024
@@ -0,0 +1,105 @@
+'''
+Distance of the STIX flares to the magnetic footpoints of the connectivity tool ("Min Dist").
+
+The flares are grouped by their 6 hour slot (column "Rounded", see stix.closest_timestamp), so every connectivity
+file is read once, and the distances of all flares of a slot to all footpoints are computed at once.
+The results are kept in a table keyed by flare_id, only flares that are new (or moved) are computed again.
+'''
+import os
+import numpy as np
+import pandas as pd
+
+import config
+from .core import read_data
+
+KEY_COLUMNS = ['Rounded', 'hgc_lon', 'hgc_lat']
+
+
+def distance_path():
+    return f'{config.CACHE_DIR}/connectivity_tool_distance.parquet'
+
+
+def min_distances(flare_lon, flare_lat, con_longitudes, con_latitudes):
+    '''
+    Returns the distance [°] of every flare to its closest footpoint (nan if there are no footpoints)
+
+    parameters:
+    flare_lon:      Carrington longitudes of the flares
+    flare_lat:      Carrington latitudes of the flares
+    con_longitudes: Carrington longitudes of the footpoints (CRLN)
+    con_latitudes:  Carrington latitudes of the footpoints (CRLT)
+    '''
+    flare_lon = np.asarray(flare_lon, dtype=np.float64)[:, np.newaxis]
+    flare_lat = np.asarray(flare_lat, dtype=np.float64)[:, np.newaxis]
+    con_longitudes = np.asarray(con_longitudes, dtype=np.float64)[np.newaxis, :]
+    con_latitudes = np.asarray(con_latitudes, dtype=np.float64)[np.newaxis, :]
+
+    if con_longitudes.shape[1] == 0:
+        return np.full(flare_lon.shape[0], np.nan)
+
+    # Making sure we get the shortest distance
+    lon_dist = np.minimum((con_longitudes - flare_lon) % 360, (flare_lon - con_longitudes) % 360)
+    lat_dist = con_latitudes - flare_lat
+
+    dist_sq = lon_dist ** 2 + lat_dist ** 2
+    return np.sqrt(np.min(dist_sq, axis=1))
+
+
+def compute_table(flares: pd.DataFrame, download=True):
+    '''
+    Computes the table (flare_id, Rounded, hgc_lon, hgc_lat, Min Dist) of the flares with one read per 6 hour slot
+
+    parameters:
+    flares:     STIX flare list with the column Rounded
+    download:   download missing connectivity files, False leaves their flares nan
+    '''
+    table = flares[['flare_id'] + KEY_COLUMNS].copy()
+    table['Min Dist'] = np.nan
+
+    for rounded, group in flares.groupby('Rounded', sort=True):
+        con_tool_data = read_data(rounded, download)
+        table.loc[group.index, 'Min Dist'] = min_distances(group['hgc_lon'], group['hgc_lat'], con_tool_data['CRLN'], con_tool_data['CRLT'])
+
+    return table.reset_index(drop=True)
+
+
+def load_table(flares: pd.DataFrame, path=None, download=True):
+    '''
+    Returns the Min Dist of the flares (Series with the index of flares).
+    The stored table is used for all flares with the same slot and location, the others are computed and added to the table.
+    Flares without footpoints (missing connectivity file) are nan and not stored, so they are tried again next time.
+
+    parameters:
+    flares:     STIX flare list with the column Rounded
+    path:       path of the table (default: distance_path())
+    download:   download missing connectivity files (with retries, see downloader.py), False only reads the local files
+                (the app, the downloads are done by bundler.build_connectivity_distance)
+    '''
+    path = path or distance_path()
+    stored = pd.read_parquet(path) if os.path.isfile(path) else None
+
+    if stored is None:
+        distances = pd.Series(np.nan, index=flares.index, name='Min Dist')
+        valid = pd.Series(False, index=flares.index)
+    else:
+        merged = flares[['flare_id'] + KEY_COLUMNS].merge(stored, on='flare_id', how='left', suffixes=('', '_stored'))
+        merged.index = flares.index
+        distances = merged['Min Dist'].copy()
+        valid = distances.notna()
+        for column in KEY_COLUMNS:
+            valid &= merged[column] == merged[f'{column}_stored']
+        if valid.all():
+            return distances
+
+    computed = compute_table(flares[~valid], download)
+    distances[~valid] = computed['Min Dist'].to_numpy()
+
+    table = computed[computed['Min Dist'].notna()]
+    if len(table) > 0:
+        if stored is not None:
+            table = pd.concat([stored[~stored['flare_id'].isin(table['flare_id'])], table], ignore_index=True)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        table.to_parquet(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    return distances
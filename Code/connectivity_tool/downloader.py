@@ -1,8 +1,12 @@
 from datetime import datetime, timedelta
 import os
 import re
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 import zipfile
 from io import BytesIO
 import config
@@ -17,61 +21,169 @@ DOWNLOAD_URL_REGEX = re.compile(r'<a id ="click_to_download" href="(.*)" downloa
 BASE_URL = "http://connect-tool.irap.omp.eu/"
 
 FILE_WHITELIST_REGEX = [
-    r".*_backgroundmag\.png", 
-    r".*_fileconnectivity\.ascii", 
+    r".*_backgroundmag\.png",
+    r".*_fileconnectivity\.ascii",
     r".*_finallegendmag\.png"
 ]
 
-def extract_download_url(content):
+# HTTP status codes that are worth another try
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def extract_download_url(content, base_url=BASE_URL):
     matches = DOWNLOAD_URL_REGEX.findall(content)
     assert len(matches) == 1, f"Something is Wrong with the Connectivity Tool: Found {len(matches)} Downloads expected 1"
     download_url: str = matches[0]
     assert download_url.endswith(".zip"), f"Something is Wrong with the Connectivity Tool: Expected zip file got {download_url}"
 
     # Resolving the relative url
-    return urljoin(BASE_URL, download_url)
+    return urljoin(base_url, download_url)
 
 
 
-def _download_set(date_point: datetime):
+def _download_set(date_point: datetime, session=None, base_url=BASE_URL, timeout=60):
     # We only allow the hours 0, 6, 12, 18
     assert date_point.hour % 6 == 0, "Somethings wrong with the date, make sure to round/floor it to the next multiple of 6 hours"
-    request_link = date_point.strftime(f'{BASE_URL}/api/SOLO/ADAPT/PARKER/SCTIME/%Y-%m-%d/%H0000')
-    
-    req = requests.get(request_link)
+    request_link = date_point.strftime(f'{base_url}/api/SOLO/ADAPT/PARKER/SCTIME/%Y-%m-%d/%H0000')
+    session = session or requests
+
+    req = session.get(request_link, timeout=timeout)
+    req.raise_for_status()
     website_content = req.content.decode()
-    download_link = extract_download_url(website_content)
-    
-    data_req = requests.get(download_link)
+    download_link = extract_download_url(website_content, base_url)
+
+    data_req = session.get(download_link, timeout=timeout)
+    data_req.raise_for_status()
     virtual_file = BytesIO(data_req.content)
     return virtual_file
 
 
-def download_files(start_date: datetime, end_date: datetime, download_all = False):
+def extract_files(zip_file, directory):
+    '''
+    Extracts the whitelisted files of the zip into the directory. Every file is written to a temporary file first and then
+    renamed, so a reader (or an interrupted download) never leaves half a file behind.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+        for file in zip_ref.filelist:
+            if not any(re.fullmatch(regex, file.filename) for regex in FILE_WHITELIST_REGEX):
+                continue
+            path = os.path.join(directory, file.filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with zip_ref.open(file) as source, open(path + '.part', 'wb') as destination:
+                destination.write(source.read())
+            os.replace(path + '.part', path)
+
+
+class RateLimiter:
+    '''
+    Lets at most `rate` downloads per second start (shared between all threads), None for no limit
+    '''
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_start = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(start - now)
+
+
+class Downloader:
+    '''
+    Downloads the connectivity tool data of several 6 hour slots at once.
+
+    parameters:
+    directory:      folder the files are extracted to
+    concurrency:    number of slots downloaded at the same time (one pooled session is shared by all threads)
+    rate:           maximum number of slot downloads started per second, None for no limit
+    retries:        number of retries of a failed slot
+    backoff:        waiting time before the first retry in seconds, doubled for every further retry
+    timeout:        timeout of a single request in seconds
+    base_url:       url of the connectivity tool (or of a local stand-in, see local_server.py)
+    '''
+    def __init__(self, directory=None, concurrency=4, rate=None, retries=4, backoff=1.0, timeout=60, base_url=BASE_URL):
+        self.directory = directory or f'{config.CACHE_DIR}/connectivity_tool_downloads'
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.base_url = base_url
+        self.limiter = RateLimiter(rate)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def path(self, date_point: datetime):
+        folder_name = date_point.strftime('SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_%Y%m%dT%H0000')
+        return f'{self.directory}/' + folder_name + '_fileconnectivity.ascii'
+
+    def fetch(self, date_point: datetime):
+        '''
+        Downloads and extracts one slot, failed attempts are retried with exponential backoff
+        '''
+        for attempt in range(self.retries + 1):
+            try:
+                self.limiter.wait()
+                zip_file = _download_set(date_point, self.session, self.base_url, self.timeout)
+                extract_files(zip_file, self.directory)
+                return
+            except (requests.RequestException, zipfile.BadZipFile) as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if attempt == self.retries or (status is not None and status not in RETRY_STATUS):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def download(self, date_points, download_all=False):
+        '''
+        Downloads all slots (missing ones only, unless download_all). Returns a dict {slot: exception} of the failed slots
+        '''
+        date_points = [date_point for date_point in date_points if download_all or not os.path.isfile(self.path(date_point))]
+        failed = {}
+
+        def fetch(date_point):
+            try:
+                self.fetch(date_point)
+            except Exception as e:
+                failed[date_point] = e
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(fetch, date_points))
+
+        return failed
+
+    def close(self):
+        self.session.close()
+
+
+def download_files(start_date: datetime, end_date: datetime, download_all = False, concurrency=4, base_url=BASE_URL):
     '''
     Automatically download connectivity tool data and unzip the downloaded folders. Then copy the needed files into correct directory and delete unnecessary files.
+    The slots are downloaded concurrently (see Downloader), raises the first error if a slot failed.
     '''
 
     # Date should be inclusive
-
-    directory_to_extract_to = f'{config.CACHE_DIR}/connectivity_tool_downloads'
-
+    date_points = []
     while start_date <= end_date:
-        folder_name = start_date.strftime('SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_%Y%m%dT%H0000')
-        path = f'{directory_to_extract_to}/' + folder_name + '_fileconnectivity.ascii'
-        if not os.path.isfile(path) or download_all:
-
-            zip_file = _download_set(start_date)
-            
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                for file in zip_ref.filelist:
-                    if any(re.fullmatch(regex, file.filename) for regex in FILE_WHITELIST_REGEX):
-                        zip_ref.extract(file.filename, directory_to_extract_to)
-            
+        date_points.append(start_date)
         start_date += timedelta(hours=6)
-    
+
+    downloader = Downloader(concurrency=concurrency, base_url=base_url)
+    try:
+        failed = downloader.download(date_points, download_all)
+    finally:
+        downloader.close()
+
+    if failed:
+        raise next(iter(failed.values()))
     return
 
 
 if __name__ == "__main__":
-    download_files(datetime(year=2022, month=3, day=5), datetime(year=2022, month=3, day=8))
\ No newline at end of file
+    download_files(datetime(year=2022, month=3, day=5), datetime(year=2022, month=3, day=8))
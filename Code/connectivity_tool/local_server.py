@@ -0,0 +1,129 @@
+'''
+Local stand-in for the connectivity tool (for testing and benchmarking the downloader offline).
+
+It answers like the real server:
+    /api/SOLO/ADAPT/PARKER/SCTIME/yyyy-mm-dd/hhmmss     -> HTML page with the download link (see DOWNLOAD_URL_REGEX)
+    /static/download_files/<name>.zip                   -> zip with the connectivity file and the two images
+The connectivity file has 20 header lines (line 18 holds the time of the slot) followed by random footpoints.
+
+Usage:
+    with LocalServer(latency=0.05) as server:
+        download_files(start, end, base_url=server.url)
+'''
+import io
+import re
+import time
+import zipfile
+import threading
+import numpy as np
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PAGE_REGEX = re.compile(r'/+api/SOLO/ADAPT/PARKER/SCTIME/(\d{4}-\d{2}-\d{2})/(\d{2})0000')
+ZIP_REGEX = re.compile(r'/static/download_files/(SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_(\d{8}T\d{2})0000)\.zip')
+
+
+def connectivity_file(date_point: datetime, n_footpoints=1000):
+    '''
+    Content of a connectivity file of the slot with random footpoints
+    '''
+    rng = np.random.default_rng(int(date_point.timestamp()))
+    lines = [f'# header line {i}' for i in range(17)] + [date_point.isoformat(sep=' '), '#', '# i density R CRLT CRLN DIST HPLT HPLN']
+    flags = rng.choice(['SSW', 'FSW', 'M'], n_footpoints)
+    values = rng.uniform([0, 695700, -90, 0, 1e10, -1000, -1000], [1, 695800, 90, 360, 2e11, 1000, 1000], (n_footpoints, 7))
+    for i in range(n_footpoints):
+        lines.append(f'{flags[i]} {i} ' + ' '.join(f'{value:.6g}' for value in values[i]))
+    return '\n'.join(lines) + '\n'
+
+
+def zip_content(name, date_point: datetime, n_footpoints=1000):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip:
+        zip.writestr(f'{name}_fileconnectivity.ascii', connectivity_file(date_point, n_footpoints))
+        zip.writestr(f'{name}_backgroundmag.png', b'png')
+        zip.writestr(f'{name}_finallegendmag.png', b'png')
+        # Not whitelisted, the downloader must skip it
+        zip.writestr(f'{name}_other.txt', b'skip')
+    return buffer.getvalue()
+
+
+class LocalServer:
+    '''
+    Threaded HTTP server on localhost (random free port), serving the pages and zips of all slots.
+
+    parameters:
+    latency:        seconds every response is delayed (simulates the round trip to the real server)
+    fail_every:     every n-th request is answered with 503 (tests the retries), 0 never fails
+    n_footpoints:   number of lines of the connectivity files
+    '''
+    def __init__(self, latency=0.0, fail_every=0, n_footpoints=1000):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.n_footpoints = n_footpoints
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the pooled connections of the downloader are reused
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+        self.thread = None
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        with self.lock:
+            self.requests += 1
+            count = self.requests
+        time.sleep(self.latency)
+
+        if self.fail_every and count % self.fail_every == 0:
+            self._send(request, 503, b'busy', 'text/plain')
+            return
+
+        page = PAGE_REGEX.fullmatch(request.path)
+        if page is not None:
+            date_point = datetime.fromisoformat(f'{page.group(1)}T{page.group(2)}:00:00')
+            name = date_point.strftime('SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_%Y%m%dT%H0000')
+            html = f'<html><body>Click <a id ="click_to_download" href="/static/download_files/{name}.zip" download>here</a></body></html>'
+            self._send(request, 200, html.encode(), 'text/html')
+            return
+
+        archive = ZIP_REGEX.fullmatch(request.path)
+        if archive is not None:
+            date_point = datetime.strptime(archive.group(2), '%Y%m%dT%H')
+            self._send(request, 200, zip_content(archive.group(1), date_point, self.n_footpoints), 'application/zip')
+            return
+
+        self._send(request, 404, b'not found', 'text/plain')
+
+    def _send(self, request, status, body, content_type):
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,179 @@
+'''
+Binary store of the connectivity tool data.
+
+All downloaded *_fileconnectivity.ascii files are parsed once and written into one .npz file:
+    slots:              timestamps of the files (yyyymmddThhmmss), sorted
+    offsets:            rows of slot i are offsets[i]:offsets[i + 1]
+    flag, flag_names:   SSW/FSW/M as codes into flag_names
+    density, R, CRLT, CRLN, DIST, HPLT, HPLN: float32 columns
+
+read_data (core.py) then only slices the arrays of the slot. Files downloaded later are added by the next ingest.
+The arrays are memory mapped (np.savez doesn't compress), so the store is never read into memory as a whole, only the
+copied slots are kept (within the memory budget of core.py).
+'''
+import os
+import glob
+import re
+import struct
+import zipfile
+import threading
+import numpy as np
+import pandas as pd
+
+import config
+
+COLUMNS = ["density", "R", "CRLT", "CRLN", "DIST", "HPLT", "HPLN"]
+FLAG_COLUMN = "SSW/FSW/M"
+
+FILE_REGEX = re.compile(r'SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_(\d{8}T\d{6})_fileconnectivity\.ascii')
+
+# Mapped stores by path, with the modification time of the file when it was mapped (one mapping per path)
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def store_path():
+    return f'{config.CACHE_DIR}/connectivity_tool_store.npz'
+
+
+def download_directory():
+    return f'{config.CACHE_DIR}/connectivity_tool_downloads'
+
+
+def slot(utc):
+    '''
+    Returns the timestamp of the file (yyyymmddThhmmss) of a rounded utc string (yyyy-mm-ddThh:00:00.000)
+    '''
+    return utc[0:4] + utc[5:7] + utc[8:13] + '0000'
+
+
+def parse_file(filename):
+    '''
+    Reads one connectivity file (20 header lines, then one footpoint per line) into a dataframe
+    '''
+    try:
+        df = pd.read_csv(filename, sep=r'\s+', skiprows=20, header=None, usecols=range(9))
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=range(9))
+
+    data = {FLAG_COLUMN: df[0].astype(str).to_numpy()}
+    for i, column in enumerate(COLUMNS):
+        data[column] = df[i + 2].to_numpy(dtype=np.float32)
+    return data
+
+
+def map_npz(path):
+    '''
+    Returns the arrays of an .npz file as read only memory maps (compressed members are read)
+    '''
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as npz_file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # The data of the member starts after its local header (30 bytes, file name and extra field)
+            npz_file.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', npz_file.read(30)[26:30])
+            npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(npz_file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(npz_file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(npz_file)
+
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=npz_file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _load(path):
+    mtime = os.path.getmtime(path)
+    with _loaded_lock:
+        if path not in _loaded or _loaded[path][0] != mtime:
+            arrays = map_npz(path)
+            arrays['index'] = {str(name): i for i, name in enumerate(arrays['slots'])}
+            _loaded[path] = (mtime, arrays)
+        return _loaded[path][1]
+
+
+def read_slot(utc, path=None):
+    '''
+    Returns the dataframe of the slot or None if the store doesn't hold the slot
+    '''
+    path = path or store_path()
+    if not os.path.isfile(path):
+        return None
+
+    arrays = _load(path)
+    i = arrays['index'].get(slot(utc))
+    if i is None:
+        return None
+
+    # Copies, the dataframe doesn't keep the mapping alive
+    start, end = arrays['offsets'][i], arrays['offsets'][i + 1]
+    data = {FLAG_COLUMN: pd.Categorical.from_codes(np.array(arrays['flag'][start:end]), np.array(arrays['flag_names']))}
+    for column in COLUMNS:
+        data[column] = np.array(arrays[column][start:end])
+    return pd.DataFrame(data)
+
+
+def ingest(directory=None, path=None):
+    '''
+    Parses all connectivity files of the directory that are not yet in the store and rewrites the store.
+    Returns the number of added files.
+
+    parameters:
+    directory:  folder with the downloaded files (default: connectivity_tool_downloads in the cache)
+    path:       path of the store (default: store_path())
+    '''
+    directory = directory or download_directory()
+    path = path or store_path()
+
+    files = {}
+    for filename in glob.glob(f'{directory}/*_fileconnectivity.ascii'):
+        match = FILE_REGEX.fullmatch(os.path.basename(filename))
+        if match is not None:
+            files[match.group(1)] = filename
+
+    parts = {}
+    if os.path.isfile(path):
+        # Keeping the slots of the store, the flags are decoded so the flag names of old and new files can be merged
+        arrays = _load(path)
+        flags = arrays['flag_names'][arrays['flag']]
+        for i, name in enumerate(arrays['slots']):
+            start, end = arrays['offsets'][i], arrays['offsets'][i + 1]
+            parts[str(name)] = {FLAG_COLUMN: flags[start:end], **{column: arrays[column][start:end] for column in COLUMNS}}
+
+    new_slots = sorted(set(files) - set(parts))
+    if not new_slots:
+        return 0
+
+    for name in new_slots:
+        parts[name] = parse_file(files[name])
+
+    slots = sorted(parts)
+    lengths = [len(parts[name][FLAG_COLUMN]) for name in slots]
+    flag_names, flag = np.unique(np.concatenate([parts[name][FLAG_COLUMN] for name in slots]).astype(str), return_inverse=True)
+
+    arrays = {
+        'slots': np.array(slots),
+        'offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        'flag': flag.astype(np.int8),
+        'flag_names': flag_names,
+    }
+    for column in COLUMNS:
+        arrays[column] = np.concatenate([parts[name][column] for name in slots]).astype(np.float32)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # np.savez adds .npz to names without it
+    temp_path = path + '.tmp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+    return len(new_slots)
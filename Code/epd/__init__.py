@@ -1,2 +1,6 @@
-from .loader import load_data, load_pickles
-from .data_helper import reduce_data, running_average, get_energies
\ No newline at end of file
+from .loader import load_data, load_pickles, load_step_electron, iter_days
+from .data_helper import reduce_data, running_average, get_energies, step_electron
+from .events import detect_events
+from .rolling import RollingStats
+from .matching import match_flares
+from .chunks import detect_events_chunked
\ No newline at end of file
@@ -0,0 +1,228 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import misc
+import config
+from stix import FlareIndex
+from .loader import load_pickles, load_step_electron, STEP_SHORT_DATE
+from .data_helper import running_average
+from .chunks import halo_days
+from .events import detect_events
+from .matching import match_flares
+
+'''
+Batch association of the STIX flares with the EPD events over the whole mission (no plots).
+
+The time span is split into chunks of a few weeks, a chunk never contains the day STEP changed its data product
+(STEP_SHORT_DATE). Every chunk is an independent job of the process pool: load the data of all sensors, detect the events and
+match the flares peaking in the chunk. The data is loaded with a halo of whole days before the chunk (see chunks.py), so the
+running average and the events are the same as in one pass over the whole range, and `margin` days past the end of the
+chunk, so the flares at the end of a chunk still see the particles arriving on the next day.
+The rows of all chunks (one per flare and sensor) are concatenated into one association table.
+'''
+
+# Name in the tables -> (sensor, viewing)
+SENSORS = {
+    "EPT-SUN": ("ept", "sun"),
+    "EPT-ASUN": ("ept", "asun"),
+    "EPT-NORTH": ("ept", "north"),
+    "EPT-SOUTH": ("ept", "south"),
+    "STEP": ("step", None),
+}
+
+
+@dataclass
+class Parameters:
+    '''
+    Parameters of the detection and matching (defaults of generate_monthly.py)
+    '''
+    window_length: int = 18
+    step_sigma: float = 3.5
+    ept_sigma: float = 2.5
+    delta_flares: float = 20
+    needed_channels: int = 5
+    indirect_factor: float = 1.5
+
+
+def associations_path():
+    return f'{config.OUTPUT_DIR}/associations.csv'
+
+
+def load_sensor(sensor, viewing, start_date, end_date):
+    '''
+    Electron flux of the sensor between start_date and end_date (both inclusive) from the dataset
+    '''
+    if sensor == 'step':
+        return load_step_electron(start_date, end_date)
+    return load_pickles(sensor, start_date, end_date, viewing=viewing)
+
+
+def sensor_speeds(sensor, n_channels):
+    if sensor == 'step':
+        return misc.physics.get_step_speeds(length=n_channels)
+    return misc.misc_handler.compute_particle_speed(34, 'electron')
+
+
+def chunk_ranges(start_date, end_date, days=30, margin=1, halo=0):
+    '''
+    Splits the days between start_date and end_date (both inclusive) into chunks.
+    Returns a list of (data_start, chunk_start, chunk_end, data_end) as strings (yyyy-mm-dd)
+
+    parameters:
+    days:   maximal number of days of a chunk
+    margin: number of days the data is loaded past the chunk end (not across the end or the STEP change)
+    halo:   number of days the data is loaded before the chunk start (not across the start or the STEP change)
+    '''
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    switch = pd.Timestamp(STEP_SHORT_DATE)
+    one_day = pd.Timedelta(days=1)
+
+    segments = [(start, end)]
+    if start < switch <= end:
+        segments = [(start, switch - one_day), (switch, end)]
+
+    chunks = []
+    for segment_start, segment_end in segments:
+        chunk_start = segment_start
+        while chunk_start <= segment_end:
+            chunk_end = min(chunk_start + (days - 1) * one_day, segment_end)
+            data_start = max(chunk_start - halo * one_day, segment_start)
+            data_end = min(chunk_end + margin * one_day, segment_end)
+            chunks.append(tuple(str(date.date()) for date in (data_start, chunk_start, chunk_end, data_end)))
+            chunk_start = chunk_end + one_day
+    return chunks
+
+
+def associate_chunk(data_start, data_end, flares: pd.DataFrame, distance, parameters: Parameters, load=load_sensor):
+    '''
+    Detects the events of all sensors between data_start and data_end and matches them with the flares.
+    Returns the rows of the association table (index of the flares)
+
+    parameters:
+    flares:     flares of the chunk (columns flare_id, _date_start and _date_end, see stix.prepare_flares)
+    distance:   Parker spiral distance of these flares [m]
+    load:       function (sensor, viewing, start_date, end_date) -> dataframe with the flux of all channels
+    '''
+    rows = []
+    for name, (sensor, viewing) in SENSORS.items():
+        df_sensor = load(sensor, viewing, data_start, data_end)
+        running_mean, running_std = running_average(df_sensor, parameters.window_length)
+        sigma = parameters.step_sigma if sensor == 'step' else parameters.ept_sigma
+        df_starts, _ = detect_events(df_sensor, running_mean, running_std, sigma)
+
+        channels, first, last = match_flares(df_starts, flares["_date_start"], flares["_date_end"], distance,
+                                             sensor_speeds(sensor, len(df_sensor.columns)), parameters.indirect_factor)
+
+        # -1 (no connected channel) becomes None
+        channel_names = np.append(np.asarray(df_sensor.columns, dtype=object), None)
+        rows.append(pd.DataFrame({"flare_id": flares["flare_id"].to_numpy(), "sensor": name, "channels": channels,
+                                  "first_channel": channel_names[first], "last_channel": channel_names[last]},
+                                 index=flares.index))
+    return pd.concat(rows)
+
+
+def summary(table: pd.DataFrame):
+    '''
+    Number of connected flares per sensor, of all EPT directions and of all sensors (like the table of the app)
+    '''
+    connected = table[table["connected"]]
+    counts = {name: connected.loc[connected["sensor"] == name, "flare_id"].nunique() for name in SENSORS}
+    counts["EPT (All Directions)"] = connected.loc[connected["sensor"] != "STEP", "flare_id"].nunique()
+    counts["Total (All Sensors)"] = connected["flare_id"].nunique()
+    return pd.Series(counts, name="Flares deemed connected")
+
+
+def chunk_jobs(flares: pd.DataFrame, distance: pd.Series, start_date, end_date, days=30, margin=1, halo=0):
+    '''
+    Returns the list of ((chunk_start, chunk_end), (data_start, data_end, flares, distance)) of all chunks with flares
+    '''
+    index = FlareIndex(flares, peak="_date")
+
+    jobs = []
+    for data_start, chunk_start, chunk_end, data_end in chunk_ranges(start_date, end_date, days, margin, halo):
+        labels = index.in_dates(chunk_start, chunk_end)
+        if len(labels) > 0:
+            chunk_flares = flares.loc[labels, ["flare_id", "_date_start", "_date_end"]]
+            jobs.append(((chunk_start, chunk_end), (data_start, data_end, chunk_flares, distance.reindex(labels))))
+    return jobs
+
+
+def run_jobs(function, jobs, workers=None):
+    '''
+    Runs function(*arguments) of all jobs [(chunk, arguments)] in the process pool.
+    Returns the list of the results and the list of the failed chunks (failed chunks are reported and skipped)
+    '''
+    started = time.perf_counter()
+    results = []
+    failed = []
+
+    def finish(chunk, result):
+        try:
+            results.append(result())
+        except Exception as e:
+            failed.append(chunk)
+            print(f'Failed chunk {chunk[0]} - {chunk[1]}:', repr(e))
+            return
+        elapsed = time.perf_counter() - started
+        print(f'Finished {chunk[0]} - {chunk[1]} ({len(results)} of {len(jobs)}, {elapsed:.1f} s)')
+
+    if workers == 1:
+        for chunk, arguments in jobs:
+            finish(chunk, lambda: function(*arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {executor.submit(function, *arguments): chunk for chunk, arguments in jobs}
+            for future in as_completed(futures):
+                finish(futures[future], future.result)
+
+    if failed:
+        print(f'{len(failed)} chunks failed:', ', '.join(f'{start} - {end}' for start, end in failed))
+    return results, failed
+
+
+def generate(flares: pd.DataFrame, distance: pd.Series, start_date=config.START_DATE, end_date=config.END_DATE,
+             parameters=None, days=30, margin=1, workers=None, path=None, load=load_sensor):
+    '''
+    Associates all flares peaking between start_date and end_date (both inclusive) with the events of all sensors, the chunks
+    run in parallel. Writes and returns the association table: one row per flare and sensor with the number of connected
+    channels, the first and last connected channel, epd_event, mct and connected.
+
+    parameters:
+    flares:     STIX flare list with the columns of stix.prepare_flares and 'Min Dist'
+    distance:   Parker spiral distance of the flares [m] (index of flares)
+    parameters: Parameters of the detection and matching (default: Parameters())
+    days:       maximal number of days of a chunk
+    margin:     number of days the data is loaded past a chunk
+    workers:    number of worker processes (default: number of cores), 1 runs everything in this process
+    path:       path of the csv table (default: associations_path()), False to not write it
+    load:       function (sensor, viewing, start_date, end_date) -> dataframe, must be picklable for workers > 1
+    '''
+    parameters = parameters or Parameters()
+    jobs = chunk_jobs(flares, distance, start_date, end_date, days, margin, halo_days(parameters.window_length))
+    n_days = len(misc.day_range(str(pd.Timestamp(start_date).date()), str(pd.Timestamp(end_date).date())))
+    print(f'{len(jobs)} chunks with flares, {sum(len(job[1][2]) for job in jobs)} flares, {n_days} days')
+
+    started = time.perf_counter()
+    results, _ = run_jobs(associate_chunk, [(chunk, arguments + (parameters, load)) for chunk, arguments in jobs], workers)
+
+    columns = ["flare_id", "sensor", "channels", "first_channel", "last_channel"]
+    table = pd.concat(results).sort_index(kind='stable') if results else pd.DataFrame(columns=columns)
+    table["Min Dist"] = flares["Min Dist"].reindex(table.index).to_numpy()
+    table["mct"] = table["Min Dist"] <= parameters.delta_flares
+    table["epd_event"] = table["channels"] >= parameters.needed_channels
+    table["connected"] = table["mct"] & table["epd_event"]
+
+    elapsed = time.perf_counter() - started
+    n_flares = table["flare_id"].nunique()
+    print(f'{n_flares} flares of {n_days} days in {elapsed:.1f} s: {n_days / elapsed:.1f} days/s, {n_flares / elapsed:.1f} flares/s')
+
+    if path is not False:
+        path = path or associations_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        table.to_csv(path + '.tmp', index_label='flare_index')
+        os.replace(path + '.tmp', path)
+    return table
@@ -0,0 +1,189 @@
+import os
+import glob
+import hashlib
+import functools
+import numpy as np
+import pandas as pd
+
+import config
+from . import store, cube
+from .loader import STEP_SHORT_DATE
+from .chunks import detect_events_chunked
+from .events import runs_to_frame
+from .associations import SENSORS, load_sensor
+
+'''
+Catalog of all EPD events of the mission for one sensor and parameter set (window length, sigma).
+
+The events are detected once over the whole mission (chunk by chunk, see chunks.py) and written into one .npz file:
+    start, end:         timestamps of the events (datetime64[ns]), sorted by start
+    channel:            codes into channel_names
+    covered:            first and last day of the catalog
+    version:            version of the EPD data the events were detected from (see data_version)
+The app then only slices the events of the selected days (two binary searches), parameters without a catalog are
+computed live. A catalog of other data (the dataset was regenerated or extended since) is not used either.
+'''
+
+
+def catalog_directory():
+    return f'{config.CACHE_DIR}/EPD_Catalog'
+
+
+def catalog_path(name, window_length, sigma):
+    '''
+    parameters:
+    name:   name of the sensor (see associations.SENSORS, e.g. EPT-SUN)
+    '''
+    return f'{catalog_directory()}/{name}_w{window_length}_s{float(sigma):g}.npz'
+
+
+def data_version(name):
+    '''
+    Version of the EPD data of the sensor (the files load_pickles reads: cube, store or pickles), changes whenever one of
+    the files is written
+    '''
+    sensor, viewing = SENSORS[name]
+    if sensor == 'ept':
+        store_viewing, store_particle = viewing, 'electron'
+        pickle_folder = f'{config.CACHE_DIR}/EPD_Dataset/ept/{viewing}/electron'
+    else:
+        store_viewing, store_particle = None, None
+        pickle_folder = f'{config.CACHE_DIR}/EPD_Dataset/step'
+
+    if cube.has_cube(sensor, store_viewing, store_particle):
+        path = cube.cube_path(sensor, store_viewing, store_particle)
+        paths = [path + '.json', path + '.f32']
+    elif store.has_data(sensor, store_viewing, store_particle):
+        paths = glob.glob(f'{store.chunk_folder(sensor, store_viewing, store_particle)}/*.parquet')
+    else:
+        paths = glob.glob(f'{pickle_folder}/*.pkl')
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)} {stat.st_size} {stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def _segments(start_date, end_date):
+    # STEP changed its data product, the running average must not reach across that day
+    start, end, switch = pd.Timestamp(start_date), pd.Timestamp(end_date), pd.Timestamp(STEP_SHORT_DATE)
+    if start < switch <= end:
+        return [(start_date, str((switch - pd.Timedelta(days=1)).date())), (STEP_SHORT_DATE, end_date)]
+    return [(start_date, end_date)]
+
+
+def build_catalog(name, window_length, sigma, start_date=config.START_DATE, end_date=config.END_DATE, days=30, path=None,
+                  load=load_sensor, version=None):
+    '''
+    Detects all events of the sensor between start_date and end_date (both inclusive) and writes the catalog.
+    Returns the EventCatalog
+
+    parameters:
+    name:           name of the sensor (see associations.SENSORS)
+    window_length:  number of datapoints in the window of the running average
+    sigma:          factor of the standard deviation
+    days:           number of days processed at once
+    load:           function (sensor, viewing, start_date, end_date) -> dataframe with the flux of all channels
+    version:        version of the data (default: data_version(name), before the data is read)
+    '''
+    sensor, viewing = SENSORS[name]
+    path = path or catalog_path(name, window_length, sigma)
+    version = version if version is not None else data_version(name)
+
+    channel_names = []
+    channels, starts, ends = [], [], []
+    for segment_start, segment_end in _segments(start_date, end_date):
+        df_starts, df_ends = detect_events_chunked(functools.partial(load, sensor, viewing), segment_start, segment_end,
+                                                   sigma, window_length, days)
+        for column in df_starts.columns:
+            if column not in channel_names:
+                channel_names.append(column)
+            start = df_starts[column].dropna().to_numpy(dtype='datetime64[ns]')
+            channels.append(np.full(len(start), channel_names.index(column), dtype=np.int16))
+            starts.append(start)
+            ends.append(df_ends[column].dropna().to_numpy(dtype='datetime64[ns]'))
+
+    start = np.concatenate(starts) if starts else np.zeros(0, dtype='datetime64[ns]')
+    order = np.argsort(start, kind='stable')
+    arrays = {
+        'start': start[order],
+        'end': (np.concatenate(ends) if ends else start)[order],
+        'channel': (np.concatenate(channels) if channels else np.zeros(0, dtype=np.int16))[order],
+        'channel_names': np.array(channel_names, dtype=str),
+        'covered': np.array([start_date, end_date], dtype='datetime64[D]'),
+        'version': np.array(version),
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # np.savez adds .npz to names without it
+    np.savez(path + '.tmp.npz', **arrays)
+    os.replace(path + '.tmp.npz', path)
+    _open_catalog.cache_clear()
+    return EventCatalog(**arrays)
+
+
+class EventCatalog:
+    def __init__(self, start, end, channel, channel_names, covered, version=''):
+        self.start = start
+        self.end = end
+        self.channel = channel
+        self.channel_names = [str(name) for name in channel_names]
+        self.covered = covered
+        self.version = str(version)
+
+    def __len__(self):
+        return len(self.start)
+
+    def covers(self, start_date, end_date):
+        return self.covered[0] <= np.datetime64(start_date, 'D') and np.datetime64(end_date, 'D') <= self.covered[1]
+
+    def events(self, start_date, end_date, columns):
+        '''
+        Returns df_starts and df_ends (like epd.detect_events) of the events starting between start_date and end_date
+        (both inclusive)
+
+        parameters:
+        columns:    channels of the frames (channels of the loaded data)
+        '''
+        columns = pd.Index(columns)
+        low = np.searchsorted(self.start, np.datetime64(start_date, 'D'), side='left')
+        high = np.searchsorted(self.start, np.datetime64(end_date, 'D') + 1, side='left')
+
+        # Codes of the catalog to positions in columns, channels not in columns are dropped
+        positions = np.array([columns.get_loc(name) if name in columns else -1 for name in self.channel_names], dtype=np.int64)
+        channel = positions[self.channel[low:high]] if len(positions) else np.zeros(0, dtype=np.int64)
+        keep = channel >= 0
+
+        # runs_to_frame needs the runs ordered by channel (then start)
+        order = np.argsort(channel[keep], kind='stable')
+        channel = channel[keep][order]
+        rows = np.arange(len(channel))
+        df_starts = runs_to_frame(pd.DatetimeIndex(self.start[low:high][keep][order]), columns, channel, rows)
+        df_ends = runs_to_frame(pd.DatetimeIndex(self.end[low:high][keep][order]), columns, channel, rows)
+        return df_starts, df_ends
+
+
+@functools.lru_cache(maxsize=32)
+def _open_catalog(path, modified):
+    with np.load(path) as npz:
+        return EventCatalog(**{name: npz[name] for name in npz.files})
+
+
+def open_catalog(name, window_length, sigma, path=None, version=None):
+    '''
+    Loads the catalog once per process (again if it was rebuilt), None if there is no catalog of these parameters or if it
+    was built from other data
+
+    parameters:
+    version:    version of the data (default: data_version(name))
+    '''
+    path = path or catalog_path(name, window_length, sigma)
+    if not os.path.isfile(path):
+        return None
+    event_catalog = _open_catalog(path, os.path.getmtime(path))
+    version = version if version is not None else data_version(name)
+    if event_catalog.version != version:
+        print(f'Catalog {os.path.basename(path)} was built from other EPD data, the events are detected live')
+        return None
+    return event_catalog
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from .rolling import RollingStats, SAMPLES_PER_DAY
+from .events import exceedance, find_runs, runs_to_frame
+
+'''
+Chunked processing of long time ranges (out of core, one chunk of days in memory at a time).
+
+The running average of a row needs the `length` rows before it plus one more for the 5 minute shift. So every chunk is
+loaded together with a halo of whole days before it. The statistics are computed on halo + chunk and the halo rows are
+trimmed afterwards. RollingStats restarts its sums at midnight, so a day gives exactly the same sums whether it is part of
+a chunk or of one long range. The trimmed statistics are then bit identical to a single pass over the whole range.
+
+Events crossing a chunk boundary are stitched: a run that reaches the last row of a chunk stays open and is continued by
+a run starting at the first row of the next chunk.
+'''
+
+
+def halo_days(length):
+    '''
+    Number of whole days needed before a chunk for a window of length rows (plus the shift by one row)
+    '''
+    return -(-(length + 1) // SAMPLES_PER_DAY)
+
+
+def chunk_days(start_date, end_date, days=7):
+    '''
+    Splits the days between start_date and end_date (both inclusive) into chunks of at most `days` days.
+    Returns a list of (chunk_start, chunk_end) as strings (yyyy-mm-dd)
+    '''
+    dates = pd.date_range(start_date, end_date, freq='D')
+    return [(str(dates[i].date()), str(dates[min(i + days, len(dates)) - 1].date())) for i in range(0, len(dates), days)]
+
+
+def load_with_halo(load, chunk_start, chunk_end, halo, first_date=None):
+    '''
+    Loads the chunk together with `halo` days before it (but not before first_date).
+    Returns the dataframe and the position of the first row of the chunk
+
+    parameters:
+    load:   function (start_date, end_date) -> dataframe (both inclusive, see load_pickles)
+    '''
+    halo_start = pd.Timestamp(chunk_start) - pd.Timedelta(days=halo)
+    if first_date is not None:
+        halo_start = max(halo_start, pd.Timestamp(first_date))
+    df = load(str(halo_start.date()), chunk_end)
+    return df, int(df.index.searchsorted(pd.Timestamp(chunk_start)))
+
+
+def running_average_chunks(load, start_date, end_date, length=18, days=7):
+    '''
+    Yields (df, running_mean, running_std) of every chunk between start_date and end_date, the same values as
+    epd.running_average of the whole range
+
+    parameters:
+    load:   function (start_date, end_date) -> dataframe (both inclusive, see load_pickles)
+    length: number of datapoints in the window
+    days:   number of days of a chunk
+    '''
+    halo = halo_days(length)
+    for chunk_start, chunk_end in chunk_days(start_date, end_date, days):
+        df, first = load_with_halo(load, chunk_start, chunk_end, halo, start_date)
+        running_mean, running_std = RollingStats(df).running_average(length)
+        yield df.iloc[first:], running_mean.iloc[first:], running_std.iloc[first:]
+
+
+class EventStitcher:
+    '''
+    Collects the runs of the exceedance matrices of consecutive chunks, runs crossing a boundary are joined.
+
+    parameters:
+    columns:    channels
+    min_length: minimal number of samples of an event
+    '''
+    def __init__(self, columns, min_length=2):
+        self.columns = columns
+        self.min_length = min_length
+        self.dtype = None
+
+        # Per channel: run reaching the end of the previous chunk (length 0 if none)
+        self.open_length = np.zeros(len(columns), dtype=np.int64)
+        self.open_start = None
+        self.open_end = None
+
+        self.channel, self.start, self.end = [], [], []
+
+    def _emit(self, channel, start, end):
+        self.channel.append(channel)
+        self.start.append(start)
+        self.end.append(end)
+
+    def add(self, index: pd.DatetimeIndex, selected):
+        '''
+        Adds the exceedance matrix (rows x channels, see epd.events.exceedance) of the next chunk
+        '''
+        selected = np.asarray(selected, dtype=bool)
+        if len(selected) == 0:
+            return
+        times = index.values
+        if self.dtype is None:
+            self.dtype = times.dtype
+            self.open_start = np.full(len(self.columns), np.datetime64('NaT'), dtype=self.dtype)
+            self.open_end = self.open_start.copy()
+
+        # Open runs the chunk doesn't continue ended with the previous chunk
+        ended = (self.open_length > 0) & ~selected[0]
+        ended_channels = np.nonzero(ended & (self.open_length >= self.min_length))[0]
+        self._emit(ended_channels, self.open_start[ended_channels], self.open_end[ended_channels])
+        self.open_length[ended] = 0
+
+        channel, start, end = find_runs(selected, min_length=1)
+        continued = (start == 0) & (self.open_length[channel] > 0)
+        length = end - start + 1 + np.where(continued, self.open_length[channel], 0)
+        start_time = np.where(continued, self.open_start[channel], times[start])
+        end_time = times[end]
+
+        # Runs reaching the last row stay open
+        still_open = end == len(selected) - 1
+        self.open_length[:] = 0
+        self.open_length[channel[still_open]] = length[still_open]
+        self.open_start[channel[still_open]] = start_time[still_open]
+        self.open_end[channel[still_open]] = end_time[still_open]
+
+        keep = ~still_open & (length >= self.min_length)
+        self._emit(channel[keep], start_time[keep], end_time[keep])
+
+    def finish(self):
+        '''
+        Returns df_starts and df_ends like epd.detect_events (the open runs end with the last chunk)
+        '''
+        if self.dtype is not None:
+            channels = np.nonzero(self.open_length >= self.min_length)[0]
+            self._emit(channels, self.open_start[channels], self.open_end[channels])
+            self.open_length[:] = 0
+
+        dtype = self.dtype or np.dtype('datetime64[ns]')
+        channel = np.concatenate([np.asarray(part, dtype=np.int64) for part in self.channel] or [np.zeros(0, dtype=np.int64)])
+        start = np.concatenate([np.asarray(part, dtype=dtype) for part in self.start] or [np.zeros(0, dtype=dtype)])
+        end = np.concatenate([np.asarray(part, dtype=dtype) for part in self.end] or [np.zeros(0, dtype=dtype)])
+
+        # Runs of a channel were found in order of time, runs_to_frame needs them ordered by channel
+        order = np.argsort(channel, kind='stable')
+        rows = np.arange(len(order))
+        df_starts = runs_to_frame(pd.DatetimeIndex(start[order]), self.columns, channel[order], rows)
+        df_ends = runs_to_frame(pd.DatetimeIndex(end[order]), self.columns, channel[order], rows)
+        return df_starts, df_ends
+
+
+def detect_events_chunked(load, start_date, end_date, sigma, length=18, days=7, min_length=2):
+    '''
+    Detects the events between start_date and end_date (both inclusive) chunk by chunk, only one chunk (plus halo) is in
+    memory at a time. Returns df_starts and df_ends, the same as epd.detect_events with epd.running_average of the whole range
+
+    parameters:
+    load:       function (start_date, end_date) -> dataframe (both inclusive, see load_pickles)
+    sigma:      factor of the standard deviation
+    length:     number of datapoints in the window of the running average
+    days:       number of days of a chunk
+    min_length: minimal number of samples of an event
+    '''
+    stitcher = None
+    for df, running_mean, running_std in running_average_chunks(load, start_date, end_date, length, days):
+        if stitcher is None:
+            stitcher = EventStitcher(df.columns, min_length)
+        stitcher.add(df.index, exceedance(df, running_mean, running_std, sigma))
+    return stitcher.finish()
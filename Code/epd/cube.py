@@ -0,0 +1,140 @@
+import os
+import json
+import functools
+import numpy as np
+import pandas as pd
+import config
+from . import store
+
+'''
+Memory mapped cube of the reduced EPD dataset.
+
+For every sensor, viewing and particle the whole mission (config.START_DATE to config.END_DATE) is kept in one float32 array
+(time x channel) with the fixed cadence config.TIME_RESOLUTION. The row of a timestamp is just (timestamp - epoch) // cadence,
+so slicing a date range needs no parsing and returns a view of the file. As the file is memory mapped, all processes
+(and Streamlit sessions) reading the same cube share the same pages.
+
+A small json header next to the array holds the epoch, cadence, shape and column names.
+STEP changed its data product on the 2021-10-22 (48 -> 32 channels). The cube holds the union of the columns and the header
+stores in which segment which columns are valid.
+'''
+
+CUBE_DIR = f'{config.CACHE_DIR}/EPD_Cube'
+
+
+def cube_path(sensor, viewing=None, particle=None, directory=CUBE_DIR):
+    '''
+    Returns the path of the cube without file extension
+    '''
+    if sensor == 'ept':
+        return f'{directory}/{sensor}_{viewing}_{particle}'
+    return f'{directory}/{sensor}'
+
+
+def has_cube(sensor, viewing=None, particle=None, directory=CUBE_DIR):
+    path = cube_path(sensor, viewing, particle, directory)
+    return os.path.isfile(path + '.json') and os.path.isfile(path + '.f32')
+
+
+class Cube:
+    def __init__(self, path):
+        with open(path + '.json', 'r') as header_file:
+            self.header = json.load(header_file)
+
+        self.epoch = np.datetime64(self.header['epoch'], 'ns')
+        self.cadence = np.timedelta64(self.header['cadence'], 's')
+        self.columns = self.header['columns']
+        self.data = np.memmap(path + '.f32', dtype=np.float32, mode='r', shape=(self.header['rows'], len(self.columns)))
+
+    def row(self, timestamp):
+        return int((np.datetime64(pd.Timestamp(timestamp), 'ns') - self.epoch) // self.cadence)
+
+    def segment_columns(self, timestamp):
+        '''
+        Columns valid at the timestamp
+        '''
+        columns = self.columns
+        for segment in self.header['segments']:
+            if pd.Timestamp(segment['start']) <= pd.Timestamp(timestamp):
+                columns = segment['columns']
+        return columns
+
+    def frame(self, start_date, end_date, columns=None):
+        '''
+        Returns the days between start_date and end_date (both inclusive) as dataframe without copying the data.
+        Returns None if the range is not covered by the cube.
+        '''
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+        row_start, row_end = self.row(start), self.row(end)
+        if row_start < 0 or row_end > len(self.data):
+            return None
+
+        if columns is None:
+            columns = self.segment_columns(start)
+
+        # Only a view as long as the columns are contiguous
+        positions = [self.columns.index(column) for column in columns]
+        if positions == list(range(positions[0], positions[0] + len(positions))):
+            data = self.data[row_start:row_end, positions[0]:positions[0] + len(positions)]
+        else:
+            data = self.data[row_start:row_end, positions]
+
+        index = pd.date_range(start, end, freq=f'{config.TIME_RESOLUTION}s', inclusive='left')
+        return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+@functools.lru_cache(maxsize=32)
+def _open_cube(path, modified):
+    return Cube(path)
+
+
+def open_cube(sensor, viewing=None, particle=None, directory=CUBE_DIR):
+    '''
+    Opens the cube once per process, it is opened again if it was rebuilt
+    '''
+    path = cube_path(sensor, viewing, particle, directory)
+    return _open_cube(path, os.path.getmtime(path + '.json'))
+
+
+def build_cube(sensor, viewing=None, particle=None, start_date=config.START_DATE, end_date=config.END_DATE, 
+               directory=CUBE_DIR, store_directory=store.STORE_DIR):
+    '''
+    Builds the cube from the columnar store, the month files are written one after another into the memory map.
+    '''
+    epoch = np.datetime64(start_date, 'ns')
+    cadence = np.timedelta64(config.TIME_RESOLUTION, 's')
+    rows = int((np.datetime64(end_date, 'ns') + np.timedelta64(1, 'D') - epoch) // cadence)
+
+    columns = []
+    segments = []
+    for df in store.iter_chunks(sensor, viewing, particle, store_directory):
+        chunk_columns = list(df.columns)
+        columns += [column for column in chunk_columns if column not in columns]
+        if not segments or segments[-1]['columns'] != chunk_columns:
+            segments.append({'start': str(df.index[0]), 'columns': chunk_columns})
+
+    os.makedirs(directory, exist_ok=True)
+    path = cube_path(sensor, viewing, particle, directory)
+
+    data = np.memmap(path + '.f32.tmp', dtype=np.float32, mode='w+', shape=(rows, len(columns)))
+    data[:] = np.nan
+    for df in store.iter_chunks(sensor, viewing, particle, store_directory):
+        positions = ((df.index.values - epoch) // cadence).astype(np.int64)
+        valid = (positions >= 0) & (positions < rows)
+        data[np.ix_(positions[valid], [columns.index(column) for column in df.columns])] = df.to_numpy(dtype=np.float32)[valid]
+    data.flush()
+    del data
+
+    header = {
+        'epoch': start_date,
+        'cadence': config.TIME_RESOLUTION,
+        'rows': rows,
+        'columns': columns,
+        'segments': segments,
+    }
+    with open(path + '.json.tmp', 'w') as header_file:
+        json.dump(header, header_file)
+
+    os.replace(path + '.f32.tmp', path + '.f32')
+    os.replace(path + '.json.tmp', path + '.json')
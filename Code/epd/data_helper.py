@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 import math
 import config
+from .rolling import RollingStats
 
 DATA_QUALITY_COLUMNS = {'QUALITY_BITMASK', 'QUALITY_FLAG', 'SMALL_PIXELS_FLAG'}
 
@@ -15,6 +16,70 @@ def reduce_data(_df: pd.DataFrame, sensor=""):
     parameters:
     df: Pandas Dataframe that holds data to be reduced
     '''
+    numeric = all(pd.api.types.is_numeric_dtype(dtype) for dtype in _df.dtypes)
+    if not numeric or not isinstance(_df.index, pd.DatetimeIndex):
+        return _reduce_data_resample(_df, sensor)
+
+    # Assuming that the next hour of the first index is 00:00 of the correct day
+    date = _df.index[0].round("d")
+
+    # To cap it at end of day
+    max_index = (24*60*60) // config.TIME_RESOLUTION
+
+    # Days have a fixed length and bins a fixed width, so the bin of each timestamp is just an integer division
+    bins = (_df.index.as_unit("ns").asi8 - date.value) // (config.TIME_RESOLUTION * 10**9)
+    values = _df.to_numpy(dtype=np.float64)
+
+    if not _df.index.is_monotonic_increasing:
+        order = np.argsort(bins, kind="stable")
+        bins = bins[order]
+        values = values[order]
+
+    # Whether resample would have returned a bin without data (int columns are turned to float then)
+    all_bins_filled = np.count_nonzero(np.diff(bins)) == bins[-1] - bins[0]
+
+    # Only the bins of this day
+    first, last = np.searchsorted(bins, [0, max_index])
+    bins = bins[first:last]
+    values = values[first:last]
+
+    df_new = pd.DataFrame(np.nan, index=pd.date_range(date, periods=max_index, freq=f"{config.TIME_RESOLUTION}s"), columns=_df.columns)
+    if len(bins) == 0:
+        return df_new
+
+    # Start of each bin in the sorted data
+    starts = np.flatnonzero(np.concatenate([[True], bins[1:] != bins[:-1]]))
+    filled_bins = bins[starts]
+
+    # Mean without the nans of each bin
+    nan_mask = np.isnan(values)
+    sums = np.add.reduceat(np.where(nan_mask, 0, values), starts, axis=0)
+    counts = np.add.reduceat(~nan_mask, starts, axis=0, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = np.where(counts > 0, sums / counts, np.nan)
+
+    # For Quality Columns the worst (highest) value is of interest
+    quality_positions = [i for i, column in enumerate(_df.columns) if column in DATA_QUALITY_COLUMNS]
+    if quality_positions:
+        result[:, quality_positions] = np.fmax.reduceat(values[:, quality_positions], starts, axis=0)
+
+    data = np.full((max_index, len(_df.columns)), np.nan)
+    data[filled_bins] = result
+    df_new = pd.DataFrame(data, index=df_new.index, columns=_df.columns)
+
+    # Quality columns stay integers like with resample, if no bin is missing
+    if all_bins_filled and len(filled_bins) == max_index:
+        for i in quality_positions:
+            if pd.api.types.is_integer_dtype(_df.dtypes.iloc[i]):
+                df_new[_df.columns[i]] = df_new[_df.columns[i]].astype(_df.dtypes.iloc[i])
+
+    return df_new
+
+
+def _reduce_data_resample(_df: pd.DataFrame, sensor=""):
+    '''
+    reduce_data with DataFrame.resample, used for data with non numeric columns
+    '''
     df = _df.copy()
     # Assuming that the next hour of the first index is 00:00 of the correct day
     date = df.index[0].round("d")
@@ -40,6 +105,23 @@ def reduce_data(_df: pd.DataFrame, sensor=""):
     return df_new[:max_index]
 
 
+def step_electron(df_step: pd.DataFrame):
+    '''
+    Calculates the electron flux of STEP (Integral - Magnet) for all channels in one array operation.
+    Returns a new Dataframe with the columns Electron_Avg_Flux_i
+
+    parameters:
+    df_step: Pandas Dataframe with the averaged STEP fluxes (Integral_Avg_Flux_i, Magnet_Avg_Flux_i)
+    '''
+    length = 32
+    if ('Integral_Avg_Flux_47' in df_step.columns):
+        length = 48
+    integral = df_step[[f"Integral_Avg_Flux_{i}" for i in range(length)]].to_numpy()
+    magnet = df_step[[f"Magnet_Avg_Flux_{i}" for i in range(length)]].to_numpy()
+
+    return pd.DataFrame(integral - magnet, index=df_step.index, columns=[f"Electron_Avg_Flux_{i}" for i in range(length)])
+
+
 def is_peak_persistent(peak: pd.Timestamp, df, df_mean, df_std, sigma_factor):
     slice_start = peak
     end = peak + pd.Timedelta(minutes=5)
@@ -65,17 +147,12 @@ def running_average(df: pd.DataFrame, length=18):
     
     parameters:
     df:     Pandas Dataframe with EPD data
-    '''
-
-    df_mean = df.rolling(window=length).mean()
-    df_std = df.rolling(window=length).std(ddof=0)
+    length: number of datapoints in the window
 
-    # Shifting the Data to exclude the current Datapoint from the calculations
-    # Creating new Dataframe to make sure the correct indecies are there
-    df_mean = pd.DataFrame(df_mean.shift(5, freq="min"), index=df.index)
-    df_std = pd.DataFrame(df_std.shift(5, freq="min"), index=df.index)
-    
-    return df_mean, df_std
+    For several window lengths on the same data, use epd.RollingStats directly, it keeps the prefix sums between the calls.
+    '''
+    # Mean and std (ddof=0) are shifted by 5 minutes to exclude the current Datapoint from the calculations
+    return RollingStats(df).running_average(length)
 
 
 def get_energies(sensor, length=1):
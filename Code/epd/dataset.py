@@ -0,0 +1,319 @@
+import os
+import json
+import hashlib
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import misc
+import config
+from . import store
+from .loader import load_data, STEP_SHORT_DATE
+from .data_helper import reduce_data, step_electron
+from .prefetch import Prefetcher
+
+'''
+Generation of the reduced EPD dataset.
+
+Every day of a sensor is an independent job (download, reduce all viewings), so the days are farmed out to a process pool.
+The main process collects the reduced days of a month and writes the month file once all days of the month are finished
+(instead of rewriting the month file for every day). The days are then recorded in a manifest together with the checksums
+of the written data. On a restart all days in the manifest are skipped.
+
+With lookahead > 0 the source files of the next days are downloaded by a prefetcher (prefetch.py) while the workers reduce
+the current days, the workers then only read local files.
+'''
+
+MANIFEST_PATH = f'{store.STORE_DIR}/manifest.jsonl'
+
+# define column names arrays for ept and step
+ion_columns = []
+electron_columns = []
+
+for i in range(64):
+    ion_columns.append('Ion_Flux_' + str(i))
+    if i < 34:
+        electron_columns.append('Electron_Flux_' + str(i))
+
+step_columns_long = ['DELTA_EPOCH']
+step_columns_short = ['DELTA_EPOCH']
+
+for i in ['Integral_Avg_', 'Magnet_Avg_']:
+    for j in ['Flux_', "Uncertainty_"]:
+        for k in range(48):
+            if k < 32:
+                step_columns_short.append(i + j + str(k))
+            step_columns_long.append(i + j + str(k))
+
+for i in [step_columns_short, step_columns_long]:
+    i.append('QUALITY_BITMASK')
+    i.append('QUALITY_FLAG')
+
+
+def _empty_day(columns, date):
+    # Single row of nan at midnight, reduce_data fills up the rest of the day
+    df = pd.Series(np.nan, columns).to_frame().T
+    df.set_index(pd.Series(pd.Timestamp(date)), inplace = True)
+    return df
+
+
+def reduce_ept_day(date, autodownload=True):
+    '''
+    Downloads and reduces the EPT data of one day for the viewings sun, asun, south and north.
+    Returns a list of (viewing, particle, dataframe)
+    '''
+    outputs = []
+
+    for viewing in ['sun', 'asun', 'south', 'north']:
+        df_ions_alpha, df_electrons, energies = load_data('ept', date, date, viewing, autodownload)
+
+        # check if there is no data available -> empty dataframe (nan)
+        if len(df_ions_alpha) == 0:
+            df_ion = _empty_day(ion_columns, date)
+            df_electron = _empty_day(electron_columns, date)
+        else:
+            df_ion = df_ions_alpha['Ion_Flux']
+            df_electron = df_electrons['Electron_Flux']
+
+        # combine data to 5min intervals and fill missing data with nan
+        outputs.append((viewing, 'ion', reduce_data(df_ion)))
+        outputs.append((viewing, 'electron', reduce_data(df_electron)))
+
+    # omni is not stored, load_pickles calculates it from the four viewings
+    return outputs
+
+
+def reduce_step_day(date, autodownload=True):
+    '''
+    Downloads and reduces the STEP data of one day.
+    The electron flux (Integral - Magnet) is stored next to the averaged fluxes, so it doesn't have to be calculated on every load.
+    Returns a list with one (None, None, dataframe)
+    '''
+    # Only the averaged fluxes are read, the variables of the 15 pixels are skipped by the CDF reader
+    df_step, energies = load_data('step', date, date, autodownload=autodownload, only_averages=True)
+
+    # check if there is no data available -> empty dataframe (nan)
+    if len(df_step) == 0:
+        if pd.Timestamp(date) >= pd.Timestamp(STEP_SHORT_DATE):
+            df_step = _empty_day(step_columns_short, date)
+        else:
+            df_step = _empty_day(step_columns_long, date)
+
+    # combine data to 5min intervals and fill missing data with nan
+    df_step = reduce_data(df_step, 'step')
+
+    return [(None, None, pd.concat([df_step, step_electron(df_step)], axis=1))]
+
+
+def reduce_day(sensor, date, autodownload=True):
+    if sensor == 'ept':
+        return reduce_ept_day(date, autodownload)
+    if sensor == 'step':
+        return reduce_step_day(date, autodownload)
+    raise ValueError("Sensor not found")
+
+
+def checksum(df: pd.DataFrame):
+    '''
+    Checksum of the values, index and columns of a reduced day
+    '''
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def output_key(viewing, particle):
+    if viewing is None:
+        return 'all'
+    return f'{viewing}/{particle}'
+
+
+class Manifest:
+    '''
+    Append only log of the finished days: one json line {sensor, date, outputs: {viewing/particle: checksum}} per day
+    '''
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        self.cut_off = False
+
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'r') as manifest_file:
+            lines = manifest_file.read()
+
+        self.cut_off = len(lines) > 0 and not lines.endswith('\n')
+        for line in lines.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line might be cut off by a crash
+                continue
+            self.entries[(entry['sensor'], entry['date'])] = entry['outputs']
+
+    def is_done(self, sensor, date):
+        return (sensor, date) in self.entries
+
+    def record(self, sensor, date, outputs):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as manifest_file:
+            if self.cut_off:
+                manifest_file.write('\n')
+                self.cut_off = False
+            manifest_file.write(json.dumps({'sensor': sensor, 'date': date, 'outputs': outputs}) + '\n')
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        self.entries[(sensor, date)] = outputs
+
+    def verify(self, sensor, date, directory=store.STORE_DIR):
+        '''
+        Checks that the store still holds the recorded data of the day
+        '''
+        for key, expected in self.entries[(sensor, date)].items():
+            viewing, particle = (None, None) if key == 'all' else key.split('/')
+            df = store.read_range(sensor, date, date, viewing, particle, directory=directory)
+            if df is None or checksum(df) != expected:
+                return False
+        return True
+
+
+class MonthWriter:
+    '''
+    Collects the reduced days of every sensor and month, the month is written into the store once all its jobs are finished
+    (or failed). Then its days are recorded in the manifest.
+
+    parameters:
+    jobs:       list of (sensor, date) of the run
+    manifest:   Manifest of the finished days
+    directory:  folder of the store
+    '''
+    def __init__(self, jobs, manifest, directory=store.STORE_DIR):
+        self.manifest = manifest
+        self.directory = directory
+        self.pending = Counter((sensor, date[0:7]) for sensor, date in jobs)
+        self.days = defaultdict(list)
+
+    def add(self, sensor, date, outputs):
+        '''
+        Adds the outputs (list of (viewing, particle, dataframe)) of a finished day, None for a failed day
+        '''
+        key = (sensor, date[0:7])
+        if outputs is not None:
+            self.days[key].append((date, outputs))
+        self.pending[key] -= 1
+        if self.pending[key] == 0:
+            self._write(key)
+
+    def _write(self, key):
+        sensor, month = key
+        days = sorted(self.days.pop(key, []), key=lambda day: day[0])
+        if not days:
+            return
+
+        # Consecutive days with the same columns are written at once (STEP changed its columns within a month)
+        frames = defaultdict(list)
+        checksums = defaultdict(dict)
+        for date, outputs in days:
+            for viewing, particle, df in outputs:
+                parts = frames[(viewing, particle)]
+                if not parts or not parts[-1][-1].columns.equals(df.columns):
+                    parts.append([])
+                parts[-1].append(df)
+                checksums[date][output_key(viewing, particle)] = checksum(df)
+
+        for (viewing, particle), parts in frames.items():
+            for part in parts:
+                store.write_days(pd.concat(part), sensor, viewing, particle, self.directory)
+
+        for date, _ in days:
+            self.manifest.record(sensor, date, checksums[date])
+        print(f'Wrote {sensor} {month} ({len(days)} days)')
+
+
+def generate(sensors, start_date, end_date, workers=None, manifest_path=MANIFEST_PATH, directory=store.STORE_DIR, verify=False, reduce=reduce_day,
+             lookahead=0, concurrency=2, source=None):
+    '''
+    Generates the dataset for all days between start_date and end_date (both inclusive) for all sensors at once.
+
+    parameters:
+    sensors:        list of sensors ['ept', 'step']
+    workers:        number of worker processes (default: number of cores), 1 runs everything in this process
+    manifest_path:  path of the manifest of the finished days
+    verify:         if True, days of the manifest are only skipped if the store still holds the same data
+    reduce:         function (sensor, date, autodownload) -> list of (viewing, particle, dataframe)
+    lookahead:      number of days whose files are downloaded ahead, 0 lets every worker download its own files
+    concurrency:    number of parallel downloads of the prefetcher
+    source:         where the prefetcher gets the files from (default: SOAR), see prefetch.py
+    '''
+    manifest = Manifest(manifest_path)
+
+    jobs = []
+    for date in misc.day_range(start_date, end_date):
+        for sensor in sensors:
+            if manifest.is_done(sensor, date) and (not verify or manifest.verify(sensor, date, directory)):
+                continue
+            jobs.append((sensor, date))
+
+    print(f'{len(jobs)} days left to generate')
+
+    # solo_epd_loader creates the download folders without checking if they exist (race between the workers)
+    if reduce is reduce_day:
+        for sensor in sensors:
+            os.makedirs(f'{config.CACHE_DIR}/_solo/l2/epd/{sensor}', exist_ok=True)
+
+    if lookahead > 0:
+        days = iter(Prefetcher(jobs, source, lookahead, concurrency))
+        autodownload = False
+    else:
+        days = ((sensor, date, None) for sensor, date in jobs)
+        autodownload = True
+
+    writer = MonthWriter(jobs, manifest, directory)
+
+    def finish(sensor, date, outputs):
+        print(f'Finished {sensor} {date}')
+        writer.add(sensor, date, outputs)
+
+    if workers == 1:
+        for sensor, date, error in days:
+            if error is not None:
+                print(f'Download failed {sensor} {date}:', repr(error))
+                writer.add(sensor, date, None)
+                continue
+            finish(sensor, date, reduce(sensor, date, autodownload))
+        return
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        # The store is only written by this process, so no two processes write the same month file
+        def collect(future):
+            sensor, date = futures.pop(future)
+            try:
+                outputs = future.result()
+            except Exception as e:
+                print(f'Failed {sensor} {date}:', repr(e))
+                writer.add(sensor, date, None)
+                return
+            finish(sensor, date, outputs)
+
+        for sensor, date, error in days:
+            if error is not None:
+                print(f'Download failed {sensor} {date}:', repr(error))
+                writer.add(sensor, date, None)
+                continue
+
+            futures[executor.submit(reduce, sensor, date, autodownload)] = (sensor, date)
+
+            # Only a few days wait in the pool, so the prefetcher does not run ahead of the reduction
+            if len(futures) >= 2 * workers:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+
+        for future in as_completed(list(futures)):
+            collect(future)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+'''
+Detection of the EPD events.
+
+A sample is selected if the flux is above running mean + sigma * running std. An event is a run of consecutive
+selected samples in one channel that is longer than one sample. The runs of all channels are found at once with a
+run length encoding of the boolean matrix (time x channel).
+'''
+
+
+def exceedance(df_sensor: pd.DataFrame, running_mean: pd.DataFrame, running_std: pd.DataFrame, sigma):
+    '''
+    Returns the boolean matrix (time x channel) of the samples above the threshold
+
+    parameters:
+    df_sensor:      dataframe with the flux of all channels
+    running_mean:   running mean of df_sensor
+    running_std:    running standard deviation of df_sensor
+    sigma:          factor of the standard deviation
+    '''
+    data = df_sensor.to_numpy()
+    mean = running_mean.to_numpy()
+    std = running_std.to_numpy()
+
+    # Comparisons with nan are False, so samples where anything is nan are not selected
+    with np.errstate(invalid='ignore'):
+        selected = data > mean + sigma * std
+
+    # If mean is zero, we want to ignore it
+    selected &= mean != 0
+    return selected
+
+
+def find_runs(selected: np.ndarray, min_length=2):
+    '''
+    Finds the runs of True in every column of the boolean matrix.
+    Returns the arrays (channel, start, end) of all runs with at least min_length samples, ordered by channel and start.
+    start and end are row indices, end is inclusive.
+    '''
+    selected = np.asarray(selected, dtype=bool)
+    if selected.ndim == 1:
+        selected = selected[:, np.newaxis]
+
+    # Padding with False on both sides, so every run has a rising and a falling edge
+    padded = np.zeros((selected.shape[1], selected.shape[0] + 2), dtype=np.int8)
+    padded[:, 1:-1] = selected.T
+    edges = np.diff(padded, axis=1)
+
+    channel, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)
+
+    keep = end - start >= min_length
+    return channel[keep], start[keep], end[keep] - 1
+
+
+def runs_to_frame(index: pd.Index, columns, channel, rows):
+    '''
+    Puts the timestamps of the rows into a dataframe with one column per channel, the n-th run of a channel is in row n.
+    Channels with fewer runs are filled up with NaT
+    '''
+    counts = np.bincount(channel, minlength=len(columns))
+    # Position of each run within its channel
+    first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(len(channel)) - first[channel]
+
+    data = np.full((counts.max(initial=0), len(columns)), np.datetime64('NaT'), dtype=index.values.dtype)
+    data[position, channel] = index.values[rows]
+    return pd.DataFrame(data, columns=columns)
+
+
+def detect_events(df_sensor: pd.DataFrame, running_mean: pd.DataFrame, running_std: pd.DataFrame, sigma, min_length=2, first=0):
+    '''
+    Detects the events of all channels.
+    Returns the dataframes df_starts and df_ends with one column per channel and the start/end timestamp of one event per row
+
+    parameters:
+    df_sensor:      dataframe with the flux of all channels
+    running_mean:   running mean of df_sensor
+    running_std:    running standard deviation of df_sensor
+    sigma:          factor of the standard deviation
+    min_length:     minimal number of samples of an event
+    first:          runs starting before this row are dropped (halo loaded for the running average, see chunks.py)
+    '''
+    selected = exceedance(df_sensor, running_mean, running_std, sigma)
+    channel, start, end = find_runs(selected, min_length)
+    if first > 0:
+        keep = start >= first
+        channel, start, end = channel[keep], start[keep], end[keep]
+
+    df_starts = runs_to_frame(df_sensor.index, df_sensor.columns, channel, start)
+    df_ends = runs_to_frame(df_sensor.index, df_sensor.columns, channel, end)
+    return df_starts, df_ends
@@ -1,8 +1,17 @@
+import numpy as np
 import pandas as pd
 import config
 import misc
+from . import store, cube
+from .data_helper import step_electron
 
-def load_data(sensor, utc_start, utc_end, viewing = 'omni'):
+# On this day the STEP data product changed from 48 to 32 channels
+STEP_SHORT_DATE = '2021-10-23'
+
+# The omni viewing of EPT is the average of these viewings
+OMNI_VIEWINGS = ['sun', 'asun', 'north', 'south']
+
+def load_data(sensor, utc_start, utc_end, viewing = 'omni', autodownload = True, only_averages = False):
     '''
     (string) sensor: 'ept', 'het', or 'step'
     (int) startdate: yyyymmdd
@@ -11,8 +20,8 @@ def load_data(sensor, utc_start, utc_end, viewing = 'omni'):
     (string) viewing: 'sun', 'asun', 'north', 'south', 'omni' or None; not eeded for sensor = 'step'.
         'omni' is just calculated as the average of the other four viewing directions: ('sun'+'asun'+'north'+'south')/4
     (string) path: directory in which Solar Orbiter data is/should be organized; e.g. '/home/userxyz/solo/data/'. See `Data folder structure` for more details.
-    (bool) autodownload: if True, will try to download missing data files from SOAR
-    (bool) only_averages: If True, will for STEP only return the averaged fluxes, and not the data of each of the 15 Pixels. This will reduce the memory consumption. By default False.
+    (bool) autodownload: if True, will try to download missing data files from SOAR. False if the files were already prefetched (see prefetch.py)
+    (bool) only_averages: If True, will for STEP only return the averaged fluxes, and not the data of each of the 15 Pixels. The pixel variables are then not read from the CDF at all. This will reduce the memory consumption. By default False.
     '''
     from solo_epd_loader import epd_load
     level = 'l2' # always load l2 data!
@@ -24,43 +33,171 @@ def load_data(sensor, utc_start, utc_end, viewing = 'omni'):
     # df_2: includes Electron_Flux, Electron_Uncertainty, Electron_Rate, ...
     # energies: includes the bins of energy ranges
     if sensor == 'ept':
-        df_1, df_2, energies = epd_load(sensor, startdate, enddate, level, viewing, path = f"{config.CACHE_DIR}/_solo/", autodownload = True, only_averages = False, pos_timestamp="start")
+        df_1, df_2, energies = epd_load(sensor, startdate, enddate, level, viewing, path = f"{config.CACHE_DIR}/_solo/", autodownload = autodownload, only_averages = False, pos_timestamp="start")
         
         return df_1, df_2, energies
     
     if sensor == 'step':
-        df_1, energies = epd_load(sensor, startdate, enddate, level, viewing, path = f"{config.CACHE_DIR}/_solo/", autodownload = True, only_averages = False, pos_timestamp="start")
+        df_1, energies = epd_load(sensor, startdate, enddate, level, viewing, path = f"{config.CACHE_DIR}/_solo/", autodownload = autodownload, only_averages = only_averages, pos_timestamp="start")
         
         return df_1, energies
     
 
-def load_pickles(sensor, start_date, end_date, particle = 'electron', viewing = 'none'):
+def load_pickles(sensor, start_date, end_date, particle = 'electron', viewing = 'none', columns = None):
     '''
     load data from self built database
     
     parameters:
     sensor:     string with name of sensor
-    viewing:    string with name of viewing angle [sun, asun, north, south]
+    viewing:    string with name of viewing angle [sun, asun, north, south, omni]
     start_date: string of starting date
     end_date:   string of end date
-    particle:   string of particle type [ion, electron]
+    particle:   string of particle type [ion, electron] (only EPT, for the electron flux of STEP see load_step_electron)
+    columns:    list of columns to load, all columns if None
+    '''
+    if sensor == 'ept' and viewing == 'omni':
+        return _load_omni(start_date, end_date, particle, columns)
+    
+    # The memory mapped cube is sliced without copying, the columnar store is read in one go per month
+    # and the old per day pickles are only used if there is neither
+    store_viewing, store_particle = _store_keys(sensor, viewing, particle)
+    
+    if cube.has_cube(sensor, store_viewing, store_particle):
+        df = cube.open_cube(sensor, store_viewing, store_particle).frame(start_date, end_date, columns)
+        if df is not None:
+            return df
+    
+    if store.has_data(sensor, store_viewing, store_particle):
+        df = store.read_range(sensor, start_date, end_date, store_viewing, store_particle, columns)
+        if df is not None:
+            return df
+    
+    frames = [_read_pickle(sensor, date, particle, viewing) for date in misc.day_range(start_date, end_date)]
+    
+    df = _assemble(frames)
+    
+    # change index back to datetime with correct minutes
+    datetime_series = pd.Series(pd.date_range(start_date, periods = 86400 // config.TIME_RESOLUTION * len(frames), freq = str(config.TIME_RESOLUTION) + "s"))
+    df.set_index(datetime_series, inplace = True)
+    
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+def iter_days(sensor, start_date, end_date, particle = 'electron', viewing = 'none', columns = None):
+    '''
+    Same as load_pickles, but yields (date, dataframe) for one day after another.
+    Only one month (store) or one day (cube, pickles) is held in memory at once.
     '''
-    df = pd.DataFrame()
-    date = start_date
-    count = 0
-    while date != misc.next_date(end_date):
-        if sensor == 'ept':
-            df_new = pd.read_pickle(f'{config.CACHE_DIR}/EPD_Dataset/' + sensor + '/' + viewing + '/' + particle + '/' + date + '.pkl')
+    store_viewing, store_particle = _store_keys(sensor, viewing, particle)
+    use_cube = cube.has_cube(sensor, store_viewing, store_particle)
+    use_store = not use_cube and store.has_data(sensor, store_viewing, store_particle)
+    if sensor == 'ept' and viewing == 'omni':
+        # Loaded month by month, load_pickles takes care of omni
+        use_cube, use_store = False, True
+    
+    df_month = None
+    for date in misc.day_range(start_date, end_date):
+        if use_cube:
+            df_day = cube.open_cube(sensor, store_viewing, store_particle).frame(date, date, columns)
+        
+        elif use_store:
+            if df_month is None or date[0:7] != str(df_month.index[0])[0:7]:
+                month_end = str((pd.Timestamp(date) + pd.offsets.MonthEnd(0)).date())
+                month_end = min(month_end, end_date)
+                df_month = load_pickles(sensor, date, month_end, particle, viewing, columns)
             
-        if sensor == 'step':
-            df_new = pd.read_pickle(f'{config.CACHE_DIR}/EPD_Dataset/' + sensor + '/' + date + '.pkl')
+            day_start = pd.Timestamp(date)
+            df_day = df_month[day_start: day_start + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)]
         
-        df = pd.concat([df, df_new], ignore_index = True)
+        else:
+            df_day = load_pickles(sensor, date, date, particle, viewing, columns)
         
-        count += 1
-        date = misc.next_date(date)
+        yield date, df_day
+
+
+def load_step_electron(start_date, end_date):
+    '''
+    Electron flux of STEP (columns Electron_Flux_i like EPT), read from the dataset if it was stored there at generation or
+    calculated from the averaged fluxes
+    '''
+    length = 48
+    if pd.Timestamp(start_date) >= pd.Timestamp(STEP_SHORT_DATE):
+        length = 32
     
-    # change index back to datetime with correct minutes
-    datetime_series = pd.Series(pd.date_range(start_date, periods = 86400 / config.TIME_RESOLUTION * count, freq = str(config.TIME_RESOLUTION) + "s"))
-    df.set_index(datetime_series, inplace = True)
-    return df
\ No newline at end of file
+    if _has_step_electron():
+        df = load_pickles('step', start_date, end_date, columns = [f'Electron_Avg_Flux_{i}' for i in range(length)])
+    else:
+        columns = [f'{kind}_Avg_Flux_{i}' for kind in ['Integral', 'Magnet'] for i in range(length)]
+        df = step_electron(load_pickles('step', start_date, end_date, columns = columns))
+    
+    # Same column names as EPT
+    df.columns = [f'Electron_Flux_{i}' for i in range(length)]
+    return df
+
+
+def _load_omni(start_date, end_date, particle, columns):
+    '''
+    Average of the four viewings, a viewing without data (nan) is left out instead of making the average nan
+    '''
+    frames = [load_pickles('ept', start_date, end_date, particle, viewing, columns) for viewing in OMNI_VIEWINGS]
+    df = frames[0]
+    
+    # A data product change might give the viewings different columns
+    if any(not frame.columns.equals(df.columns) for frame in frames):
+        frames = [frame.reindex(columns = df.columns) for frame in frames]
+    
+    data = np.stack([frame.to_numpy(dtype = np.float64) for frame in frames])
+    with np.errstate(invalid = 'ignore'):
+        count = np.sum(~np.isnan(data), axis = 0)
+        mean = np.nansum(data, axis = 0) / count
+    
+    return pd.DataFrame(mean, index = df.index, columns = df.columns)
+
+
+def _has_step_electron():
+    column = 'Electron_Avg_Flux_0'
+    if cube.has_cube('step'):
+        return column in cube.open_cube('step').columns
+    if store.has_data('step'):
+        return store.has_column('step', column)
+    return False
+
+
+def _store_keys(sensor, viewing, particle):
+    # STEP data is not split by viewing or particle
+    if sensor == 'ept':
+        return viewing, particle
+    return None, None
+
+
+def _read_pickle(sensor, date, particle, viewing):
+    if sensor == 'ept':
+        return pd.read_pickle(f'{config.CACHE_DIR}/EPD_Dataset/' + sensor + '/' + viewing + '/' + particle + '/' + date + '.pkl')
+    
+    return pd.read_pickle(f'{config.CACHE_DIR}/EPD_Dataset/' + sensor + '/' + date + '.pkl')
+
+
+def _assemble(frames):
+    '''
+    Puts the day frames into one preallocated block per column, instead of concatenating them one by one (quadratic in copies)
+    '''
+    columns = frames[0].columns
+    if any(not df.columns.equals(columns) for df in frames):
+        # Data product changed within the range, the columns are joined like pd.concat does
+        return pd.concat(frames, ignore_index = True)
+    
+    total = sum(len(df) for df in frames)
+    data = {}
+    for column in columns:
+        dtype = np.result_type(*[df[column].dtype for df in frames])
+        data[column] = np.empty(total, dtype = dtype)
+    
+    position = 0
+    for df in frames:
+        for column in columns:
+            data[column][position: position + len(df)] = df[column].to_numpy()
+        position += len(df)
+    
+    return pd.DataFrame(data, columns = columns)
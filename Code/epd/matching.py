@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+'''
+Matching of the STIX flares with the EPD events.
+
+A channel is connected to a flare if an event of the channel starts within the open interval
+    (flare start + d / v, flare end + k * d / v)
+with d the Parker spiral distance of the flare, v the speed of the particles of the channel and k the indirect factor.
+
+The event starts of every channel are sorted once, the intervals of all flares are then checked at once with two
+binary searches (np.searchsorted): there is a start in the interval if the first start after the lower bound comes before
+the first start at or after the upper bound.
+'''
+
+
+def arrival_times(distance, speeds):
+    '''
+    Returns the travel times d / v as timedelta64[ns] array (flares x channels), nan distances give NaT
+
+    parameters:
+    distance:   Parker spiral distance of each flare [m]
+    speeds:     particle speed of each channel [m/s]
+    '''
+    distance = np.asarray(distance, dtype=np.float64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    seconds = distance[:, np.newaxis] / speeds[np.newaxis, :]
+    return pd.to_timedelta(seconds.ravel(), unit="s").to_numpy().reshape(seconds.shape)
+
+
+def connected_matrix(df_starts: pd.DataFrame, flare_start, flare_end, distance, speeds, indirect_factor=1.5):
+    '''
+    Returns the boolean matrix (flares x channels) of the channels with an event start in the interval of the flare
+
+    parameters:
+    df_starts:          start timestamps of the events, one column per channel (see epd.detect_events)
+    flare_start:        start of each flare (suntime)
+    flare_end:          end of each flare (suntime)
+    distance:           Parker spiral distance of each flare [m]
+    speeds:             particle speed of each channel [m/s]
+    indirect_factor:    extension factor k of the upper bound
+    '''
+    flare_start = np.asarray(flare_start, dtype="datetime64[ns]")
+    flare_end = np.asarray(flare_end, dtype="datetime64[ns]")
+    arrival = arrival_times(distance, speeds)
+
+    low = flare_start[:, np.newaxis] + arrival
+    high = flare_end[:, np.newaxis] + arrival * indirect_factor
+
+    starts = df_starts.to_numpy(dtype="datetime64[ns]")
+    connected = np.zeros(arrival.shape, dtype=bool)
+
+    for channel in range(starts.shape[1]):
+        channel_starts = starts[:, channel]
+        channel_starts = np.sort(channel_starts[~np.isnat(channel_starts)])
+        # Index of the first start > low and of the first start >= high
+        first_after_low = np.searchsorted(channel_starts, low[:, channel], side="right")
+        first_after_high = np.searchsorted(channel_starts, high[:, channel], side="left")
+        connected[:, channel] = first_after_low < first_after_high
+
+    # Flares without distance (NaT) are never connected
+    connected &= ~(np.isnat(low) | np.isnat(high))
+    return connected
+
+
+def match_flares(df_starts: pd.DataFrame, flare_start, flare_end, distance, speeds, indirect_factor=1.5):
+    '''
+    Matches all flares with the events of one sensor (parameters see connected_matrix).
+    Returns the arrays (channels, first, last): number of connected channels and the column index of the first and last
+    connected channel of each flare (-1 if no channel is connected)
+    '''
+    connected = connected_matrix(df_starts, flare_start, flare_end, distance, speeds, indirect_factor)
+    channels = connected.sum(axis=1)
+
+    any_connected = channels > 0
+    first = np.where(any_connected, connected.argmax(axis=1), -1)
+    last = np.where(any_connected, connected.shape[1] - 1 - connected[:, ::-1].argmax(axis=1), -1)
+    return channels, first, last
@@ -0,0 +1,98 @@
+import os
+import glob
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+'''
+Prefetching of the EPD source files (CDF).
+
+While the workers reduce the current days, the files of the next days are already downloaded.
+The prefetcher is a bounded queue: at most `lookahead` days are fetched ahead of the consumer and at most `concurrency` downloads
+run at the same time. Where the files come from is defined by the source, SoarSource downloads them from SOAR (like
+solo_epd_loader's autodownload), LocalSource copies them from a local directory (stand-in for SOAR, e.g. for testing).
+'''
+
+
+def download_path(sensor):
+    # Folder structure of solo_epd_loader
+    return f'{config.CACHE_DIR}/_solo/l2/epd/{sensor}/'
+
+
+def _cdf_date(date):
+    return date[0:4] + date[5:7] + date[8:10]
+
+
+class SoarSource:
+    '''
+    Downloads all missing files of a day from SOAR
+    '''
+    def fetch(self, sensor, date, path):
+        from solo_epd_loader import _autodownload_cdf
+        day = int(_cdf_date(date))
+        _autodownload_cdf(day, day, sensor, 'l2', path)
+
+
+class LocalSource:
+    '''
+    Copies all files of a day from a local directory with the same file names as SOAR
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, sensor, date, path):
+        os.makedirs(path, exist_ok=True)
+        for file in glob.glob(f'{self.directory}/solo_L2_epd-{sensor}-*_{_cdf_date(date)}_V*.cdf'):
+            destination = os.path.join(path, os.path.basename(file))
+            if os.path.isfile(destination):
+                continue
+            # Copying to a temporary file first, so a reader never sees half a file
+            shutil.copyfile(file, destination + '.part')
+            os.replace(destination + '.part', destination)
+
+
+class Prefetcher:
+    '''
+    Iterating over the prefetcher yields (sensor, date, error) in the order of the jobs, as soon as the files of the day are fetched.
+    error is None if the fetch was successful.
+
+    parameters:
+    jobs:           list of (sensor, date)
+    source:         SoarSource or LocalSource
+    lookahead:      number of days that are fetched ahead
+    concurrency:    number of parallel downloads
+    '''
+    def __init__(self, jobs, source=None, lookahead=4, concurrency=2):
+        self.jobs = list(jobs)
+        self.source = source if source is not None else SoarSource()
+        self.lookahead = max(lookahead, 1)
+        self.concurrency = concurrency
+
+    def _fetch(self, sensor, date):
+        try:
+            self.source.fetch(sensor, date, download_path(sensor))
+        except Exception as e:
+            return e
+        return None
+
+    def __iter__(self):
+        pending = deque()
+        jobs = iter(self.jobs)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit():
+                job = next(jobs, None)
+                if job is not None:
+                    pending.append((job, executor.submit(self._fetch, *job)))
+
+            for _ in range(self.lookahead):
+                submit()
+
+            while pending:
+                (sensor, date), future = pending.popleft()
+                error = future.result()
+                # A slot in the queue got free
+                submit()
+                yield sensor, date, error
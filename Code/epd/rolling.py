@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import config
+
+'''
+Rolling mean and standard deviation (ddof=0) of the EPD data from prefix sums.
+
+The prefix sums (count, sum, sum of squares) are restarted every day (a block), so they stay small and a day always gives
+the same sums, no matter where the loaded range starts. To keep the sums of squares accurate, the values of a day are
+taken relative to the mean of that day. A window reaching into the previous day combines the sums of both days.
+
+Once the prefix sums are built, every window length is a few array operations, and appending new samples only
+recalculates the last (unfinished) block.
+'''
+
+SAMPLES_PER_DAY = 86400 // config.TIME_RESOLUTION
+
+
+class RollingStats:
+    '''
+    Rolling statistics of all columns of a dataframe
+
+    parameters:
+    df:     Pandas Dataframe with EPD data (one row per config.TIME_RESOLUTION)
+    block:  number of rows after which the prefix sums are restarted (one day)
+    '''
+    def __init__(self, df: pd.DataFrame, block=SAMPLES_PER_DAY):
+        self.block = block
+        self.index = df.index
+        self.columns = df.columns
+        self.offset = self._day_offset(df.index)
+        self.values = np.empty((0, len(df.columns)))
+        self.extend(df)
+
+    def _day_offset(self, index):
+        # Rows between midnight and the first row, so the blocks start at midnight
+        if not isinstance(index, pd.DatetimeIndex) or len(index) == 0:
+            return 0
+        offset = (index[0] - index[0].normalize()) // pd.Timedelta(seconds=config.TIME_RESOLUTION)
+        return int(offset) % self.block
+
+    def extend(self, df: pd.DataFrame):
+        '''
+        Appends the rows of df (same columns, following the current rows) and updates the prefix sums
+        '''
+        if len(self.values) > 0:
+            self.index = self.index.append(df.index)
+
+        # Only the last block can change, the finished ones are kept
+        first_block = (len(self.values) + self.offset) // self.block
+        start = max(first_block * self.block - self.offset, 0)
+        self.values = np.concatenate([self.values, df.to_numpy(dtype=np.float64)])
+        n_rows, n_columns = self.values.shape
+
+        # Padding the rows to whole blocks (nan is not counted)
+        head = (start + self.offset) % self.block
+        tail = -(head + n_rows - start) % self.block
+        values = np.concatenate([np.full((head, n_columns), np.nan), self.values[start:], np.full((tail, n_columns), np.nan)])
+        values = values.reshape(-1, self.block, n_columns)
+
+        finite = ~np.isnan(values)
+        filled = np.where(finite, values, 0)
+        counts = finite.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            reference = filled.sum(axis=1) / counts
+        reference[counts == 0] = 0
+        centered = filled - finite * reference[:, np.newaxis]
+
+        # prefix[k][block, i] holds the count (k = 0), sum (1) and sum of squares (2) of the first i rows of the block.
+        # The last block is always empty (used for the parts of windows that are outside of the data)
+        blocks = first_block + len(values) + 1
+        old_prefix = getattr(self, 'prefix', None) if start > 0 else None
+        self.prefix = [np.zeros((blocks, self.block + 1, n_columns)) for _ in range(3)]
+        for k, block_values in enumerate([finite, centered, centered * centered]):
+            if old_prefix is not None:
+                self.prefix[k][:first_block] = old_prefix[k][:first_block]
+            np.cumsum(block_values, axis=1, out=self.prefix[k][first_block:-1, 1:])
+
+        old_reference = self.reference[:first_block] if start > 0 else np.zeros((0, n_columns))
+        self.reference = np.concatenate([old_reference, reference, np.zeros((1, n_columns))])
+
+        # Number of value changes, a window without changes is constant (std exactly 0)
+        changed = self.values[max(start, 1):] != self.values[max(start, 1) - 1:-1]
+        old_changes = self.changes[:start + 1] if start > 0 else np.zeros((2 if n_rows > 0 else 1, n_columns), dtype=np.int64)
+        self.changes = np.concatenate([old_changes, old_changes[-1] + np.cumsum(changed, axis=0)])
+
+    def mean_std(self, length):
+        '''
+        Returns mean and std (ddof=0) of the windows of length rows ending at each row as arrays (rows x columns).
+        Windows with missing data (nan) are nan, like pandas rolling with min_periods=length
+        '''
+        n_rows, n_columns = self.values.shape
+        rows = np.arange(n_rows)
+        first = rows - length + 1
+        valid = first >= 0
+        first = np.maximum(first, 0)
+
+        if length <= self.block + 1:
+            # Padded to whole blocks, the first row is at position offset
+            count, total, square = [sums.reshape(-1, n_columns)[self.offset:self.offset + n_rows] for sums in self._short_window_sums(length)]
+            target = np.repeat(self.reference[:-1], self.block, axis=0)[self.offset:self.offset + n_rows]
+        else:
+            count, total, square, target = self._long_window_sums(length, rows, first)
+
+        incomplete = (count != length) | ~valid[:, np.newaxis]
+        mean_centered = total / length
+        variance = square / length
+        variance -= mean_centered * mean_centered
+        np.maximum(variance, 0, out=variance)
+
+        # Like pandas, a constant window has exactly its value as mean and 0 as std
+        constant = (self.changes[1:] - self.changes[first + 1]) == 0
+        variance[constant] = 0
+        mean = target + mean_centered
+        np.copyto(mean, self.values, where=constant)
+
+        std = np.sqrt(variance)
+        mean[incomplete] = np.nan
+        std[incomplete] = np.nan
+        return mean, std
+
+    def _short_window_sums(self, length):
+        # Window sums (count, sum, sum of squares relative to the reference of the block of the last row) for windows
+        # covering at most two blocks, each of shape (blocks, block, columns)
+        previous = np.arange(len(self.prefix[0]) - 1) - 1
+        shift = (self.reference[previous] - self.reference[:-1])[:, np.newaxis]
+
+        sums = []
+        for prefix in self.prefix:
+            window = np.empty_like(prefix[:-1, 1:])
+            # Windows within one block
+            np.subtract(prefix[:-1, length:], prefix[:-1, :self.block + 1 - length], out=window[:, length - 1:])
+            # Windows reaching into the previous block (for the first block, the empty block at the end is the previous one)
+            tail = prefix[previous, self.block:] - prefix[previous, self.block + 1 - length:self.block]
+            np.add(prefix[:-1, 1:length], tail, out=window[:, :length - 1])
+            sums.append((window, tail))
+
+        # Moving the sums of the previous block to the reference of the block of the last row
+        (count, count_tail), (total, total_tail), (square, square_tail) = sums
+        square[:, :length - 1] += shift * (2 * total_tail + count_tail * shift)
+        total[:, :length - 1] += count_tail * shift
+        return count, total, square
+
+    def _long_window_sums(self, length, rows, first):
+        # Window sums for windows covering any number of blocks, one block after another
+        n_rows, n_columns = self.values.shape
+        block_last, position_last = np.divmod(rows + self.offset, self.block)
+        block_first, position_first = np.divmod(first + self.offset, self.block)
+        target = self.reference[block_last]
+        count, total, square = [np.zeros((n_rows, n_columns)) for _ in range(3)]
+
+        for step in range((length - 1) // self.block + 2):
+            block = block_first + step
+            inside = block <= block_last
+            if not inside.any():
+                break
+            # Blocks after the window are replaced by the empty block at the end
+            block = np.where(inside, block, len(self.reference) - 1)
+            low = position_first if step == 0 else 0
+            high = np.where(block == block_last, position_last + 1, self.block)
+            part_count, part_total, part_square = [prefix[block, high] - prefix[block, low] for prefix in self.prefix]
+
+            # Moving the sums to the reference of the last block
+            shift = self.reference[block] - target
+            square += part_square + shift * (2 * part_total + part_count * shift)
+            total += part_total + part_count * shift
+            count += part_count
+
+        return count, total, square, target
+
+    def running_average(self, length=18):
+        '''
+        Returns the running mean and std as dataframes, shifted by 5 minutes to exclude the current datapoint (see epd.running_average)
+        '''
+        mean, std = self.mean_std(length)
+        cadence = pd.Timedelta(minutes=5)
+
+        if _is_regular(self.index, cadence):
+            # The shift by 5 minutes is a shift by one row
+            mean = np.concatenate([np.full((1, mean.shape[1]), np.nan), mean[:-1]])
+            std = np.concatenate([np.full((1, std.shape[1]), np.nan), std[:-1]])
+            return pd.DataFrame(mean, index=self.index, columns=self.columns), pd.DataFrame(std, index=self.index, columns=self.columns)
+
+        df_mean = pd.DataFrame(mean, index=self.index, columns=self.columns)
+        df_std = pd.DataFrame(std, index=self.index, columns=self.columns)
+        df_mean = pd.DataFrame(df_mean.shift(5, freq="min"), index=self.index)
+        df_std = pd.DataFrame(df_std.shift(5, freq="min"), index=self.index)
+        return df_mean, df_std
+
+
+def _is_regular(index, cadence):
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return False
+    return bool((np.diff(index.asi8) == cadence.value).all())
@@ -0,0 +1,202 @@
+import os
+import re
+import glob
+import pandas as pd
+import pyarrow.parquet as pq
+import config
+from .data_helper import step_electron
+
+'''
+Columnar store of the reduced EPD dataset.
+
+Instead of one pickle per day, the data is kept in one parquet file per sensor, viewing, particle and month:
+    EPD_Store/ept/<viewing>/<particle>/yyyy-mm.parquet
+    EPD_Store/step/yyyy-mm.parquet
+
+A month file only holds days with the same columns. On the 2021-10-22 the STEP data product changed from 48 to 32 channels,
+those days end up in a second chunk of the same month (yyyy-mm.1.parquet).
+'''
+
+STORE_DIR = f'{config.CACHE_DIR}/EPD_Store'
+INDEX_NAME = 'time'
+
+CHUNK_REGEX = re.compile(r'(\d{4}-\d{2})(?:\.(\d+))?\.parquet')
+
+
+def chunk_folder(sensor, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Returns the folder holding the month files of a sensor (and viewing/particle for EPT)
+    '''
+    if sensor == 'ept':
+        return f'{directory}/{sensor}/{viewing}/{particle}'
+    return f'{directory}/{sensor}'
+
+
+def has_data(sensor, viewing=None, particle=None, directory=STORE_DIR):
+    return len(glob.glob(f'{chunk_folder(sensor, viewing, particle, directory)}/*.parquet')) > 0
+
+
+def has_column(sensor, column, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Checks if the month files of the store hold the column
+    '''
+    for path in glob.glob(f'{chunk_folder(sensor, viewing, particle, directory)}/*.parquet'):
+        if column in pq.read_schema(path).names:
+            return True
+    return False
+
+
+def _month_chunks(folder, month):
+    chunks = []
+    for path in glob.glob(f'{folder}/{month}*.parquet'):
+        match = CHUNK_REGEX.fullmatch(os.path.basename(path))
+        if match is None or match.group(1) != month:
+            continue
+        chunks.append((int(match.group(2) or 0), path))
+    return [path for _, path in sorted(chunks)]
+
+
+def _write_atomic(df: pd.DataFrame, path):
+    temp_path = path + '.tmp'
+    df.to_parquet(temp_path)
+    os.replace(temp_path, path)
+
+
+def write_days(df: pd.DataFrame, sensor, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Writes the reduced data of one or more days of the same month into the month file. Existing data of these days is replaced.
+
+    parameters:
+    df:         reduced dataframe of whole days (output of reduce_data)
+    sensor:     string with name of sensor
+    viewing:    string with name of viewing angle [sun, asun, north, south] (only EPT)
+    particle:   string of particle type [ion, electron] (only EPT)
+    '''
+    folder = chunk_folder(sensor, viewing, particle, directory)
+    os.makedirs(folder, exist_ok=True)
+
+    day_start = df.index[0].floor('D')
+    day_end = df.index[-1].floor('D') + pd.Timedelta(days=1)
+    month = str(day_start)[0:7]
+    assert str(day_end - pd.Timedelta(days=1))[0:7] == month, 'Only days of the same month can be written at once'
+
+    df = df.rename_axis(INDEX_NAME)
+    columns = [str(column) for column in df.columns]
+    target = None
+
+    for path in _month_chunks(folder, month):
+        chunk_columns = [name for name in pq.read_schema(path).names if name != INDEX_NAME]
+        df_chunk = pd.read_parquet(path)
+        day_mask = (day_start <= df_chunk.index) & (df_chunk.index < day_end)
+
+        if chunk_columns == columns:
+            target = path
+            df = pd.concat([df_chunk[~day_mask], df]).sort_index()
+        elif day_mask.any():
+            # Days were written before with different columns
+            _write_atomic(df_chunk[~day_mask], path)
+
+    if target is None:
+        n_chunks = len(_month_chunks(folder, month))
+        suffix = '' if n_chunks == 0 else f'.{n_chunks}'
+        target = f'{folder}/{month}{suffix}.parquet'
+
+    _write_atomic(df, target)
+
+
+def write_day(df: pd.DataFrame, sensor, date, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Writes the reduced data of the day date into the store, see write_days
+    '''
+    assert df.index[0].floor('D') == pd.Timestamp(date), f'Data does not start on the {date}'
+    write_days(df, sensor, viewing, particle, directory)
+
+
+def read_range(sensor, start_date, end_date, viewing=None, particle=None, columns=None, directory=STORE_DIR):
+    '''
+    Reads all days between start_date and end_date (both inclusive) with one read per month file.
+    Returns None if the store holds no data for this range.
+
+    parameters:
+    sensor:     string with name of sensor
+    start_date: string of starting date
+    end_date:   string of end date
+    viewing:    string with name of viewing angle [sun, asun, north, south] (only EPT)
+    particle:   string of particle type [ion, electron] (only EPT)
+    columns:    list of columns to decode, all columns if None
+    '''
+    folder = chunk_folder(sensor, viewing, particle, directory)
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    filters = [(INDEX_NAME, '>=', start), (INDEX_NAME, '<', end)]
+
+    frames = []
+    for month in pd.period_range(start, end - pd.Timedelta(seconds=1), freq='M'):
+        for path in _month_chunks(folder, str(month)):
+            selected = None
+            if columns is not None:
+                names = set(pq.read_schema(path).names)
+                selected = [column for column in columns if column in names]
+            df_chunk = pd.read_parquet(path, columns=selected, filters=filters)
+            if len(df_chunk) > 0:
+                frames.append(df_chunk)
+
+    if not frames:
+        return None
+
+    df = frames[0] if len(frames) == 1 else pd.concat(frames).sort_index()
+
+    # Days missing in the store are filled up with nan
+    required_indicies = pd.date_range(start, end, freq=f'{config.TIME_RESOLUTION}s', inclusive='left')
+    df = df.reindex(required_indicies)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return df
+
+
+def iter_chunks(sensor, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Yields the month files of the store in temporal order as dataframes
+    '''
+    folder = chunk_folder(sensor, viewing, particle, directory)
+    matches = [CHUNK_REGEX.fullmatch(os.path.basename(path)) for path in glob.glob(f'{folder}/*.parquet')]
+    months = sorted({match.group(1) for match in matches if match is not None})
+
+    for month in months:
+        frames = [pd.read_parquet(path) for path in _month_chunks(folder, month)]
+        frames = [df for df in frames if len(df) > 0]
+        for df in sorted(frames, key=lambda df: df.index[0]):
+            yield df
+
+
+def convert_pickles(sensor, start_date, end_date, viewing=None, particle=None, directory=STORE_DIR):
+    '''
+    Moves the per day pickles of the old dataset (EPD_Dataset) into the store.
+    Consecutive days of the same month and with the same columns are written at once.
+    '''
+    import misc
+
+    frames = []
+
+    def flush():
+        if frames:
+            write_days(pd.concat(frames), sensor, viewing, particle, directory)
+        frames.clear()
+
+    for date in misc.day_range(start_date, end_date):
+        if sensor == 'ept':
+            path = f'{config.CACHE_DIR}/EPD_Dataset/{sensor}/{viewing}/{particle}/{date}.pkl'
+        else:
+            path = f'{config.CACHE_DIR}/EPD_Dataset/{sensor}/{date}.pkl'
+
+        if os.path.isfile(path):
+            df = pd.read_pickle(path)
+            if sensor == 'step' and 'Electron_Avg_Flux_0' not in df.columns:
+                # Old pickles were written without the electron flux
+                df = pd.concat([df, step_electron(df)], axis=1)
+            if frames and (date[0:7] != str(frames[-1].index[0])[0:7] or not df.columns.equals(frames[-1].columns)):
+                flush()
+            frames.append(df)
+
+    flush()
+
@@ -0,0 +1,168 @@
+import os
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+
+import config
+from .rolling import RollingStats
+from .events import find_runs, runs_to_frame
+from .matching import connected_matrix
+from .chunks import halo_days
+from .associations import SENSORS, Parameters, load_sensor, sensor_speeds, chunk_jobs, run_jobs
+
+'''
+Parameter sweep of the association (a grid of all parameters of associations.Parameters in one run).
+
+Every step only depends on some of the parameters, so it is done once for them and reused for all others:
+    load the data                       once per chunk and sensor
+    rolling statistics (prefix sums)    once per chunk and sensor, mean/std once per window length
+    z-scores (flux - mean) / std        once per window length, the events of a sigma are the runs of z > sigma
+    connected channels of the flares    once per window length, sigma and indirect factor
+    needed channels, delta              a comparison per combination at the end
+The result is a tidy table with the number of connected flares per sensor for every combination.
+
+z > sigma selects the same samples as flux > mean + sigma * std (epd.events.exceedance) up to rounding exactly at the
+threshold.
+'''
+
+
+def _values(default):
+    return field(default_factory=lambda: [default])
+
+
+@dataclass
+class Grid:
+    '''
+    Values of every parameter of the sweep (defaults: the single value of associations.Parameters)
+    '''
+    window_length: list = _values(Parameters.window_length)
+    step_sigma: list = _values(Parameters.step_sigma)
+    ept_sigma: list = _values(Parameters.ept_sigma)
+    delta_flares: list = _values(Parameters.delta_flares)
+    needed_channels: list = _values(Parameters.needed_channels)
+    indirect_factor: list = _values(Parameters.indirect_factor)
+
+    def __len__(self):
+        return (len(self.window_length) * len(self.step_sigma) * len(self.ept_sigma) * len(self.delta_flares)
+                * len(self.needed_channels) * len(self.indirect_factor))
+
+
+def sweep_path():
+    return f'{config.OUTPUT_DIR}/sweep.csv'
+
+
+def sweep_chunk(data_start, data_end, flares: pd.DataFrame, distance, grid: Grid, load=load_sensor):
+    '''
+    Number of connected channels of the flares of the chunk for all sensors, window lengths, sigmas and indirect factors.
+    Returns a dataframe (index of the flares) with one column (sensor name, window_length, sigma, indirect_factor) each
+
+    parameters:
+    flares:     flares of the chunk (columns _date_start and _date_end, see stix.prepare_flares)
+    distance:   Parker spiral distance of these flares [m]
+    load:       function (sensor, viewing, start_date, end_date) -> dataframe with the flux of all channels
+    '''
+    channels = {}
+    for name, (sensor, viewing) in SENSORS.items():
+        df_sensor = load(sensor, viewing, data_start, data_end)
+        data = df_sensor.to_numpy()
+        rolling_stats = RollingStats(df_sensor)
+        speeds = sensor_speeds(sensor, len(df_sensor.columns))
+        sigmas = grid.step_sigma if sensor == 'step' else grid.ept_sigma
+
+        for window_length in grid.window_length:
+            running_mean, running_std = rolling_stats.running_average(window_length)
+            mean = running_mean.to_numpy()
+            # A constant window (std 0) gives inf above the mean, nan (never selected) for missing statistics
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z_scores = (data - mean) / running_std.to_numpy()
+            # If mean is zero, we want to ignore it
+            usable = mean != 0
+
+            for sigma in sigmas:
+                with np.errstate(invalid='ignore'):
+                    selected = (z_scores > sigma) & usable
+                channel, start, _ = find_runs(selected)
+                df_starts = runs_to_frame(df_sensor.index, df_sensor.columns, channel, start)
+
+                for indirect_factor in grid.indirect_factor:
+                    connected = connected_matrix(df_starts, flares["_date_start"], flares["_date_end"], distance, speeds,
+                                                 indirect_factor)
+                    channels[(name, window_length, sigma, indirect_factor)] = connected.sum(axis=1)
+    return pd.DataFrame(channels, index=flares.index)
+
+
+def count_connected(channels, min_dist, grid: Grid):
+    '''
+    Counts the connected flares of every combination of the grid.
+    Returns the tidy table (one row per combination and sensor, incl. EPT (All Directions) and Total (All Sensors))
+
+    parameters:
+    channels:   connected channels of all flares, one column per (sensor name, window_length, sigma, indirect_factor)
+                (see sweep_chunk)
+    min_dist:   Min Dist of all flares (same order)
+    '''
+    names = list(SENSORS)
+    ept = np.array([SENSORS[name][0] == 'ept' for name in names])
+    mct = {delta: np.asarray(min_dist <= delta) for delta in grid.delta_flares}
+
+    rows = []
+    for window_length, step_sigma, ept_sigma, indirect_factor in itertools.product(grid.window_length, grid.step_sigma,
+                                                                                   grid.ept_sigma, grid.indirect_factor):
+        # sensors x flares
+        keys = [(name, window_length, ept_sigma if ept[i] else step_sigma, indirect_factor) for i, name in enumerate(names)]
+        # No flares (no chunk or all chunks failed): no columns
+        sensor_channels = np.stack([channels[key].to_numpy() if key in channels else np.zeros(len(channels), dtype=np.int64)
+                                    for key in keys])
+        for needed_channels in grid.needed_channels:
+            epd_event = sensor_channels >= needed_channels
+            for delta_flares in grid.delta_flares:
+                connected = epd_event & mct[delta_flares]
+                counts = list(connected.sum(axis=1)) + [connected[ept].any(axis=0).sum(), connected.any(axis=0).sum()]
+                for sensor, count in zip(names + ["EPT (All Directions)", "Total (All Sensors)"], counts):
+                    rows.append((window_length, step_sigma, ept_sigma, delta_flares, needed_channels, indirect_factor,
+                                 sensor, int(count)))
+
+    return pd.DataFrame(rows, columns=["window_length", "step_sigma", "ept_sigma", "delta_flares", "needed_channels",
+                                       "indirect_factor", "sensor", "connected"])
+
+
+def generate(flares: pd.DataFrame, distance: pd.Series, start_date=config.START_DATE, end_date=config.END_DATE, grid=None,
+             days=30, margin=1, workers=None, path=None, load=load_sensor):
+    '''
+    Evaluates all combinations of the grid for the flares peaking between start_date and end_date (both inclusive), the
+    chunks run in parallel (see associations.generate). Writes and returns the tidy table of the connected flares
+    (see count_connected).
+
+    parameters:
+    flares:     STIX flare list with the columns of stix.prepare_flares and 'Min Dist'
+    distance:   Parker spiral distance of the flares [m] (index of flares)
+    grid:       values of the parameters (default: Grid(), the defaults of associations.Parameters)
+    path:       path of the csv table (default: sweep_path()), False to not write it
+    load:       function (sensor, viewing, start_date, end_date) -> dataframe, must be picklable for workers > 1
+    '''
+    grid = grid or Grid()
+    jobs = chunk_jobs(flares, distance, start_date, end_date, days, margin, halo_days(max(grid.window_length)))
+    n_flares = sum(len(job[1][2]) for job in jobs)
+    print(f'{len(grid)} combinations, {len(jobs)} chunks with flares, {n_flares} flares')
+
+    started = time.perf_counter()
+    results, _ = run_jobs(sweep_chunk, [(chunk, arguments + (grid, load)) for chunk, arguments in jobs], workers)
+
+    # The chunks finish in any order
+    if results:
+        channels = pd.concat(results).sort_index(kind='stable')
+    else:
+        channels = pd.DataFrame(index=pd.Index([], dtype=flares.index.dtype))
+    table = count_connected(channels, flares["Min Dist"].reindex(channels.index).to_numpy(), grid)
+
+    elapsed = time.perf_counter() - started
+    print(f'{len(grid)} combinations of {len(channels)} flares in {elapsed:.1f} s: {len(grid) / elapsed:.1f} combinations/s')
+
+    if path is not False:
+        path = path or sweep_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        table.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    return table
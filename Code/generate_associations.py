@@ -0,0 +1,49 @@
+import os
+import argparse
+import pandas as pd
+
+import config
+import stix
+from connectivity_tool import distance
+from epd import associations
+from misc import parker
+
+'''
+Associates all STIX flares of the mission with the EPD events of all sensors (no plots, unlike streamlit/generate_monthly.py).
+
+1. The flares need the Min Dist (connectivity tool) and the Parker spiral distance (generate_solar_mach_dataset.py)
+2. The time span is split into chunks (--days), the chunks are processed in parallel on all cores
+    2.1 Every chunk loads the EPD data of all sensors, detects the events and matches the flares peaking in the chunk
+3. All rows are written into one table (../Data/associations.csv), one row per flare and sensor
+    3.1 The number of connected flares per sensor and the throughput are printed at the end
+
+Example:
+    python generate_associations.py --workers 16 --sigma-ept 3 --output ../Data/associations_sigma3.csv
+'''
+
+if __name__ == '__main__':
+    defaults = associations.Parameters()
+    parser = argparse.ArgumentParser(description='Associate the STIX flares with the EPD events')
+    parser.add_argument('--start', default=config.START_DATE, help='yyyy-mm-dd')
+    parser.add_argument('--end', default=config.END_DATE, help='yyyy-mm-dd')
+    parser.add_argument('--days', type=int, default=30, help='maximal number of days of a chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--output', default=None, help='path of the table (default: ../Data/associations.csv)')
+    parser.add_argument('--window-length', type=int, default=defaults.window_length, help='running average window (samples)')
+    parser.add_argument('--sigma-step', type=float, default=defaults.step_sigma)
+    parser.add_argument('--sigma-ept', type=float, default=defaults.ept_sigma)
+    parser.add_argument('--delta', type=float, default=defaults.delta_flares, help='flare acceptance radius [deg]')
+    parser.add_argument('--channels', type=int, default=defaults.needed_channels, help='number of channels needed for connection')
+    parser.add_argument('--indirect', type=float, default=defaults.indirect_factor, help='Parker spiral extension factor')
+    args = parser.parse_args()
+
+    parameters = associations.Parameters(window_length=args.window_length, step_sigma=args.sigma_step, ept_sigma=args.sigma_ept,
+                                         delta_flares=args.delta, needed_channels=args.channels, indirect_factor=args.indirect)
+
+    flares = stix.prepare_flares(stix.read_list())
+    flares["Min Dist"] = distance.load_table(flares)
+    parker_dist_series = pd.read_pickle(parker.distance_table_path())['Parker_Spiral_Distance']
+
+    table = associations.generate(flares, parker_dist_series, args.start, args.end, parameters, days=args.days,
+                                  workers=args.workers, path=args.output)
+    print(associations.summary(table).to_string())
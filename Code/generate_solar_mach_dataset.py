@@ -1,29 +1,33 @@
-import pandas as pd
+import os
+import argparse
 
-from tqdm import tqdm
-import stix
-import misc
 import config
+import stix
+from misc import parker
 
-# read STIX flare list and extract coordinates of the origin
-stix_flares = stix.read_list()
+'''
+Computes the Parker spiral distance (SolarMACH) of all flares of the STIX flare list.
 
-df = pd.DataFrame(index = range(len(stix_flares)), columns = ['Parker_Spiral_Distance'])
+1. The flares are computed in parallel on all cores
+    1.1 Every finished flare is appended to a log (SolarMACH/parker_spiral_distance.jsonl), a restart only computes the
+        missing flares (also after a new release of the STIX list)
+2. The log is compacted into SolarMACH/parker_spiral_distance.pkl, which is read by the app
+3. With --grid the coordinates of Solar Orbiter are also computed on an hourly grid (SolarMACH/coordinate_grid.npz),
+    distances at any other time are then interpolated from the grid (misc.step_delay)
 
-dest = f"{config.CACHE_DIR}/SolarMACH/parker_spiral_distance.pkl"
+Example:
+    python generate_solar_mach_dataset.py --workers 16 --grid
+'''
 
-dest_temp = f"{config.CACHE_DIR}/SolarMACH/parker_spiral_distance_temp.pkl"
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the Parker spiral distances of the STIX flares')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--grid', action='store_true', help='also build the hourly coordinate grid')
+    args = parser.parse_args()
 
-for i in tqdm(df.index):
-    if i % 100 == 0:
-        df.to_pickle(dest_temp)
-        
-        print("--------------------------------------------------------------")
-        print("Done until", i)
-        print("--------------------------------------------------------------")
-    
-    timestamp = stix_flares['peak_UTC'][i]
-    print("working on", timestamp[0:10], timestamp[11:16])
-    df['Parker_Spiral_Distance'][i] = misc.parker_spiral_distance(timestamp)
+    # read STIX flare list and extract coordinates of the origin
+    stix_flares = stix.read_list()
+    parker.generate(stix_flares, workers=args.workers)
 
-df.to_pickle(dest)
\ No newline at end of file
+    if args.grid:
+        parker.build_grid(config.START_DATE, config.END_DATE, workers=args.workers)
@@ -0,0 +1,49 @@
+import os
+import argparse
+import pandas as pd
+
+import config
+import stix
+from connectivity_tool import distance
+from epd import sweep
+from misc import parker
+
+'''
+Sweeps the parameters of the association (see generate_associations.py) over a grid of values.
+
+1. Every parameter takes a list of values, all combinations are evaluated
+2. The chunks are processed in parallel on all cores, the data, rolling statistics and events are shared by the combinations
+   (see epd/sweep.py)
+3. The number of connected flares per sensor of every combination is written into one table (../Data/sweep.csv)
+
+Example:
+    python generate_sweep.py --window-length 12 18 24 --sigma-ept 2 2.5 3 --sigma-step 3 3.5 4 --delta 10 20 30
+'''
+
+if __name__ == '__main__':
+    defaults = sweep.Grid()
+    parser = argparse.ArgumentParser(description='Sweep the parameters of the association of the STIX flares with the EPD events')
+    parser.add_argument('--start', default=config.START_DATE, help='yyyy-mm-dd')
+    parser.add_argument('--end', default=config.END_DATE, help='yyyy-mm-dd')
+    parser.add_argument('--days', type=int, default=30, help='maximal number of days of a chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--output', default=None, help='path of the table (default: ../Data/sweep.csv)')
+    parser.add_argument('--window-length', type=int, nargs='+', default=defaults.window_length, help='running average windows (samples)')
+    parser.add_argument('--sigma-step', type=float, nargs='+', default=defaults.step_sigma)
+    parser.add_argument('--sigma-ept', type=float, nargs='+', default=defaults.ept_sigma)
+    parser.add_argument('--delta', type=float, nargs='+', default=defaults.delta_flares, help='flare acceptance radii [deg]')
+    parser.add_argument('--channels', type=int, nargs='+', default=defaults.needed_channels, help='numbers of channels needed for connection')
+    parser.add_argument('--indirect', type=float, nargs='+', default=defaults.indirect_factor, help='Parker spiral extension factors')
+    args = parser.parse_args()
+
+    grid = sweep.Grid(window_length=args.window_length, step_sigma=args.sigma_step, ept_sigma=args.sigma_ept,
+                      delta_flares=args.delta, needed_channels=args.channels, indirect_factor=args.indirect)
+
+    flares = stix.prepare_flares(stix.read_list())
+    flares["Min Dist"] = distance.load_table(flares)
+    parker_dist_series = pd.read_pickle(parker.distance_table_path())['Parker_Spiral_Distance']
+
+    table = sweep.generate(flares, parker_dist_series, args.start, args.end, grid, days=args.days, workers=args.workers,
+                           path=args.output)
+    print(table.pivot_table(index=["window_length", "step_sigma", "ept_sigma", "delta_flares", "needed_channels", "indirect_factor"],
+                            columns="sensor", values="connected").to_string())
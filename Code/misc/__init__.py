@@ -1,3 +1,3 @@
 from .physics import step_delay, parker_spiral_distance
-from .date import next_date, previous_date, parse_date_list
+from .date import next_date, previous_date, parse_date_list, day_range, parse_utc, round_to_slot, utc_strings
 from .misc_handler import get_epd_bins
@@ -0,0 +1,178 @@
+import os
+import sys
+import pickle
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+'''
+Thread safe LRU cache with a memory budget.
+
+Unlike functools.cache, the cache keeps at most max_bytes of values in memory, the least recently used values are
+evicted first. With a spill directory, evicted values are pickled to disk and loaded again on the next request instead
+of being recomputed (other processes with the same spill directory share them). The spill directory has a budget as well,
+the least recently used files are deleted first.
+Concurrent requests for the same key (e.g. Streamlit script threads) compute the value only once.
+'''
+
+
+def sizeof(value):
+    '''
+    Estimated memory usage of a value in bytes
+    '''
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    '''
+    parameters:
+    max_bytes:          memory budget of the cached values
+    spill_directory:    folder for the evicted values, None to drop them
+    spill_max_bytes:    disk budget of the spill directory (default: 4 * max_bytes)
+    '''
+    def __init__(self, max_bytes, spill_directory=None, spill_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.spill_directory = spill_directory
+        self.spill_max_bytes = spill_max_bytes if spill_max_bytes is not None else 4 * max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.size = 0
+
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _spill_path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.spill_directory, f'{digest}.pkl')
+
+    def _insert(self, key, value):
+        # Caller holds the lock, returns the evicted (key, value) pairs
+        size = sizeof(value)
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            # Larger than the whole budget, not kept in memory
+            return [(key, value)]
+        self._entries[key] = (value, size)
+        self.size += size
+
+        evicted = []
+        while self.size > self.max_bytes:
+            evicted_key, (evicted_value, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            evicted.append((evicted_key, evicted_value))
+        return evicted
+
+    def _spill(self, key, value):
+        if self.spill_directory is None:
+            return
+        os.makedirs(self.spill_directory, exist_ok=True)
+        path = self._spill_path(key)
+        if os.path.isfile(path):
+            return
+        with open(path + f'.{threading.get_ident()}.tmp', 'wb') as spill_file:
+            pickle.dump(value, spill_file)
+        os.replace(path + f'.{threading.get_ident()}.tmp', path)
+        self._trim_spill()
+
+    def _trim_spill(self):
+        # Deletes the least recently used spill files (by modification time) until the directory fits its budget
+        files = []
+        for entry in os.scandir(self.spill_directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.spill_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Deleted by another process sharing the directory
+                pass
+            total -= size
+
+    def _load_spilled(self, key):
+        if self.spill_directory is None:
+            return None
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as spill_file:
+                value = pickle.load(spill_file)
+            # Marks the file as recently used
+            os.utime(path)
+            return value
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def get(self, key, compute):
+        '''
+        Returns the cached value of key, compute() is called (once for concurrent requests) if it is not cached
+        '''
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                event = self._pending.get(key)
+                if event is None:
+                    self._pending[key] = threading.Event()
+                    break
+            # Another thread computes the value
+            event.wait()
+
+        try:
+            value = self._load_spilled(key)
+            spilled = value is not None
+            if not spilled:
+                value = compute()
+            with self._lock:
+                if spilled:
+                    self.spill_hits += 1
+                else:
+                    self.misses += 1
+                evicted = self._insert(key, value)
+            # Writing to disk without holding the lock
+            for evicted_key, evicted_value in evicted:
+                self._spill(evicted_key, evicted_value)
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'spill_hits': self.spill_hits, 'entries': len(self._entries), 'bytes': self.size}
+
+    def wrap(self, function):
+        '''
+        Decorator caching the function by its positional arguments
+        '''
+        @functools.wraps(function)
+        def wrapper(*args):
+            return self.get(args, lambda: function(*args))
+        wrapper.cache = self
+        return wrapper
@@ -1,4 +1,6 @@
 import datetime
+import numpy as np
+import pandas as pd
 
 
 def next_date(current_date):
@@ -31,4 +33,55 @@ def parse_date_list(utc_times: list[str]):
 
 
 def utc_to_datetime(utc):
-    return datetime.datetime.strptime(utc[2:10] + " " + utc[11:19], "%y-%m-%d %H:%M:%S")
\ No newline at end of file
+    return datetime.datetime.strptime(utc[2:10] + " " + utc[11:19], "%y-%m-%d %H:%M:%S")
+
+
+# Array versions (datetime64) of the helpers above, without Python work per element
+
+def day_range(start_date, end_date):
+    '''
+    Returns all dates between start_date and end_date (both inclusive) as strings (yyyy-mm-dd)
+    
+    parameters:
+    start_date: string of starting date (yyyy-mm-dd)
+    end_date:   string of end date (yyyy-mm-dd)
+    '''
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+    return days.astype(str).tolist()
+
+
+def parse_utc(utc_times):
+    '''
+    Parses an array/Series of utc strings (ISO 8601) to datetime64[ns], values that are already datetimes are kept
+    '''
+    if isinstance(utc_times, pd.Series):
+        if pd.api.types.is_datetime64_dtype(utc_times):
+            return utc_times
+        return pd.to_datetime(utc_times, format='ISO8601')
+    return pd.to_datetime(np.asarray(utc_times), format='ISO8601').to_numpy(dtype='datetime64[ns]')
+
+
+def round_to_slot(times, hours=6):
+    '''
+    Rounds the times to the closest multiple of `hours` by the full hour (minutes are ignored, like stix.closest_timestamp:
+    02:59 -> 00:00, 03:00 -> 06:00)
+    '''
+    times = np.asarray(times, dtype='datetime64[ns]')
+    full_hours = times.astype('datetime64[h]') + np.timedelta64(hours // 2, 'h')
+    slots = full_hours.astype(np.int64) // hours * hours
+    return slots.astype('datetime64[h]').astype('datetime64[ns]')
+
+
+def slot_strings(times):
+    '''
+    Formats the slot times like the connectivity tool timestamps (yyyy-mm-ddThh:00:00.000)
+    '''
+    times = np.asarray(times, dtype='datetime64[ns]')
+    return np.char.add(np.datetime_as_string(times, unit='h'), ':00:00.000')
+
+
+def utc_strings(times):
+    '''
+    Formats the times like the utc strings of the STIX flare list (yyyy-mm-ddThh:mm:ss.fff)
+    '''
+    return np.datetime_as_string(parse_utc(times), unit='ms')
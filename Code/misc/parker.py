@@ -0,0 +1,249 @@
+import os
+import json
+import functools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+from .physics import parker_spiral_distance, parker_length, solar_mach_coordinates, SOLAR_MACH_COLUMNS
+from .date import utc_strings
+
+'''
+Generation of the Parker spiral distances of all STIX flares.
+
+Every flare is an independent SolarMACH call, so the flares are farmed out to a process pool. Each finished flare is appended
+to a log (one json line {flare_id, peak_UTC, distance}), on a restart all flares in the log are skipped. At the end the log is
+compacted into the table that is read by the app (SolarMACH/parker_spiral_distance.pkl).
+
+For arbitrary times, the SolarMACH coordinates of Solar Orbiter are kept on a fixed grid (hourly by default). The
+coordinates of any array of timestamps are interpolated linearly from the grid (longitudes are unwrapped first), and the
+distance follows from physics.parker_length, so no further SolarMACH call is needed.
+'''
+
+
+def distance_log_path():
+    return f'{config.CACHE_DIR}/SolarMACH/parker_spiral_distance.jsonl'
+
+
+def distance_table_path():
+    return f'{config.CACHE_DIR}/SolarMACH/parker_spiral_distance.pkl'
+
+
+class DistanceLog:
+    '''
+    Append only log of the computed distances, keyed by flare_id. A flare whose peak_UTC changed (new release of the STIX list)
+    counts as not done.
+    '''
+    def __init__(self, path=None):
+        self.path = path or distance_log_path()
+        self.entries = {}
+        self.cut_off = False
+
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path, 'r') as log_file:
+            lines = log_file.read()
+
+        self.cut_off = len(lines) > 0 and not lines.endswith('\n')
+        for line in lines.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line might be cut off by a crash
+                continue
+            self.entries[entry['flare_id']] = (entry['peak_UTC'], entry['distance'])
+
+    def is_done(self, flare_id, peak_utc):
+        return flare_id in self.entries and self.entries[flare_id][0] == peak_utc
+
+    def record(self, flare_id, peak_utc, distance):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as log_file:
+            if self.cut_off:
+                log_file.write('\n')
+                self.cut_off = False
+            log_file.write(json.dumps({'flare_id': flare_id, 'peak_UTC': peak_utc, 'distance': distance}) + '\n')
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self.entries[flare_id] = (peak_utc, distance)
+
+
+def compact(flares: pd.DataFrame, log: DistanceLog, path=None):
+    '''
+    Writes the table (index of flares, columns flare_id and Parker_Spiral_Distance) from the log, missing flares are nan
+    '''
+    path = path or distance_table_path()
+    distances = [log.entries[flare_id][1] if log.is_done(flare_id, peak_utc) else np.nan
+                 for flare_id, peak_utc in zip(flares['flare_id'], utc_strings(flares['peak_UTC']))]
+    df = pd.DataFrame({'flare_id': flares['flare_id'].to_numpy(), 'Parker_Spiral_Distance': np.asarray(distances, dtype=np.float64)},
+                      index=flares.index)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return df
+
+
+def generate(flares: pd.DataFrame, workers=None, log_path=None, table_path=None, distance=parker_spiral_distance):
+    '''
+    Computes the Parker spiral distance of all flares that are not in the log yet and compacts the log into the table.
+
+    parameters:
+    flares:     STIX flare list (columns flare_id and peak_UTC, strings or datetimes)
+    workers:    number of worker processes (default: number of cores), 1 runs everything in this process
+    log_path:   path of the log (default: distance_log_path())
+    table_path: path of the table (default: distance_table_path())
+    distance:   function peak_UTC -> distance [m]
+    '''
+    log = DistanceLog(log_path)
+    # The log holds the utc strings, so datetimes and strings of the flare list give the same keys
+    jobs = [(int(flare_id), str(peak_utc)) for flare_id, peak_utc in zip(flares['flare_id'], utc_strings(flares['peak_UTC']))
+            if not log.is_done(int(flare_id), str(peak_utc))]
+
+    print(f'{len(jobs)} of {len(flares)} flares left to compute')
+
+    def finish(flare_id, peak_utc, result):
+        try:
+            log.record(flare_id, peak_utc, float(result()))
+        except Exception as e:
+            # Not recorded, the flare is computed again on the next run
+            print(f'Failed flare {flare_id} ({peak_utc}):', repr(e))
+
+    if workers == 1:
+        for flare_id, peak_utc in jobs:
+            finish(flare_id, peak_utc, lambda: distance(peak_utc))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {executor.submit(distance, peak_utc): (flare_id, peak_utc) for flare_id, peak_utc in jobs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                finish(*futures[future], future.result)
+                if done % 100 == 0:
+                    print(f'Done {done} of {len(jobs)}')
+
+    return compact(flares, log, table_path)
+
+
+def _as_nanoseconds(timestamps):
+    # Strings, datetimes and datetime64 as int64 nanoseconds (1d)
+    return pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(timestamps))).as_unit('ns').asi8
+
+
+def grid_path():
+    return f'{config.CACHE_DIR}/SolarMACH/coordinate_grid.npz'
+
+
+class CoordinateGrid:
+    '''
+    SolarMACH coordinates of Solar Orbiter at the times of the grid
+
+    parameters:
+    times:          grid times as datetime64[ns] (sorted)
+    coordinates:    array (times x SOLAR_MACH_COLUMNS)
+    '''
+    def __init__(self, times, coordinates):
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)
+        self._x = self.times.astype(np.int64).astype(np.float64)
+
+        # Longitudes jump from 360 to 0, unwrapped they can be interpolated linearly
+        self._unwrapped = self.coordinates.copy()
+        for column in [0, 1]:
+            self._unwrapped[:, column] = np.unwrap(self.coordinates[:, column], period=360)
+
+    @classmethod
+    def load(cls, path=None):
+        with np.load(path or grid_path()) as npz:
+            return cls(npz['times'], npz['coordinates'])
+
+    def save(self, path=None):
+        path = path or grid_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # np.savez adds .npz to names without it
+        np.savez(path + '.tmp.npz', times=self.times, coordinates=self.coordinates)
+        os.replace(path + '.tmp.npz', path)
+
+    def covers(self, timestamps):
+        x = _as_nanoseconds(timestamps)
+        return len(self.times) > 1 and bool(((self._x[0] <= x) & (x <= self._x[-1])).all())
+
+    def interpolate(self, timestamps):
+        '''
+        Returns the coordinates (timestamps x SOLAR_MACH_COLUMNS) at the timestamps, nan outside of the grid
+        '''
+        x = _as_nanoseconds(timestamps).astype(np.float64)
+        result = np.empty((len(x), len(SOLAR_MACH_COLUMNS)))
+        for column in range(len(SOLAR_MACH_COLUMNS)):
+            result[:, column] = np.interp(x, self._x, self._unwrapped[:, column], left=np.nan, right=np.nan)
+        result[:, [0, 1]] %= 360
+        return result
+
+    def distance(self, timestamps):
+        '''
+        Returns the Parker spiral distance [m] at the timestamps (array), nan outside of the grid
+        '''
+        coordinates = self.interpolate(timestamps)
+        return parker_length(coordinates[:, 0], coordinates[:, 1], coordinates[:, 3])
+
+
+def build_grid(start_date=config.START_DATE, end_date=config.END_DATE, cadence='1h', workers=None, path=None,
+               coordinates=solar_mach_coordinates):
+    '''
+    Computes the SolarMACH coordinates at all grid times between start_date and end_date (both inclusive) in parallel.
+    Times that are already in the grid file are kept, so the grid can be extended.
+
+    parameters:
+    cadence:        distance of the grid times (pandas frequency)
+    workers:        number of worker processes (default: number of cores), 1 runs everything in this process
+    coordinates:    function utc -> list of the values of SOLAR_MACH_COLUMNS
+    '''
+    path = path or grid_path()
+    times = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(days=1), freq=cadence, inclusive='left')
+
+    known = {}
+    if os.path.isfile(path):
+        grid = CoordinateGrid.load(path)
+        known = dict(zip(grid.times, grid.coordinates))
+
+    missing = [time for time in times.to_numpy() if time not in known]
+    print(f'{len(missing)} of {len(times)} grid times left to compute')
+    utcs = [str(pd.Timestamp(time)) for time in missing]
+
+    if workers == 1:
+        results = [coordinates(utc) for utc in utcs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            results = list(executor.map(coordinates, utcs, chunksize=64))
+    known.update(zip(missing, results))
+
+    grid_times = np.array(sorted(known), dtype='datetime64[ns]')
+    grid = CoordinateGrid(grid_times, np.array([known[time] for time in grid_times]))
+    grid.save(path)
+    _open_grid.cache_clear()
+    return grid
+
+
+@functools.lru_cache(maxsize=4)
+def _open_grid(path, modified):
+    return CoordinateGrid.load(path)
+
+
+def open_grid(path=None):
+    '''
+    Loads the grid once per process (again if it was rebuilt), None if it was not built
+    '''
+    path = path or grid_path()
+    if not os.path.isfile(path):
+        return None
+    return _open_grid(path, os.path.getmtime(path))
+
+
+def grid_distance(timestamp, path=None):
+    '''
+    Parker spiral distance [m] at one time, interpolated from the grid. Falls back to SolarMACH if the grid doesn't cover the time
+    '''
+    grid = open_grid(path)
+    if grid is not None and grid.covers([timestamp]):
+        return float(grid.distance([timestamp])[0])
+    return parker_spiral_distance(timestamp)
@@ -2,11 +2,14 @@ import datetime
 import numpy as np
 import math
 
-def parker_spiral_distance(timestamp):
+# Columns of the SolarMACH coordinate table needed for the Parker spiral distance
+SOLAR_MACH_COLUMNS = ['Magnetic footpoint longitude (Carrington)', 'Carrington longitude (°)', 'Carrington latitude (°)',
+                      'Heliocentric distance (AU)', 'Vsw']
+
+def solar_mach_coordinates(timestamp):
     from solarmach import SolarMACH
     '''
-    Approximating the distance the particles have to travel until reaching SOLO
-    This is done using data from the SolarMACH tool
+    Returns the values of SOLAR_MACH_COLUMNS of Solar Orbiter at the time (one SolarMACH call)
     
     Parameters:
     utc: string of time
@@ -14,17 +17,35 @@ def parker_spiral_distance(timestamp):
     utc = str(timestamp)[0:10] + ' ' + str(timestamp)[11:19]
     body_list = ['Solar Orbiter']
     df = SolarMACH(utc, body_list).coord_table
+    return [float(df[column][0]) for column in SOLAR_MACH_COLUMNS]
+
+def parker_length(mag_footpoint_lon, solo_lon, heliocentric_dist):
+    '''
+    Length of the Parker spiral from the magnetic footpoint to Solar Orbiter [m], works on scalars and arrays
     
-    mag_footpoint_lon = df['Magnetic footpoint longitude (Carrington)'][0]
-    heliocentric_dist = df['Heliocentric distance (AU)'][0]
-    sw_speed = df['Vsw'][0]
-    solo_lon = df['Carrington longitude (°)'][0]
-    solo_lat = df['Carrington latitude (°)'][0]
+    Parameters:
+    mag_footpoint_lon:  Carrington longitude of the magnetic footpoint [°]
+    solo_lon:           Carrington longitude of Solar Orbiter [°]
+    heliocentric_dist:  distance of Solar Orbiter to the sun [AU]
+    '''
+    r = 150e9 * np.asarray(heliocentric_dist, dtype=np.float64)
+    theta = ((np.asarray(mag_footpoint_lon, dtype=np.float64) - solo_lon) % 360) * math.pi / 180
     
-    r = 150e9 * heliocentric_dist
-    theta = ((mag_footpoint_lon - solo_lon) % 360) * math.pi / 180
+    with np.errstate(divide='ignore', invalid='ignore'):
+        length = r / (2 * theta) * (theta * np.sqrt(1 + theta**2) + np.log(theta + np.sqrt(1 + theta**2)))
+    # Footpoint at the longitude of Solar Orbiter: radial line (limit theta -> 0)
+    return np.where(theta == 0, r, length)
+
+def parker_spiral_distance(timestamp):
+    '''
+    Approximating the distance the particles have to travel until reaching SOLO
+    This is done using data from the SolarMACH tool (for many timestamps use the coordinate grid in parker.py)
     
-    return r / (2 * theta) * (theta * math.sqrt(1 + theta**2) + math.log(theta + math.sqrt(1 + theta**2)))
+    Parameters:
+    utc: string of time
+    '''
+    mag_footpoint_lon, solo_lon, solo_lat, heliocentric_dist, sw_speed = solar_mach_coordinates(timestamp)
+    return float(parker_length(mag_footpoint_lon, solo_lon, heliocentric_dist))
 
 def step_delay(date, length, parker_dist=None):
     energies_32 = [0.0090, 0.0091, 0.0094, 0.0098, 0.0102, 0.0108, 0.0114, 0.0121, 0.0129, 0.0137, 0.0146, 0.0157, 0.0168, 0.0180, 0.0193, 0.0206,
@@ -35,9 +56,10 @@ def step_delay(date, length, parker_dist=None):
 
     if parker_dist is None:
         if type(date) == str:
-            dist = parker_spiral_distance(datetime.datetime.strptime(date[2:10] + " 00:00:00", "%y-%m-%d %H:%M:%S"))
-        else:
-            dist = parker_spiral_distance(date)
+            date = datetime.datetime.strptime(date[2:10] + " 00:00:00", "%y-%m-%d %H:%M:%S")
+        # Interpolated from the coordinate grid if it was built, SolarMACH otherwise
+        from .parker import grid_distance
+        dist = grid_distance(date)
     else:
         dist = parker_dist
 
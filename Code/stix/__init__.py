@@ -1 +1,2 @@
-from .core import closest_timestamp, convert_goes_variable, flares_range, read_list
\ No newline at end of file
+from .core import closest_timestamp, closest_timestamps, convert_goes_variable, flares_range, prepare_flares, read_list, read_typed_list
+from .index import FlareIndex
\ No newline at end of file
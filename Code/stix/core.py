@@ -1,16 +1,92 @@
+import os
+import json
+import hashlib
 import pandas as pd
 import datetime
 import config
+from misc.date import parse_utc, round_to_slot, slot_strings
+from .index import FlareIndex
 
-def read_list():
+FLARE_LIST = "STIX_flarelist_w_locations_20210214_20250228_version1_python.csv"
+TIME_COLUMNS = ["start_UTC", "end_UTC", "peak_UTC"]
+CATEGORY_COLUMNS = ["GOES_class_time_of_flare"]
+
+def list_path():
+    return f"{config.CACHE_DIR}/flare_list/{FLARE_LIST}"
+
+def parse_list(path):
+    '''
+    Parses the csv flare list: the utc columns as datetime64, the GOES class as categorical
+    '''
+    df = pd.read_csv(path)
+    for column in TIME_COLUMNS:
+        df[column] = parse_utc(df[column])
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("category")
+    return df
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_typed_list(path=None):
+    '''
+    Returns the parsed flare list from the typed cache next to the csv (<csv>.parquet). The cache is rebuilt if the csv
+    changed: a different modification time or size is checked against the hash of the csv, so touching the file keeps
+    the cache.
+    
+    parameters:
+    path: path of the csv (default: list_path())
+    '''
+    path = path or list_path()
+    cache_path = path + ".parquet"
+    stamp_path = cache_path + ".json"
+
+    stat = os.stat(path)
+    stamp = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        with open(stamp_path, "r") as stamp_file:
+            cached = json.load(stamp_file)
+    except (OSError, ValueError):
+        cached = None
+
+    digest = None
+    if cached is not None and os.path.isfile(cache_path):
+        if cached["mtime"] == stamp["mtime"] and cached["size"] == stamp["size"]:
+            return pd.read_parquet(cache_path)
+        digest = _file_hash(path)
+        if cached["sha256"] == digest:
+            _write_stamp(stamp_path, {**stamp, "sha256": digest})
+            return pd.read_parquet(cache_path)
+
+    df = parse_list(path)
+    try:
+        df.to_parquet(cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+        _write_stamp(stamp_path, {**stamp, "sha256": digest or _file_hash(path)})
+    except OSError as e:
+        # Read only cache folder, the list is parsed again next time
+        print("Could not write the flare list cache:", repr(e))
+    return df
+
+def _write_stamp(stamp_path, stamp):
+    with open(stamp_path + ".tmp", "w") as stamp_file:
+        json.dump(stamp, stamp_file)
+    os.replace(stamp_path + ".tmp", stamp_path)
+
+def read_list(path=None):
     '''
-    Reads csv flare list file and returns the contents as a database.
+    Reads the flare list and returns the contents as a database (start_UTC, end_UTC and peak_UTC as datetime64).
+    The parsed list is cached, see read_typed_list.
     '''
-    df = pd.read_csv(f"{config.CACHE_DIR}/flare_list/STIX_flarelist_w_locations_20210214_20250228_version1_python.csv")
+    df = read_typed_list(path)
 
     # We are missing STEP and EPT data for any dates after 2024-12-31
-    timestamps = pd.to_datetime(df['peak_UTC'])
-    mask = timestamps < pd.Timestamp("2025-01-01")
+    mask = df['peak_UTC'] < pd.Timestamp("2025-01-01")
     return df[mask]
  
 def closest_timestamp(peak_utc):
@@ -40,6 +116,39 @@ def closest_timestamp(peak_utc):
     
     return str(peak_utc)[0:10] + 'T' + str(hour) + ':00:00.000'
 
+def closest_timestamps(peak_utc):
+    '''
+    Array version of closest_timestamp: the connectivity tool timestamps of all flares at once.
+    
+    parameters:
+    peak_utc: column 'peak_UTC' of the STIX flare list (strings or datetimes)
+    '''
+    return slot_strings(round_to_slot(parse_utc(peak_utc)))
+
+def prepare_flares(flares):
+    '''
+    Adds the columns used for the matching: _date (peak), Rounded (connectivity tool timestamp) and the start, peak and
+    end at the sun (_date_start, _date_peak, _date_end: floored to the minute, minus the light travel time to Solar Orbiter)
+    
+    parameters:
+    flares: STIX flare list (see read_list)
+    '''
+    flares = flares.copy()
+    _dates = parse_utc(flares['peak_UTC'])
+    flares["_date"] = _dates
+
+    flares["Rounded"] = closest_timestamps(_dates)
+
+    # Making sure the flare time is suntime
+    AU_TO_M = 149597870700
+    SPEED = 299_792_458 # m/s
+    time_difference = pd.to_timedelta((flares["solo_position_AU_distance"] * AU_TO_M) / SPEED, unit="s")
+
+    flares["_date_start"] = parse_utc(flares['start_UTC']).dt.floor("60s") - time_difference
+    flares["_date_peak"]  = _dates.dt.floor("60s")  - time_difference
+    flares["_date_end"]   = parse_utc(flares['end_UTC']).dt.floor("60s")   - time_difference
+    return flares
+
 def flares_range(start_date, end_date, dates_series):
     '''
     Get range of flare ids whose peak are within the defined timespan.
@@ -49,10 +158,8 @@ def flares_range(start_date, end_date, dates_series):
     end_date:           string of form yyyy-mm-dd
     flare_list_times:   column 'peak_UTC' of stix flare list pandas dataframe
     '''
-    dates = pd.to_datetime(dates_series)
-    mask = (pd.Timestamp(start_date) <= dates) & (dates < pd.Timestamp(end_date) + pd.Timedelta(days=1))
-    flare_range = dates_series[mask]
-    return  flare_range.index[0], flare_range.index[-1]
+    flare_range = FlareIndex(dates_series.to_frame('peak_UTC')).in_dates(start_date, end_date)
+    return  flare_range[0], flare_range[-1]
 
 
 def convert_goes_variable(stix_flares_goes, flare_ids):
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from misc.date import parse_utc
+
+'''
+Sorted time index over the STIX flares.
+
+The peak times are sorted once, "flares peaking in [a, b)" are then two binary searches instead of a mask over the whole
+list. The queries return the index labels of the flares in the order of the list (like a mask would).
+'''
+
+
+def _to_ns(times):
+    # Nanoseconds since epoch, NaT becomes the smallest int64 and is never found by the queries
+    return np.asarray(parse_utc(times), dtype='datetime64[ns]').astype(np.int64)
+
+
+def _timestamp_ns(time):
+    return pd.Timestamp(time).as_unit('ns').value
+
+
+class FlareIndex:
+    '''
+    parameters:
+    flares: STIX flare list (or a part of it)
+    peak:   column of the peak times (strings or datetimes)
+    '''
+    def __init__(self, flares: pd.DataFrame, peak="peak_UTC"):
+        self.labels = flares.index
+
+        peaks = _to_ns(flares[peak])
+        self._peak_order = np.argsort(peaks, kind='stable')
+        self._peaks = peaks[self._peak_order]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _labels(self, positions):
+        # Back to the order of the list
+        return self.labels[np.sort(positions)]
+
+    def peaking(self, start, end, include_start=True):
+        '''
+        Returns the labels of the flares peaking in [start, end), in (start, end) if include_start is False
+        '''
+        low = np.searchsorted(self._peaks, _timestamp_ns(start), side='left' if include_start else 'right')
+        high = np.searchsorted(self._peaks, _timestamp_ns(end), side='left')
+        return self._labels(self._peak_order[low:high])
+
+    def in_dates(self, start_date, end_date):
+        '''
+        Returns the labels of the flares peaking between start_date and end_date (both inclusive, yyyy-mm-dd or dates)
+        '''
+        return self.peaking(pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
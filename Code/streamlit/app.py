@@ -10,12 +10,13 @@ os.chdir(code_dir)
 
 import streamlit as st
 import datetime
-from stix import read_list, closest_timestamp
+from stix import read_list, prepare_flares, FlareIndex
 import pandas as pd
 import numpy as np
-import math
-from connectivity_tool import read_data
+from connectivity_tool import distance
 import epd
+from epd import catalog, chunks
+from epd.loader import STEP_SHORT_DATE
 import step
 import misc
 from classes import Config, SensorData
@@ -40,54 +41,57 @@ def setup():
 # Prepare the stix flares and checking the MCT connectivity
 @st.cache_resource
 def get_stix_flares():
-    raw_list = read_list()
-    _dates = pd.to_datetime(raw_list['peak_UTC'])
-    raw_list["_date"] = _dates
-
-    raw_list["Rounded"] = raw_list["peak_UTC"].apply(closest_timestamp)
-
-    # Making sure the flare time is suntime
-    AU_TO_M = 149597870700
-    SPEED = 299_792_458 # m/s
-    time_difference = pd.to_timedelta((raw_list["solo_position_AU_distance"] * AU_TO_M) / SPEED, unit="s")
-
-    raw_list["_date_start"] = pd.to_datetime(raw_list['start_UTC']).dt.floor("60s") - time_difference
-    raw_list["_date_peak"]  = pd.to_datetime(raw_list['peak_UTC']).dt.floor("60s")  - time_difference
-    raw_list["_date_end"]   = pd.to_datetime(raw_list['end_UTC']).dt.floor("60s")   - time_difference
-
-    # Looping over all flare candidates because connectivity Tool returns Dataframe
-    for i in raw_list.index:
-        flare_lon = raw_list['hgc_lon'][i]
-        flare_lat = raw_list['hgc_lat'][i]
-        # Returns Dataframe
-        try:
-            # Getting the connectivity tool data
-            con_tool_data = read_data(raw_list["Rounded"][i])
-        except Exception as e:
-            print(raw_list["Rounded"][i], repr(e))
-            st.error(f"We are missing the connectivity tool data for {raw_list.loc[i]} and thus can't give a prediction.")
-            st.stop()
-            
-        con_longitudes = con_tool_data["CRLN"]
-        con_latitudes = con_tool_data["CRLT"]
-
-        # Making sure we get the shortest distance
-        lon_dist = np.min([(con_longitudes-flare_lon) % 360, (flare_lon-con_longitudes) % 360], axis=0)
-        lat_dist = con_latitudes - flare_lat
-
-        dist_sq = lon_dist ** 2 + lat_dist ** 2
-
-        min_dist = math.sqrt(np.min(dist_sq))
+    # Peak, connectivity tool timestamp and the times at the sun
+    raw_list = prepare_flares(read_list())
+
+    # Distance of the flares to the closest footpoint, read from the stored table (only new flares are computed)
+    # Missing connectivity files are not downloaded here (see bundler.build_connectivity_distance), their flares are nan
+    try:
+        raw_list["Min Dist"] = distance.load_table(raw_list, download=False)
+    except Exception as e:
+        print(repr(e))
+        st.error("We are missing connectivity tool data and thus can't give a prediction.")
+        st.stop()
 
-        raw_list.loc[i, "Min Dist"] = min_dist
+    missing = raw_list["Min Dist"].isna().sum()
+    if missing > 0:
+        print(f"{missing} flares without connectivity tool data")
 
     return raw_list
 
+# Sorted time index of the flares: by the peak (date range) and by the sun time peak (plot window)
+@st.cache_resource
+def get_flare_index(peak="_date"):
+    return FlareIndex(get_stix_flares(), peak=peak)
+
 # Getting the Parker Spiral distance series
 @st.cache_resource
 def get_parker_dist_series():
     return pd.read_pickle(f"{config.CACHE_DIR}/SolarMACH/parker_spiral_distance.pkl")['Parker_Spiral_Distance']
 
+# Loading the EPD data with `halo` days before the range (not before the start of the mission or the STEP change, like the
+# event catalog), so the running average is the same as in the catalog. The prefix sums are kept for all window lengths
+# Only the current and the previous date range (5 sensors each) stay in memory
+@st.cache_resource(max_entries=10)
+def get_epd_data(sensor, start_date, end_date, viewing="none", particle="electron", halo=1):
+    def load(start, end):
+        if sensor == "step":
+            return epd.load_step_electron(start, end)
+        return epd.load_pickles(sensor, start, end, viewing=viewing, particle=particle)
+
+    first_date = STEP_SHORT_DATE if start_date >= STEP_SHORT_DATE else config.START_DATE
+    df_halo, first_row = chunks.load_with_halo(load, start_date, end_date, halo, first_date)
+    return df_halo, first_row, epd.RollingStats(df_halo)
+
+# Running mean and std of the sensor with the halo, the trimmed ones for the plot
+def running_average(sensor: SensorData):
+    df_mean, df_std = sensor.rolling_stats.running_average(CONFIG.window_length)
+    return df_mean, df_std, df_mean.iloc[sensor.first_row:], df_std.iloc[sensor.first_row:]
+
+def set_epd_data(sensor: SensorData, *arguments, **keywords):
+    sensor.df_halo, sensor.first_row, sensor.rolling_stats = get_epd_data(*arguments, **keywords, halo=chunks.halo_days(CONFIG.window_length))
+    sensor.df_data = sensor.df_halo.iloc[sensor.first_row:]
+
 setup()
 stix_flares = get_stix_flares()
 parker_dist_series = get_parker_dist_series()
@@ -131,14 +135,16 @@ with st.sidebar:
 
 # --------------------------------------- STIX ---------------------------------------
 # Filtering the flares to the date range
-dates = stix_flares['_date']
-mask = (pd.Timestamp(START_DATE) <= dates) & (dates < pd.Timestamp(END_DATE) + pd.Timedelta(days=1))
-flare_range = stix_flares[mask]
-if not mask.any():
+flare_range = stix_flares.loc[get_flare_index().in_dates(START_DATE, END_DATE)]
+if flare_range.empty:
     st.error("No STIX Flares found in the selected timeframe.")
     st.stop()
 
 
+missing_connectivity = flare_range["Min Dist"].isna().sum()
+if missing_connectivity > 0:
+    st.warning(f"We are missing the connectivity tool data of {missing_connectivity} flares in the selected timeframe, they can't be deemed connected.")
+
 flare_range["MCT"] = flare_range["Min Dist"] <= CONFIG.delta_flares
 
 # --------------------------------------- EPD ---------------------------------------
@@ -146,20 +152,14 @@ dict_sensor: dict[str, SensorData] = {}
 
 for direction in ["sun", "asun", "north", "south"]:
     sensor = SensorData(is_step=False, sigma=CONFIG.ept_sigma)
-    sensor.df_data = epd.load_pickles("ept", str(START_DATE), str(END_DATE), viewing=direction)
-
-    sensor.df_mean, sensor.df_std = epd.running_average(sensor.df_data, CONFIG.window_length)
+    set_epd_data(sensor, "ept", str(START_DATE), str(END_DATE), viewing=direction)
 
     dict_sensor[f"EPT-{direction.upper()}"] = sensor
 
 
 
 step_sensor = SensorData(is_step=True, sigma=CONFIG.step_sigma)
-df_step = epd.load_pickles("step", str(START_DATE), str(END_DATE))
-df_step = step.cleanup_sensor(df_step)
-
-step_sensor.df_data = df_step
-step_sensor.df_mean, step_sensor.df_std = epd.running_average(step_sensor.df_data, CONFIG.window_length)
+set_epd_data(step_sensor, "step", str(START_DATE), str(END_DATE))
 
 dict_sensor["STEP"] = step_sensor
 
@@ -169,60 +169,20 @@ for sensor_name in dict_sensor:
 
     # To shorten the code
     df_sensor = sensor.df_data
-    running_mean = sensor.df_mean
-    running_std = sensor.df_std
     sigma = sensor.sigma
 
 
     # Getting all events
     columns =  df_sensor.columns
 
-    threshold = running_mean + sigma * running_std
-    selected = df_sensor > threshold
-
-    # If mean is zero, we want to ignore it
-    selected &= (running_mean != 0) # Bitwise and
-
-    # If we have a nan we also want to ignore it
-    nan_mask = df_sensor.isna() | running_mean.isna() | running_std.isna() # Bitwise OR
-    selected &= ~nan_mask
-
-    # Implementing the idea described here for effecient detection of events: 
-    # https://joshdevlin.com/blog/calculate-streaks-in-pandas/
-
-    diff = (selected != selected.shift()) & ~selected.shift().isna()
-    indexed = diff.cumsum()
-    streaks = selected * indexed
-    streaks = streaks[streaks != 0]
-    streaks["Index"] = streaks.index
-
-    event_starts = []
-    event_ends = []
-
-
-    for i, column in enumerate(columns):
-        time_corrected = streaks["Index"]
-        group = time_corrected.groupby(streaks[column])
-
-        # Remove singular events
-        mask = group.count().reset_index(drop=True) > 1
-
-        # Getting the Event Starts
-        min_group = group.min().reset_index(drop=True)[mask]
-
-        # And Ends
-        max_group = group.max().reset_index(drop=True)[mask]
-
-
-        channel_event = pd.Series(min_group)
-        event_starts.append(channel_event)
-
-        event_ends.append(pd.Series(max_group))
-
-
-    # Fully parallize the computation of the events and only loop over the flares
-    df_starts = pd.DataFrame(event_starts, index=columns).T
-    df_ends = pd.DataFrame(event_ends, index=columns).T
+    # Default parameters are sliced from the precomputed event catalog, other slider values are computed live
+    event_catalog = catalog.open_catalog(sensor_name, CONFIG.window_length, sigma)
+    if event_catalog is not None and event_catalog.covers(START_DATE, END_DATE):
+        df_starts, df_ends = event_catalog.events(START_DATE, END_DATE, columns)
+    else:
+        # Start and end of the runs above the threshold for all channels at once, runs starting in the halo are dropped
+        df_mean, df_std, sensor.df_mean, sensor.df_std = running_average(sensor)
+        df_starts, df_ends = epd.detect_events(sensor.df_halo, df_mean, df_std, sigma, first=sensor.first_row)
 
     df_conn = flare_range.copy()
 
@@ -231,24 +191,13 @@ for sensor_name in dict_sensor:
     else:
         speeds = misc.misc_handler.compute_particle_speed(34, "electron")
     
-    if df_starts.empty:
-        df_conn["channels"] = 0
-    else:
-        for flare_index in flare_range.index:
-            arrive_time = pd.to_timedelta(parker_dist_series[flare_index] / speeds, unit="s")
-            
-            low = df_conn["_date_start"][flare_index] + arrive_time
-            high = df_conn["_date_end"][flare_index] + arrive_time * CONFIG.indirect_factor
-
-            mask = low < df_starts
-            mask &= df_starts < high
-
-            selection = mask.any()
-            df_conn.loc[flare_index, "channels"] = selection.sum()
-
-            df_conn.loc[flare_index, "First Connected Channel"] = selection[selection].index.to_list()[0] if selection.any() else None
-            df_conn.loc[flare_index, "Last Connected Channel"] = selection[selection].index.to_list()[-1] if selection.any() else None
-            
+    # Event starts in (start + d/v, end + k*d/v) for all flares at once
+    channels, first, last = epd.match_flares(df_starts, df_conn["_date_start"], df_conn["_date_end"],
+                                             parker_dist_series.loc[flare_range.index], speeds, CONFIG.indirect_factor)
+    channel_names = np.append(np.asarray(columns, dtype=object), None)
+    df_conn["channels"] = channels
+    df_conn["First Connected Channel"] = channel_names[first]
+    df_conn["Last Connected Channel"] = channel_names[last]
 
     
     events = pd.concat({"Start": df_starts, "End": df_ends}, axis=1)
@@ -387,6 +336,9 @@ with st.expander("Plotting Options"):
 
 
     sensor = dict_sensor[sensor_name]
+    if sensor.df_mean is None:
+        # Events from the catalog, the running average is only needed for the plot
+        _, _, sensor.df_mean, sensor.df_std = running_average(sensor)
     df_flares = sensor.df_connection
     df_mean = sensor.df_mean
     df_std = sensor.df_std
@@ -434,8 +386,7 @@ with st.expander("Plotting Options"):
 filter_start = datetime.datetime.combine(filter_start_date, filter_start_time)
 filter_end = datetime.datetime.combine(filter_end_date, filter_end_time)
 
-mask = (df_flares["_date_peak"] > filter_start) & (df_flares["_date_peak"] < filter_end ) 
-df_flares = df_flares[mask]
+df_flares = df_flares.loc[df_flares.index.intersection(get_flare_index("_date_peak").peaking(filter_start, filter_end, include_start=False))]
 df_mean = df_mean[filter_start: filter_end]
 df_std = df_std[filter_start: filter_end]
 df_sensor = df_sensor[filter_start: filter_end]
@@ -20,6 +20,10 @@ class SensorData:
     sigma: float
 
     df_data: Optional[pd.DataFrame] = None
+    # Data including the halo days before the range (running average), df_data starts at row first_row
+    df_halo: Optional[pd.DataFrame] = None
+    first_row: int = 0
+    rolling_stats: Optional[object] = None
     df_mean: Optional[pd.DataFrame] = None
     df_std: Optional[pd.DataFrame] = None
     df_event: Optional[pd.DataFrame] = None
@@ -7,11 +7,10 @@ sys.path.insert(0, dirname)
 sys.path.insert(0, code_dir)
 os.chdir(code_dir)
 import datetime
-from stix import read_list, closest_timestamp
+from stix import read_list, prepare_flares, FlareIndex
 import pandas as pd
 import numpy as np
-import math
-from connectivity_tool import read_data
+from connectivity_tool import distance
 import epd
 import step
 import misc
@@ -32,45 +31,15 @@ def setup():
 
 # Prepare the stix flares and checking the MCT connectivity
 def get_stix_flares():
-    raw_list = read_list()
-    _dates = pd.to_datetime(raw_list['peak_UTC'])
-    raw_list["_date"] = _dates
-
-    raw_list["Rounded"] = raw_list["peak_UTC"].apply(closest_timestamp)
-
-    # Making sure the flare time is suntime
-    AU_TO_M = 149597870700
-    SPEED = 299_792_458 # m/s
-    time_difference = pd.to_timedelta((raw_list["solo_position_AU_distance"] * AU_TO_M) / SPEED, unit="s")
-
-    raw_list["_date_start"] = pd.to_datetime(raw_list['start_UTC']).dt.floor("60s") - time_difference
-    raw_list["_date_peak"]  = pd.to_datetime(raw_list['peak_UTC']).dt.floor("60s")  - time_difference
-    raw_list["_date_end"]   = pd.to_datetime(raw_list['end_UTC']).dt.floor("60s")   - time_difference
-
-    # Looping over all flare candidates because connectivity Tool returns Dataframe
-    for i in raw_list.index:
-        flare_lon = raw_list['hgc_lon'][i]
-        flare_lat = raw_list['hgc_lat'][i]
-        # Returns Dataframe
-        try:
-            # Getting the connectivity tool data
-            con_tool_data = read_data(raw_list["Rounded"][i])
-        except Exception as e:
-            print(raw_list["Rounded"][i], repr(e))
-            exit()
-            
-        con_longitudes = con_tool_data["CRLN"]
-        con_latitudes = con_tool_data["CRLT"]
-
-        # Making sure we get the shortest distance
-        lon_dist = np.min([(con_longitudes-flare_lon) % 360, (flare_lon-con_longitudes) % 360], axis=0)
-        lat_dist = con_latitudes - flare_lat
-
-        dist_sq = lon_dist ** 2 + lat_dist ** 2
+    # Peak, connectivity tool timestamp and the times at the sun
+    raw_list = prepare_flares(read_list())
 
-        min_dist = math.sqrt(np.min(dist_sq))
-
-        raw_list.loc[i, "Min Dist"] = min_dist
+    # Distance of the flares to the closest footpoint, read from the stored table (only new flares are computed)
+    try:
+        raw_list["Min Dist"] = distance.load_table(raw_list)
+    except Exception as e:
+        print(repr(e))
+        exit()
 
     return raw_list
 
@@ -81,6 +50,7 @@ def get_parker_dist_series():
 setup()
 stix_flares = get_stix_flares()
 parker_dist_series = get_parker_dist_series()
+flare_index = FlareIndex(stix_flares, peak="_date")
 
 
 
@@ -124,10 +94,8 @@ for s_year, s_month, e_year, e_month in tqdm.tqdm([(x//12 + 2021, x % 12+1, (x+1
 
     # --------------------------------------- STIX ---------------------------------------
     # Filtering the flares to the date range
-    dates = stix_flares['_date']
-    mask = (pd.Timestamp(START_DATE) <= dates) & (dates < pd.Timestamp(END_DATE) + pd.Timedelta(days=1))
-    flare_range = stix_flares[mask]
-    if not mask.any():
+    flare_range = stix_flares.loc[flare_index.in_dates(START_DATE, END_DATE)]
+    if flare_range.empty:
         exit(-1)
 
 
@@ -147,8 +115,7 @@ for s_year, s_month, e_year, e_month in tqdm.tqdm([(x//12 + 2021, x % 12+1, (x+1
 
 
     step_sensor = SensorData(is_step=True, sigma=CONFIG.step_sigma)
-    df_step = epd.load_pickles("step", str(START_DATE), str(END_DATE))
-    df_step = step.cleanup_sensor(df_step)
+    df_step = epd.load_step_electron(str(START_DATE), str(END_DATE))
 
     step_sensor.df_data = df_step
     step_sensor.df_mean, step_sensor.df_std = epd.running_average(step_sensor.df_data, CONFIG.window_length)
@@ -169,52 +136,8 @@ for s_year, s_month, e_year, e_month in tqdm.tqdm([(x//12 + 2021, x % 12+1, (x+1
         # Getting all events
         columns =  df_sensor.columns
 
-        threshold = running_mean + sigma * running_std
-        selected = df_sensor > threshold
-
-        # If mean is zero, we want to ignore it
-        selected &= (running_mean != 0) # Bitwise and
-
-        # If we have a nan we also want to ignore it
-        nan_mask = df_sensor.isna() | running_mean.isna() | running_std.isna() # Bitwise OR
-        selected &= ~nan_mask
-
-        # Implementing the idea described here for effecient detection of events: 
-        # https://joshdevlin.com/blog/calculate-streaks-in-pandas/
-
-        diff = (selected != selected.shift()) & ~selected.shift().isna()
-        indexed = diff.cumsum()
-        streaks = selected * indexed
-        streaks = streaks[streaks != 0]
-        streaks["Index"] = streaks.index
-
-        event_starts = []
-        event_ends = []
-
-
-        for i, column in enumerate(columns):
-            time_corrected = streaks["Index"]
-            group = time_corrected.groupby(streaks[column])
-
-            # Remove singular events
-            mask = group.count().reset_index(drop=True) > 1
-
-            # Getting the Event Starts
-            min_group = group.min().reset_index(drop=True)[mask]
-
-            # And Ends
-            max_group = group.max().reset_index(drop=True)[mask]
-
-
-            channel_event = pd.Series(min_group)
-            event_starts.append(channel_event)
-
-            event_ends.append(pd.Series(max_group))
-
-
-        # Fully parallize the computation of the events and only loop over the flares
-        df_starts = pd.DataFrame(event_starts, index=columns).T
-        df_ends = pd.DataFrame(event_ends, index=columns).T
+        # Start and end of the runs above the threshold for all channels at once
+        df_starts, df_ends = epd.detect_events(df_sensor, running_mean, running_std, sigma)
 
         df_conn = flare_range.copy()
 
@@ -223,19 +146,10 @@ for s_year, s_month, e_year, e_month in tqdm.tqdm([(x//12 + 2021, x % 12+1, (x+1
         else:
             speeds = misc.misc_handler.compute_particle_speed(34, "electron")
         
-        if df_starts.empty:
-            df_conn["channels"] = 0
-        else:
-            for flare_index in flare_range.index:
-                arrive_time = pd.to_timedelta(parker_dist_series[flare_index] / speeds, unit="s")
-                
-                low = df_conn["_date_start"][flare_index] + arrive_time
-                high = df_conn["_date_end"][flare_index] + arrive_time * CONFIG.indirect_factor
-
-                mask = low < df_starts
-                mask &= df_starts < high
-
-                df_conn.loc[flare_index, "channels"] = mask.any().sum()
+        # Event starts in (start + d/v, end + k*d/v) for all flares at once
+        channels, _, _ = epd.match_flares(df_starts, df_conn["_date_start"], df_conn["_date_end"],
+                                          parker_dist_series.loc[flare_range.index], speeds, CONFIG.indirect_factor)
+        df_conn["channels"] = channels
         
         events = pd.concat({"Start": df_starts, "End": df_ends}, axis=1)
         events = events.swaplevel(axis=1)
@@ -1,6 +1,15 @@
-from connectivity_tool.downloader import _download_set
+from connectivity_tool.downloader import _download_set, Downloader
+from connectivity_tool.local_server import LocalServer
 from connectivity_tool.goes import get_goes_classification, compute_goes_flux
-from datetime import datetime
+from connectivity_tool import core, distance, store
+from datetime import datetime, timedelta
+from unittest import mock
+import config
+import math
+import os
+import numpy as np
+import pandas as pd
+import tempfile
 import zipfile
 
 import unittest
@@ -24,6 +33,26 @@ class TestMisc(unittest.TestCase):
 
             self.assertEqual(parsed_date, date)
     
+    def test_download_local_server(self):
+        slots = [datetime(2024, 4, 3) + timedelta(hours=6 * i) for i in range(8)]
+        # Every 5th request fails, the downloader has to retry
+        with LocalServer(fail_every=5, n_footpoints=50) as server, tempfile.TemporaryDirectory() as directory:
+            downloader = Downloader(directory, concurrency=4, backoff=0.01, base_url=server.url)
+            self.assertEqual(downloader.download(slots), {})
+            downloader.close()
+
+            self.assertEqual(len(os.listdir(directory)), 3 * len(slots))
+            for slot in slots:
+                with open(downloader.path(slot)) as file:
+                    lines = file.read().splitlines()
+                self.assertEqual(datetime.fromisoformat(lines[17]), slot)
+                self.assertEqual(len(store.parse_file(downloader.path(slot))["CRLN"]), 50)
+
+            # Files that are already there are not downloaded again
+            requests = server.requests
+            self.assertEqual(Downloader(directory, base_url=server.url).download(slots), {})
+            self.assertEqual(server.requests, requests)
+
     def test_goes_classification(self):
         self.assertEqual(get_goes_classification(3 * 10 ** -8), "A")
 
@@ -40,11 +69,85 @@ class TestMisc(unittest.TestCase):
         self.assertEqual(get_goes_classification(compute_goes_flux(500)), "C2")
         self.assertEqual(get_goes_classification(compute_goes_flux(7000)), "M1")
 
+    def test_min_dist_table(self):
+        rng = np.random.default_rng(0)
+        flares = pd.DataFrame({"flare_id": [11, 12, 13, 14],
+                               "Rounded": ["2020-01-01T00:00:00.000", "2020-01-01T00:00:00.000", "2020-01-01T06:00:00.000", "2020-01-02T00:00:00.000"],
+                               "hgc_lon": [359.5, 120.0, 10.0, 50.0],
+                               "hgc_lat": [-5.0, 20.0, 0.0, 0.0]}, index=[3, 4, 5, 6])
+
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory), \
+                mock.patch.object(core, "download_files") as download:
+            os.makedirs(f"{directory}/connectivity_tool_downloads")
+            footpoints = {}
+            for slot in ["20200101T000000", "20200101T060000"]:
+                footpoints[slot] = rng.uniform([0, -90], [360, 90], (50, 2))
+                lines = ["header\n"] * 20 + [f"SSW 1 0.5 700000 {lat} {lon} 1e11 0 0\n" for lon, lat in footpoints[slot]]
+                with open(f"{directory}/connectivity_tool_downloads/SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_{slot}_fileconnectivity.ascii", "w") as file:
+                    file.writelines(lines)
+
+            distances = distance.load_table(flares)
+            # Same as one flare after the other
+            for i, slot in zip(flares.index[:3], ["20200101T000000", "20200101T000000", "20200101T060000"]):
+                # The coordinates are read as float32
+                lon, lat = footpoints[slot].astype(np.float32).astype(np.float64).T
+                flare_lon, flare_lat = flares["hgc_lon"][i], flares["hgc_lat"][i]
+                lon_dist = np.min([(lon - flare_lon) % 360, (flare_lon - lon) % 360], axis=0)
+                self.assertEqual(distances[i], math.sqrt(np.min(lon_dist ** 2 + (lat - flare_lat) ** 2)))
+            # Missing connectivity file
+            self.assertTrue(np.isnan(distances[6]))
+
+            # Second load only computes the flare without a stored distance
+            with mock.patch.object(distance, "read_data", wraps=core.read_data) as read:
+                pd.testing.assert_series_equal(distance.load_table(flares), distances)
+            self.assertEqual([call.args[0] for call in read.call_args_list], ["2020-01-02T00:00:00.000"])
+
+            # Without downloading, the missing file stays nan
+            download.reset_mock()
+            self.assertTrue(np.isnan(distance.load_table(flares, download=False)[6]))
+            download.assert_not_called()
+
 
         
 
 
 
 
+    def test_store(self):
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory):
+            os.makedirs(f"{directory}/connectivity_tool_downloads")
+
+            def write_file(timestamp, flags):
+                lines = ["header line\n"] * 20
+                for i, flag in enumerate(flags):
+                    lines.append(f"{flag}   {i}  {rng.uniform():.3f}  695700.0  {rng.uniform(-90, 90):.4f}  {rng.uniform(0, 360):.4f}  1.1e11  3.2  -4.5\n")
+                with open(f"{directory}/connectivity_tool_downloads/SOLO_PARKER_PFSS_SCTIME_ADAPT_SCIENCE_{timestamp}_fileconnectivity.ascii", "w") as file:
+                    file.writelines(lines)
+
+            write_file("20190301T000000", ["SSW", "FSW", "SSW"])
+            write_file("20190301T060000", ["M"] * 5)
+            self.assertEqual(store.ingest(), 2)
+            self.assertEqual(store.ingest(), 0)
+            write_file("20190301T120000", ["FSW", "M"])
+            self.assertEqual(store.ingest(), 1)
+
+            # Slices of the store are the same as reading the files directly
+            for utc in ["2019-03-01T00:00:00.000", "2019-03-01T06:00:00.000", "2019-03-01T12:00:00.000"]:
+                df = core.read_data(utc)
+                expected = core._read_file(utc)
+                pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+                self.assertEqual(df["CRLN"].dtype, np.float32)
+            self.assertEqual(list(core.read_data("2019-03-01T00:00:00.000")["SSW/FSW/M"]), ["SSW", "FSW", "SSW"])
+
+            # The mapped arrays are the arrays of the file
+            mapped = store.map_npz(store.store_path())
+            with np.load(store.store_path()) as npz:
+                self.assertEqual(sorted(mapped), sorted(npz.files))
+                for name in npz.files:
+                    np.testing.assert_array_equal(mapped[name], npz[name])
+            self.assertIsInstance(mapped["CRLN"], np.memmap)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,7 +1,52 @@
-from epd.data_helper import reduce_data
+from epd.data_helper import reduce_data, _reduce_data_resample
+import epd
+from epd import store, cube, loader, events, matching, dataset, prefetch, associations, chunks, catalog, sweep, load_pickles, iter_days
+import threading
+import time
+from unittest import mock
+import config
+import os
+import numpy as np
 import pandas as pd
+import tempfile
 import unittest
 
+
+def reduced_day(date, columns, seed=0):
+    index = pd.date_range(date, periods=288, freq="300s")
+    data = np.random.default_rng(seed).random((288, len(columns)))
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def fake_reduce(sensor, date, autodownload=True):
+    return [("sun", "electron", reduced_day(date, ["Electron_Flux_0"], int(date[-2:])))]
+
+
+# Flux rises in all channels 30 minutes after these flare starts
+SPIKES = pd.to_datetime(["2022-03-02T12:00", "2022-03-03T23:50", "2022-03-06T08:00"])
+
+
+def fake_sensor(sensor, viewing, start_date, end_date):
+    n_channels = 32 if sensor == "step" else 34
+    days = []
+    for date in pd.date_range(start_date, end_date):
+        # Noise of the day only depends on the day, so every chunking sees the same data
+        day = reduced_day(date, [f"Electron_Flux_{i}" for i in range(n_channels)], date.day) + 1
+        for spike in SPIKES + pd.Timedelta(minutes=30):
+            day.loc[spike: spike + pd.Timedelta(minutes=25)] = 100
+        days.append(day)
+    return pd.concat(days)
+
+
+def fake_range(start_date, end_date):
+    # Long events crossing midnight and a gap of missing data
+    df = fake_sensor("ept", "sun", start_date, end_date).iloc[:, :6] * np.arange(1, 7)
+    for start in pd.to_datetime(["2022-03-02T22:00", "2022-03-04T23:55", "2022-03-05T00:00"]):
+        df.loc[start: start + pd.Timedelta(hours=4), "Electron_Flux_1"] = 50
+    df.loc["2022-03-05T10:00": "2022-03-05T12:00"] = np.nan
+    return df
+
+
 class TestEPD(unittest.TestCase):
 
     def test_wrong_date(self):
@@ -24,6 +69,371 @@ class TestEPD(unittest.TestCase):
         self.assertEqual(len(df1), 288)
         self.assertEqual(len(nans1), 216)
 
+    def test_reduce_resample_equal(self):
+        # Fast path has to give the same result as resample
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2021-04-18 23:59:30", periods=86400, freq="1s")
+        df = pd.DataFrame(rng.random((len(index), 4)), index=index, columns=[f"Electron_Flux_{i}" for i in range(4)])
+        df = df.mask(rng.random(df.shape) < 0.1)
+        df["QUALITY_FLAG"] = rng.integers(0, 5, len(index))
+
+        for df_day in [df, df[(df.index.hour < 3) | (df.index.hour > 5)], df.sample(frac=1, random_state=0)]:
+            pd.testing.assert_frame_equal(reduce_data(df_day), _reduce_data_resample(df_day))
+
+    def test_step_only_averages(self):
+        # The pixel columns are not loaded at all
+        with mock.patch.object(dataset, "load_data", return_value=(pd.DataFrame(), None)) as load:
+            outputs = dataset.reduce_step_day("2022-01-05", autodownload=False)
+        self.assertTrue(load.call_args.kwargs["only_averages"])
+        self.assertEqual(list(outputs[0][2].columns), dataset.step_columns_short + [f"Electron_Avg_Flux_{i}" for i in range(32)])
+        self.assertEqual(len(outputs[0][2]), 288)
+
+    def test_store_range(self):
+        columns = [f"Electron_Flux_{i}" for i in range(4)]
+        with tempfile.TemporaryDirectory() as directory:
+            days = [reduced_day(date, columns, seed) for seed, date in enumerate(["2021-05-30", "2021-05-31", "2021-06-01"])]
+            for df in days:
+                store.write_day(df, "ept", str(df.index[0].date()), "sun", "electron", directory)
+            # Rewriting a day should replace it
+            store.write_day(days[1], "ept", "2021-05-31", "sun", "electron", directory)
+
+            df = store.read_range("ept", "2021-05-31", "2021-06-01", "sun", "electron", directory=directory)
+            pd.testing.assert_frame_equal(df, pd.concat(days[1:]), check_freq=False, check_names=False)
+
+            df = store.read_range("ept", "2021-05-31", "2021-06-02", "sun", "electron", columns=columns[2:], directory=directory)
+            self.assertEqual(list(df.columns), columns[2:])
+            self.assertEqual(len(df), 3 * 288)
+            self.assertEqual(df.isna().all(axis=1).sum(), 288)
+
+            self.assertIsNone(store.read_range("ept", "2021-07-01", "2021-07-02", "sun", "electron", directory=directory))
+
+    def test_store_layout_change(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store.write_day(reduced_day("2021-10-21", ["Integral_Avg_Flux_47"]), "step", "2021-10-21", directory=directory)
+            store.write_day(reduced_day("2021-10-23", ["Integral_Avg_Flux_31"]), "step", "2021-10-23", directory=directory)
+
+            df = store.read_range("step", "2021-10-23", "2021-10-23", directory=directory)
+            self.assertEqual(list(df.columns), ["Integral_Avg_Flux_31"])
+
+    def test_load_pickles(self):
+        columns = ["Integral_Avg_Flux_0", "QUALITY_FLAG"]
+        dates = ["2021-05-30", "2021-05-31", "2021-06-01"]
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory):
+            os.makedirs(f"{directory}/EPD_Dataset/step")
+            days = [reduced_day(date, columns, seed) for seed, date in enumerate(dates)]
+            for date, df in zip(dates, days):
+                df.to_pickle(f"{directory}/EPD_Dataset/step/{date}.pkl")
+
+            df = load_pickles("step", dates[0], dates[-1])
+            pd.testing.assert_frame_equal(df, pd.concat(days), check_freq=False)
+
+            for (date, df_day), df in zip(iter_days("step", dates[0], dates[-1]), days):
+                pd.testing.assert_frame_equal(df_day, df, check_freq=False)
+
+    def test_step_electron(self):
+        columns = [f"{kind}_Avg_Flux_{i}" for kind in ["Integral", "Magnet"] for i in range(48)]
+        df_raw = reduced_day("2021-05-30", columns)
+        expected = pd.DataFrame({f"Electron_Flux_{i}": df_raw[f"Integral_Avg_Flux_{i}"] - df_raw[f"Magnet_Avg_Flux_{i}"] for i in range(48)})
+
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory):
+            # Old pickles without the electron flux
+            os.makedirs(f"{directory}/EPD_Dataset/step")
+            df_raw.to_pickle(f"{directory}/EPD_Dataset/step/2021-05-30.pkl")
+            df = epd.load_step_electron("2021-05-30", "2021-05-30")
+            pd.testing.assert_frame_equal(df, expected, check_freq=False)
+
+            # Stored at generation
+            pd.concat([df_raw, epd.step_electron(df_raw) * 2], axis=1).to_pickle(f"{directory}/EPD_Dataset/step/2021-05-30.pkl")
+            with mock.patch.object(loader, "_has_step_electron", return_value=True):
+                df = epd.load_step_electron("2021-05-30", "2021-05-30")
+            pd.testing.assert_frame_equal(df, expected * 2, check_freq=False)
+
+    def test_omni(self):
+        columns = [f"Electron_Flux_{i}" for i in range(4)]
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory):
+            days = []
+            for seed, viewing in enumerate(["sun", "asun", "north", "south"]):
+                os.makedirs(f"{directory}/EPD_Dataset/ept/{viewing}/electron")
+                df = reduced_day("2021-05-30", columns, seed)
+                df.iloc[seed, :] = np.nan
+                df.to_pickle(f"{directory}/EPD_Dataset/ept/{viewing}/electron/2021-05-30.pkl")
+                days.append(df)
+
+            df = load_pickles("ept", "2021-05-30", "2021-05-30", viewing="omni")
+            # A missing viewing doesn't make omni nan
+            self.assertFalse(df.isna().any().any())
+            pd.testing.assert_frame_equal(df, pd.concat(days).groupby(level=0).mean(), check_freq=False)
+
+    def test_events(self):
+        index = pd.date_range("2021-05-30", periods=10, freq="300s")
+        df = pd.DataFrame({"a": [0, 5, 5, 0, 5, 0, 5, 5, 5, np.nan], "b": [5, 5, 0, 0, 0, 0, 0, 5, 5, 5]}, index=index, dtype=float)
+        mean = pd.DataFrame(1.0, index=index, columns=df.columns)
+        std = pd.DataFrame(1.0, index=index, columns=df.columns)
+        mean.iloc[8, 1] = 0
+
+        df_starts, df_ends = events.detect_events(df, mean, std, 2)
+        # Single samples, nan and zero mean are no events
+        self.assertEqual(list(df_starts["a"]), [index[1], index[6]])
+        self.assertEqual(list(df_ends["a"]), [index[2], index[8]])
+        self.assertEqual(list(df_starts["b"]), [index[0], pd.NaT])
+        self.assertEqual(list(df_ends["b"]), [index[1], pd.NaT])
+
+    def test_rolling_stats(self):
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2021-05-30 12:00", periods=3 * 288, freq="300s")
+        data = rng.normal(1000, 50, (len(index), 3)) * np.exp(rng.normal(0, 0.5, (len(index), 3)))
+        data[100:110, 0] = np.nan
+        data[400:450, 1] = 7
+        df = pd.DataFrame(data, index=index, columns=["a", "b", "c"])
+
+        stats = epd.RollingStats(df.iloc[:500])
+        stats.extend(df.iloc[500:])
+        for length in [2, 18, 300]:
+            df_mean, df_std = stats.running_average(length)
+            expected_mean = pd.DataFrame(df.rolling(window=length).mean().shift(5, freq="min"), index=df.index)
+            expected_std = pd.DataFrame(df.rolling(window=length).std(ddof=0).shift(5, freq="min"), index=df.index)
+            pd.testing.assert_frame_equal(df_mean, expected_mean, rtol=1e-9)
+            pd.testing.assert_frame_equal(df_std, expected_std, rtol=1e-6, atol=1e-4)
+
+        # Constant windows have exactly std 0
+        _, df_std = stats.running_average(18)
+        self.assertTrue((df_std["b"].iloc[418:451] == 0).all())
+
+    def test_matching(self):
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2021-05-30", periods=3 * 288, freq="300s")
+        df_starts = pd.DataFrame({f"Electron_Flux_{i}": pd.Series(np.sort(rng.choice(index, 10 - 2 * i, replace=False))) for i in range(4)})
+        flare_start = pd.Series(rng.choice(index, 30))
+        flare_end = flare_start + pd.to_timedelta(rng.integers(0, 3600, 30), unit="s")
+        distance = rng.uniform(1e10, 3e11, 30)
+        distance[3] = np.nan
+        speeds = np.array([1e8, 5e7, 2e7, 1e7])
+
+        channels, first, last = matching.match_flares(df_starts, flare_start, flare_end, distance, speeds, 1.5)
+        # Same as comparing every flare with the whole frame
+        for i in range(30):
+            arrive_time = pd.to_timedelta(distance[i] / speeds, unit="s")
+            mask = (flare_start[i] + arrive_time < df_starts) & (df_starts < flare_end[i] + arrive_time * 1.5)
+            selection = mask.any().to_numpy()
+            self.assertEqual(channels[i], selection.sum())
+            self.assertEqual(first[i], np.flatnonzero(selection)[0] if selection.any() else -1)
+            self.assertEqual(last[i], np.flatnonzero(selection)[-1] if selection.any() else -1)
+        self.assertGreater(channels.sum(), 0)
+        self.assertEqual(channels[3], 0)
+
+    def test_cube(self):
+        columns = [f"Electron_Flux_{i}" for i in range(4)]
+        with tempfile.TemporaryDirectory() as directory:
+            days = [reduced_day(date, columns, seed) for seed, date in enumerate(["2021-05-30", "2021-05-31", "2021-06-01"])]
+            for df in days:
+                store.write_day(df, "ept", str(df.index[0].date()), "sun", "electron", directory)
+            cube.build_cube("ept", "sun", "electron", "2021-05-29", "2021-06-02", directory, directory)
+
+            epd_cube = cube.open_cube("ept", "sun", "electron", directory)
+            df = epd_cube.frame("2021-05-31", "2021-06-01")
+            self.assertTrue(np.shares_memory(df.to_numpy(), epd_cube.data))
+            pd.testing.assert_frame_equal(df, pd.concat(days[1:]).astype(np.float32), check_freq=False)
+
+            self.assertTrue(epd_cube.frame("2021-05-29", "2021-05-29").isna().all().all())
+            self.assertIsNone(epd_cube.frame("2021-06-02", "2021-06-03"))
+            self.assertEqual(list(epd_cube.frame("2021-05-30", "2021-05-30", columns[1:3]).columns), columns[1:3])
+
+    def test_generate_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest_path = f"{directory}/manifest.jsonl"
+            with mock.patch.object(store, "write_days", wraps=store.write_days) as write:
+                dataset.generate(["ept"], "2021-05-30", "2021-06-02", workers=2, manifest_path=manifest_path, directory=directory, reduce=fake_reduce)
+            # Every month file is written once
+            self.assertEqual(write.call_count, 2)
+
+            # Simulating a crash while the last day was recorded
+            with open(manifest_path) as manifest_file:
+                lines = manifest_file.read().splitlines()
+            with open(manifest_path, "w") as manifest_file:
+                manifest_file.write("\n".join(lines[:-1]) + "\n" + lines[-1][:20])
+
+            manifest = dataset.Manifest(manifest_path)
+            self.assertEqual(len(manifest.entries), 3)
+            self.assertTrue(all(manifest.verify("ept", date, directory) for _, date in manifest.entries))
+
+            calls = []
+            def reduce(sensor, date, autodownload):
+                calls.append(date)
+                return fake_reduce(sensor, date)
+
+            dataset.generate(["ept"], "2021-05-30", "2021-06-02", workers=1, manifest_path=manifest_path, directory=directory, reduce=reduce)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(len(dataset.Manifest(manifest_path).entries), 4)
+
+            df = store.read_range("ept", "2021-05-30", "2021-06-02", "sun", "electron", directory=directory)
+            self.assertFalse(df.isna().any().any())
+
+    def test_prefetch_local_source(self):
+        dates = ["2021-05-30", "2021-05-31", "2021-06-01", "2021-06-02"]
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(config, "CACHE_DIR", directory):
+            soar = f"{directory}/soar"
+            os.makedirs(soar)
+            for date in dates:
+                for viewing in ["sun", "asun"]:
+                    with open(f"{soar}/solo_L2_epd-ept-{viewing}-rates_{date.replace('-', '')}_V01.cdf", "w") as file:
+                        file.write(date)
+
+            running = []
+            max_running = []
+            lock = threading.Lock()
+
+            class CountingSource(prefetch.LocalSource):
+                def fetch(self, sensor, date, path):
+                    with lock:
+                        running.append(date)
+                        max_running.append(len(running))
+                    time.sleep(0.01)
+                    super().fetch(sensor, date, path)
+                    with lock:
+                        running.remove(date)
+
+            jobs = [("ept", date) for date in dates]
+            fetched = []
+            for sensor, date, error in prefetch.Prefetcher(jobs, CountingSource(soar), lookahead=3, concurrency=2):
+                self.assertIsNone(error)
+                # Files of the day are there, when it is handed out
+                self.assertGreaterEqual(len(os.listdir(prefetch.download_path(sensor))), 2 * (len(fetched) + 1))
+                fetched.append(date)
+
+            self.assertEqual(fetched, dates)
+            self.assertLessEqual(max(max_running), 2)
+            self.assertEqual(len(os.listdir(prefetch.download_path("ept"))), 2 * len(dates))
+
+            # Generation with the prefetcher, the workers must not download themselves
+            autodownloads = []
+            def reduce(sensor, date, autodownload):
+                autodownloads.append(autodownload)
+                return fake_reduce(sensor, date)
+
+            dataset.generate(["ept"], dates[0], dates[-1], workers=1, manifest_path=f"{directory}/manifest.jsonl", directory=directory,
+                             reduce=reduce, lookahead=2, source=prefetch.LocalSource(soar))
+            self.assertEqual(autodownloads, [False] * len(dates))
+
+    def test_associations(self):
+        self.assertEqual(associations.chunk_ranges("2021-10-20", "2021-10-25", days=2, halo=1),
+                         [("2021-10-20", "2021-10-20", "2021-10-21", "2021-10-22"), ("2021-10-21", "2021-10-22", "2021-10-22", "2021-10-22"),
+                          ("2021-10-23", "2021-10-23", "2021-10-24", "2021-10-25"), ("2021-10-24", "2021-10-25", "2021-10-25", "2021-10-25")])
+
+        starts = SPIKES.append(pd.DatetimeIndex(["2022-03-04T15:00"]))
+        flares = pd.DataFrame({"flare_id": [10, 11, 12, 13], "_date": starts + pd.Timedelta(minutes=5), "_date_start": starts,
+                               "_date_end": starts + pd.Timedelta(minutes=20), "Min Dist": [5.0, 30.0, 5.0, 5.0]})
+        distance = pd.Series(1.5e11, index=flares.index)
+
+        table = associations.generate(flares, distance, "2022-03-01", "2022-03-07", days=30, workers=1, path=False, load=fake_sensor)
+        self.assertEqual(len(table), 4 * len(associations.SENSORS))
+        ept = table[table["sensor"] == "EPT-SUN"]
+        self.assertEqual(list(ept["channels"]), [34, 34, 34, 0])
+        self.assertEqual(list(ept["first_channel"]), ["Electron_Flux_0"] * 3 + [None])
+        self.assertEqual(list(ept["connected"]), [True, False, True, False])
+        self.assertEqual(associations.summary(table)["Total (All Sensors)"], 2)
+
+        # The flare at 23:50 is matched with the spike on the next day (margin), in chunks and in the workers
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "associations.csv")
+            chunked = associations.generate(flares, distance, "2022-03-01", "2022-03-07", days=3, workers=2, path=path, load=fake_sensor)
+            self.assertTrue(os.path.isfile(path))
+        pd.testing.assert_frame_equal(chunked, table)
+
+    def test_chunks(self):
+        self.assertEqual(chunks.chunk_days("2022-03-01", "2022-03-07", days=3),
+                         [("2022-03-01", "2022-03-03"), ("2022-03-04", "2022-03-06"), ("2022-03-07", "2022-03-07")])
+        self.assertEqual(chunks.halo_days(18), 1)
+        self.assertEqual(chunks.halo_days(300), 2)
+
+        df = fake_range("2022-03-01", "2022-03-07")
+        for length in [18, 24, 300]:
+            running_mean, running_std = epd.running_average(df, length)
+            df_starts, df_ends = epd.detect_events(df, running_mean, running_std, 2.5)
+            self.assertGreater(df_starts.notna().sum().sum(), 0)
+
+            for days in [1, 2, 3]:
+                parts = list(chunks.running_average_chunks(fake_range, "2022-03-01", "2022-03-07", length, days))
+                # Bit identical, not just close
+                np.testing.assert_array_equal(pd.concat([part[1] for part in parts]).to_numpy(), running_mean.to_numpy())
+                np.testing.assert_array_equal(pd.concat([part[2] for part in parts]).to_numpy(), running_std.to_numpy())
+
+                chunked_starts, chunked_ends = chunks.detect_events_chunked(fake_range, "2022-03-01", "2022-03-07", 2.5, length, days)
+                pd.testing.assert_frame_equal(chunked_starts, df_starts)
+                pd.testing.assert_frame_equal(chunked_ends, df_ends)
+
+        # Runs longer than a chunk and runs of one sample at a boundary
+        rng = np.random.default_rng(1)
+        selected = rng.random((500, 4)) < 0.7
+        selected[100:300, 2] = True
+        index = pd.date_range("2022-03-01", periods=500, freq="300s")
+        columns = [f"Electron_Flux_{i}" for i in range(4)]
+        channel, start, end = events.find_runs(selected)
+        expected = (events.runs_to_frame(index, columns, channel, start), events.runs_to_frame(index, columns, channel, end))
+
+        stitcher = chunks.EventStitcher(columns)
+        bounds = np.concatenate([[0], np.sort(rng.choice(np.arange(1, 500), 40, replace=False)), [500]])
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            stitcher.add(index[low:high], selected[low:high])
+        for result, frame in zip(stitcher.finish(), expected):
+            pd.testing.assert_frame_equal(result, frame)
+
+    def test_event_catalog(self):
+        df = fake_sensor("ept", "sun", "2022-03-01", "2022-03-07")
+        running_mean, running_std = epd.running_average(df, 18)
+        df_starts, df_ends = epd.detect_events(df, running_mean, running_std, 2.5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "catalog.npz")
+            built = catalog.build_catalog("EPT-SUN", 18, 2.5, "2022-03-01", "2022-03-07", days=2, path=path, load=fake_sensor,
+                                          version="1")
+            self.assertIsNone(catalog.open_catalog("EPT-SUN", 18, 2.5, path=os.path.join(directory, "missing.npz")))
+            # Built from other data
+            self.assertIsNone(catalog.open_catalog("EPT-SUN", 18, 2.5, path=path, version="2"))
+            event_catalog = catalog.open_catalog("EPT-SUN", 18, 2.5, path=path, version="1")
+
+        self.assertEqual(len(event_catalog), len(built))
+        self.assertTrue(event_catalog.covers("2022-03-02", "2022-03-07"))
+        self.assertFalse(event_catalog.covers("2022-02-28", "2022-03-03"))
+
+        # Whole range: the same events as one pass
+        for result, expected in zip(event_catalog.events("2022-03-01", "2022-03-07", df.columns), [df_starts, df_ends]):
+            pd.testing.assert_frame_equal(result, expected)
+
+        # Slice: the events starting on these days
+        starts, ends = event_catalog.events("2022-03-03", "2022-03-04", df.columns)
+        for column in df.columns:
+            selected = (df_starts[column] >= "2022-03-03") & (df_starts[column] < "2022-03-05")
+            self.assertEqual(list(starts[column].dropna()), list(df_starts[column][selected]))
+            self.assertEqual(list(ends[column].dropna()), list(df_ends[column][selected]))
+
+        # Live detection with a halo (like the app) finds the same starts as the catalog
+        load = lambda start, end: fake_sensor("ept", "sun", start, end)
+        df_halo, first = chunks.load_with_halo(load, "2022-03-03", "2022-03-04", chunks.halo_days(18), "2022-03-01")
+        running_mean, running_std = epd.running_average(df_halo, 18)
+        live_starts, _ = epd.detect_events(df_halo, running_mean, running_std, 2.5, first=first)
+        pd.testing.assert_frame_equal(live_starts, starts)
+
+    def test_sweep(self):
+        starts = SPIKES.append(pd.DatetimeIndex(["2022-03-04T15:00"]))
+        flares = pd.DataFrame({"flare_id": [10, 11, 12, 13], "_date": starts + pd.Timedelta(minutes=5), "_date_start": starts,
+                               "_date_end": starts + pd.Timedelta(minutes=20), "Min Dist": [5.0, 30.0, 5.0, 5.0]})
+        distance = pd.Series(1.5e11, index=flares.index)
+
+        grid = sweep.Grid(window_length=[12, 18], step_sigma=[3.5], ept_sigma=[2.5, 40], delta_flares=[20, 40],
+                          needed_channels=[5, 40], indirect_factor=[0.5, 1.5])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sweep.csv")
+            table = sweep.generate(flares, distance, "2022-03-01", "2022-03-07", grid, days=3, workers=1, path=path, load=fake_sensor)
+            self.assertTrue(os.path.isfile(path))
+        self.assertEqual(len(table), len(grid) * (len(associations.SENSORS) + 2))
+
+        # Every combination counts the same flares as the batch runner with these parameters
+        columns = ["window_length", "step_sigma", "ept_sigma", "delta_flares", "needed_channels", "indirect_factor"]
+        for values, rows in table.groupby(columns):
+            parameters = associations.Parameters(**dict(zip(columns, values)))
+            expected = associations.summary(associations.generate(flares, distance, "2022-03-01", "2022-03-07", parameters,
+                                                                  days=3, workers=1, path=False, load=fake_sensor))
+            self.assertEqual(rows.set_index("sensor")["connected"].to_dict(), expected.to_dict(), values)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
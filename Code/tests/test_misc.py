@@ -1,6 +1,28 @@
 from misc import *
+from misc.cache import LRUCache
+from misc import parker, physics
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import threading
+import time
 import unittest
 
+def fake_distance(peak_utc):
+    return float(peak_utc[8:10]) * 1e10
+
+
+def failing_distance(peak_utc):
+    raise RuntimeError("should be skipped")
+
+
+def fake_coordinates(utc):
+    # Footpoint and Solar Orbiter move by 1° per hour and wrap around 360°
+    hours = (pd.Timestamp(utc) - pd.Timestamp("2022-03-01")) / pd.Timedelta(hours=1)
+    return [(350 + hours) % 360, (300 + hours) % 360, 2.0, 0.5 + hours / 100, 400.0]
+
+
 class TestMisc(unittest.TestCase):
 
     def test_next_date(self):
@@ -14,6 +36,97 @@ class TestMisc(unittest.TestCase):
         self.assertEqual("2022-10-31", previous_date("2022-11-01"))
         self.assertEqual("1900-02-28", previous_date("1900-03-01")) # Leap Century
 
+    def test_day_range(self):
+        self.assertEqual(day_range("2024-02-27", "2024-03-01"), ["2024-02-27", "2024-02-28", "2024-02-29", "2024-03-01"])
+        self.assertEqual(day_range("2025-01-01", "2025-01-01"), ["2025-01-01"])
+        self.assertEqual(day_range("2025-01-02", "2025-01-01"), [])
+
+    def test_round_to_slot(self):
+        times = parse_utc(pd.Series(["2022-01-01T02:59:59.999", "2022-01-01T03:00:00.000", "2022-01-01T20:59:00.000"]))
+        self.assertEqual(list(round_to_slot(times)), list(pd.to_datetime(["2022-01-01T00:00", "2022-01-01T06:00", "2022-01-01T18:00"])))
+
+    def test_lru_cache(self):
+        cache = LRUCache(max_bytes=3 * 800)
+        for key in range(3):
+            cache.get(key, lambda: np.zeros(100))
+        cache.get(0, lambda: None)
+        # Least recently used (1) is evicted
+        cache.get(3, lambda: np.zeros(100))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 4, "spill_hits": 0, "entries": 3, "bytes": 2400})
+        self.assertIsNone(cache.get(1, lambda: None))
+
+    def test_lru_cache_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LRUCache(max_bytes=800, spill_directory=directory)
+            cache.get("a", lambda: np.arange(100.0))
+            cache.get("b", lambda: np.ones(100))
+            # "a" was spilled to disk and is not computed again
+            np.testing.assert_array_equal(cache.get("a", lambda: None), np.arange(100.0))
+            self.assertEqual(cache.spill_hits, 1)
+
+            # The least recently used spill files are deleted, the directory stays within its budget
+            cache = LRUCache(max_bytes=800, spill_directory=directory, spill_max_bytes=2000)
+            for key in range(6):
+                cache.get(key, lambda: np.zeros(100))
+            self.assertLessEqual(sum(entry.stat().st_size for entry in os.scandir(directory)), 2000)
+
+    def test_lru_cache_threads(self):
+        cache = LRUCache(max_bytes=10 ** 6)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return np.zeros(10)
+
+        threads = [threading.Thread(target=cache.get, args=("slot", compute)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Computed once for all threads
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.hits, 7)
+
+    def test_parker_generate(self):
+        flares = pd.DataFrame({"flare_id": [7, 8, 9], "peak_UTC": ["2022-03-01T10:00:00", "2022-03-02T10:00:00", "2022-03-03T10:00:00"]})
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {"log_path": os.path.join(directory, "log.jsonl"), "table_path": os.path.join(directory, "table.pkl")}
+            parker.generate(flares.iloc[:2], workers=2, distance=fake_distance, **paths)
+
+            # Only the new flare is computed, the others come from the log
+            with open(paths["log_path"], "a") as log_file:
+                log_file.write('{"flare_id": 9, "peak')
+            df = parker.generate(flares, workers=1, distance=lambda peak_utc: 5e10, **paths)
+            self.assertEqual(list(df["Parker_Spiral_Distance"]), [1e10, 2e10, 5e10])
+            pd.testing.assert_frame_equal(pd.read_pickle(paths["table_path"]), df)
+
+            # A flare with a new peak time is computed again, failures stay nan
+            flares.loc[0, "peak_UTC"] = "2022-03-04T10:00:00"
+            df = parker.generate(flares, workers=1, distance=failing_distance, **paths)
+            self.assertTrue(np.isnan(df["Parker_Spiral_Distance"][0]))
+            self.assertEqual(list(df["Parker_Spiral_Distance"][1:]), [2e10, 5e10])
+
+    def test_coordinate_grid(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "grid.npz")
+            parker.build_grid("2022-03-01", "2022-03-01", workers=1, path=path, coordinates=fake_coordinates)
+            # Extending the grid only computes the new day
+            calls = []
+            grid = parker.build_grid("2022-03-01", "2022-03-02", workers=1, path=path, coordinates=lambda utc: calls.append(utc) or fake_coordinates(utc))
+            self.assertEqual(len(calls), 24)
+            self.assertEqual(len(grid.times), 48)
+
+            timestamps = pd.date_range("2022-03-01 00:00", "2022-03-02 23:00", freq="20min")
+            expected = np.array([fake_coordinates(str(time)) for time in timestamps])
+            np.testing.assert_allclose(grid.interpolate(timestamps), expected, atol=1e-9)
+            distances = parker.CoordinateGrid.load(path).distance(timestamps)
+            np.testing.assert_allclose(distances, physics.parker_length(expected[:, 0], expected[:, 1], expected[:, 3]), rtol=1e-12)
+
+            # Outside of the grid
+            self.assertTrue(np.isnan(grid.distance(["2022-03-03 01:00"])[0]))
+            self.assertFalse(grid.covers(["2022-03-03 01:00"]))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
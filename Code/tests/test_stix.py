@@ -1,5 +1,8 @@
 from stix import *
+import os
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
 import config
 
@@ -19,6 +22,56 @@ class TestStix(unittest.TestCase):
         self.assertEqual(closest_timestamp("2021-03-18T14:51:39.337"), "2021-03-18T12:00:00.000")
         self.assertEqual(closest_timestamp("2021-03-18T23:51:39.337"), "2021-03-19T00:00:00.000")
 
+    def test_closest_timestamps(self):
+        peak_utc = pd.Series(["2021-03-18T14:51:39.337", "2021-03-18T23:51:39.337", "2024-02-28T21:00:00.000", "2022-01-01T02:59:59.999"])
+        self.assertEqual(list(closest_timestamps(peak_utc)), [closest_timestamp(utc) for utc in peak_utc])
+
+    def test_read_typed_list(self):
+        csv = ("start_UTC,end_UTC,peak_UTC,GOES_class_time_of_flare,flare_id\n"
+               "2021-03-18T14:50:00.000,2021-03-18T14:55:00.000,2021-03-18T14:51:39.337,B3.2,1\n"
+               "2024-12-31T23:50:00.000,2025-01-01T00:05:00.000,2025-01-01T00:01:00.000,C1.0,2\n")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "flare_list.csv")
+            with open(path, "w") as csv_file:
+                csv_file.write(csv)
+
+            flares = read_typed_list(path)
+            self.assertTrue(os.path.isfile(path + ".parquet"))
+            self.assertEqual(flares["peak_UTC"][0], pd.Timestamp("2021-03-18T14:51:39.337"))
+            self.assertIsInstance(flares["GOES_class_time_of_flare"].dtype, pd.CategoricalDtype)
+            pd.testing.assert_frame_equal(read_typed_list(path), flares)
+
+            # Flares after 2024 are dropped
+            self.assertEqual(list(read_list(path)["flare_id"]), [1])
+
+            # Same modification time and size but a new content (only found by the hash after touching the file)
+            with open(path, "w") as csv_file:
+                csv_file.write(csv.replace("B3.2", "M3.2"))
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(read_typed_list(path)["GOES_class_time_of_flare"][0], "M3.2")
+
+    def test_flare_index(self):
+        rng = np.random.default_rng(0)
+        start = pd.Timestamp("2022-03-01") + pd.to_timedelta(rng.uniform(0, 10 * 86400, 500), unit="s")
+        flares = pd.DataFrame({"start_UTC": start, "peak_UTC": start + pd.to_timedelta(rng.uniform(0, 600, 500), unit="s"),
+                               "end_UTC": start + pd.to_timedelta(rng.uniform(600, 7200, 500), unit="s")},
+                              index=rng.permutation(1000)[:500])
+        index = FlareIndex(flares)
+
+        a, b = pd.Timestamp("2022-03-03T05:00"), pd.Timestamp("2022-03-05T17:30")
+        expected = flares.index[(a <= flares["peak_UTC"]) & (flares["peak_UTC"] < b)]
+        self.assertEqual(list(index.peaking(a, b)), list(expected))
+
+        # Exclusive start (plot window of the app)
+        label = flares["peak_UTC"][(a <= flares["peak_UTC"]) & (flares["peak_UTC"] < b)].idxmin()
+        a = flares["peak_UTC"][label]
+        expected = flares.index[(a < flares["peak_UTC"]) & (flares["peak_UTC"] < b)]
+        self.assertEqual(list(index.peaking(a, b, include_start=False)), list(expected))
+        self.assertIn(label, index.peaking(a, b))
+
+        expected = flares.index[(flares["peak_UTC"] >= "2022-03-02") & (flares["peak_UTC"] < "2022-03-05")]
+        self.assertEqual(list(index.in_dates("2022-03-02", "2022-03-04")), list(expected))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file